@@ -0,0 +1,134 @@
+""" Memory and throughput of gradient accumulation versus large batches.
+
+For the same effective batch size, trains with one large batch per step
+(accumulation_steps=1) and with K micro-batches of effective_batch / K images
+(accumulation_steps=K), and reports for each:
+ - the training throughput, in examples/sec,
+ - the peak memory allocated by TF during a step (from a full trace).
+
+Example:
+    python benchmark_accumulation.py --accumulation_effective_batch=512 \
+        --accumulation_steps_list=1,4,16
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+import tensorflow as tf
+
+import clock_data
+import clock_model
+import clock_trace
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_integer('accumulation_effective_batch', 512,
+                            """Number of images per training step.""")
+tf.compat.v1.app.flags.DEFINE_string('accumulation_steps_list', '1,4,16',
+                           """Comma-separated numbers of micro-batches per """
+                           """step to compare.""")
+tf.compat.v1.app.flags.DEFINE_integer('accumulation_benchmark_steps', 20,
+                            """Number of timed training steps.""")
+tf.compat.v1.app.flags.DEFINE_string('accumulation_benchmark_file',
+                           'clocks_all.txt',
+                           """Index file of the training images.""")
+
+
+def _traced_peak_memory(sess, op):
+    # Peak memory of a single run of an op.
+    run_options = tf.compat.v1.RunOptions(
+        trace_level=tf.compat.v1.RunOptions.FULL_TRACE)
+    run_metadata = tf.compat.v1.RunMetadata()
+    sess.run(op, options=run_options, run_metadata=run_metadata)
+    return clock_trace.peak_memory(run_metadata.step_stats)
+
+
+def measure(effective_batch, accumulation_steps, num_steps, filename):
+    """
+    Train for a few steps and measure the throughput and peak memory.
+
+    :return: dict with 'batch_size' (per micro-batch), 'accumulation_steps',
+    'examples_per_sec' and 'peak_memory_mb'.
+    """
+    previous = (FLAGS.batch_size, FLAGS.accumulation_steps)
+    FLAGS.batch_size = effective_batch // accumulation_steps
+    FLAGS.accumulation_steps = accumulation_steps
+
+    try:
+        with tf.Graph().as_default():
+            global_step = tf.Variable(0, trainable=False)
+            images, labels, num_records, _ = clock_data.load_inputs_both(
+                batch_size=FLAGS.batch_size, filename=filename)
+            logits = clock_model.inference_multitask(images, is_training=True)
+            loss = clock_model.loss_multitask(logits[0], labels[0],
+                                              logits[1], labels[1])
+            train_op = clock_model.train(loss, global_step,
+                                         num_examples_per_epoch=num_records,
+                                         total_steps=num_steps + 1)
+            accumulate_op = clock_model.accumulate_gradients_op()
+            init = tf.group(tf.compat.v1.global_variables_initializer(),
+                            tf.compat.v1.local_variables_initializer())
+            tf.compat.v1.get_default_graph().finalize()
+
+            with tf.compat.v1.Session() as sess:
+                sess.run(init)
+                coord = tf.compat.v1.train.Coordinator()
+                threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                                 coord=coord)
+
+                # The first (traced) step also warms up.
+                peak_memory = 0
+                for _ in range(accumulation_steps - 1):
+                    peak_memory = max(peak_memory, _traced_peak_memory(
+                        sess, accumulate_op))
+                peak_memory = max(peak_memory,
+                                  _traced_peak_memory(sess, train_op))
+
+                start_time = time.time()
+                for _ in range(num_steps):
+                    for _ in range(accumulation_steps - 1):
+                        sess.run(accumulate_op)
+                    sess.run(train_op)
+                duration = time.time() - start_time
+
+                coord.request_stop()
+                coord.join(threads, stop_grace_period_secs=10)
+    finally:
+        FLAGS.batch_size, FLAGS.accumulation_steps = previous
+
+    return {'batch_size': effective_batch // accumulation_steps,
+            'accumulation_steps': accumulation_steps,
+            'examples_per_sec': effective_batch * num_steps / duration,
+            'peak_memory_mb': peak_memory / 2.0 ** 20}
+
+
+def main(argv=None):  # pylint: disable=unused-argument
+
+    results = []
+    for accumulation_steps in FLAGS.accumulation_steps_list.split(','):
+        accumulation_steps = int(accumulation_steps)
+        if FLAGS.accumulation_effective_batch % accumulation_steps:
+            raise ValueError('{} is not a multiple of {}'.format(
+                FLAGS.accumulation_effective_batch, accumulation_steps))
+        print('Running {} x {}...'.format(
+            FLAGS.accumulation_effective_batch // accumulation_steps,
+            accumulation_steps))
+        results.append(measure(FLAGS.accumulation_effective_batch,
+                               accumulation_steps,
+                               FLAGS.accumulation_benchmark_steps,
+                               FLAGS.accumulation_benchmark_file))
+
+    print('==================')
+    print('Effective batch size {}:'.format(FLAGS.accumulation_effective_batch))
+    print('  {:>10s} {:>12s} {:>14s} {:>14s}'.format(
+        'batch', 'micro-steps', 'examples/sec', 'peak MB'))
+    for result in results:
+        print('  {:>10d} {:>12d} {:>14.1f} {:>14.1f}'.format(
+            result['batch_size'], result['accumulation_steps'],
+            result['examples_per_sec'], result['peak_memory_mb']))
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
@@ -0,0 +1,317 @@
+""" End-to-end benchmark suite, with JSON results and regression comparison.
+
+Benchmarks every stage of the project:
+ - generate:        clock generation rate (generate_clocks, needs matplotlib),
+ - input:           images/sec of the input pipeline (clock_data),
+ - train_step_N:    training step latency at batch size N (on fixed images, so
+                    the input pipeline is not included),
+ - inference_N:     inference latency for a single image and for a batch,
+ - eval_pass:       a full evaluation pass over an index file (reading,
+                    decoding, inference and the streaming metrics),
+ - time_errors:     compute_time_errors and compute_precision.
+
+Latencies are reported as the median (p50) and 99th percentile of the timed
+runs, after a few untimed warm-up runs. The results are saved as JSON with the
+host metadata (see clock_benchmarks.py). A benchmark that fails is recorded
+with its error, and the others still run and are saved (the command then
+fails).
+
+Run the suite (or some of its benchmarks), and save the results:
+    python benchmark_suite.py run --benchmark_suite_output=results.json \
+        [--benchmark_suite_cases=input,train_step]
+
+then compare them with a saved baseline: the benchmarks that got worse by
+more than --benchmark_suite_threshold are flagged, and the command fails (as
+it does when a benchmark failed in the results):
+    python benchmark_suite.py compare baseline.json results.json
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+
+import numpy as np
+import tensorflow as tf
+
+import benchmark_time_errors
+import clock_benchmarks
+import clock_data
+import clock_evaluation
+import clock_model
+import clock_streaming_metrics
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_string('benchmark_suite_cases', '',
+                           """Comma-separated benchmarks to run (default: """
+                           """all of them): generate, input, train_step, """
+                           """inference, eval_pass, time_errors.""")
+tf.compat.v1.app.flags.DEFINE_string('benchmark_suite_output',
+                           'benchmark_results.json',
+                           """JSON file of the results.""")
+tf.compat.v1.app.flags.DEFINE_string('benchmark_suite_file', 'clocks_all.txt',
+                           """Index file of the images.""")
+tf.compat.v1.app.flags.DEFINE_string('benchmark_suite_batch_sizes',
+                           '32,128',
+                           """Comma-separated batch sizes of the training """
+                           """step and batched inference benchmarks.""")
+tf.compat.v1.app.flags.DEFINE_integer('benchmark_suite_iters', 20,
+                            """Number of timed runs per benchmark.""")
+tf.compat.v1.app.flags.DEFINE_integer('benchmark_suite_warmup', 3,
+                            """Number of untimed runs per benchmark.""")
+tf.compat.v1.app.flags.DEFINE_integer('benchmark_suite_clocks', 20,
+                            """Number of clocks generated.""")
+tf.compat.v1.app.flags.DEFINE_integer('benchmark_suite_rows', 1000000,
+                            """Number of rows of the time error benchmark.""")
+tf.compat.v1.app.flags.DEFINE_float('benchmark_suite_threshold',
+                          clock_benchmarks.REGRESSION_THRESHOLD,
+                          """Relative change flagged as a regression.""")
+
+
+def _timed_runs(fn, num_iters, num_warmup):
+    # Seconds of each timed call of fn.
+    for _ in range(num_warmup):
+        fn()
+    durations = []
+    for _ in range(num_iters):
+        start_time = time.time()
+        fn()
+        durations.append(time.time() - start_time)
+    return durations
+
+
+def _random_batch(batch_size, seed=0):
+    rng = np.random.RandomState(seed)
+    images = rng.uniform(-1, 1, [batch_size, clock_data.image_size1,
+                                 clock_data.image_size2,
+                                 clock_data.image_channels])
+    return (images.astype(np.float32), rng.randint(0, 12, batch_size),
+            rng.randint(0, 60, batch_size))
+
+
+def bench_generate(num_clocks):
+    """ Clocks generated (and saved as images) per second. """
+    import generate_clocks  # Needs matplotlib.
+
+    directory = tempfile.mkdtemp()
+    try:
+        fig, _, bars = generate_clocks.init_clock()
+        start_time = time.time()
+        for k in range(num_clocks):
+            time_ = ((k // 60) % 12, k % 60, 0)
+            generate_clocks.set_clock(bars, *time_)
+            generate_clocks.save_clock(fig, directory, time_)
+        duration = time.time() - start_time
+    finally:
+        shutil.rmtree(directory)
+    return {'generate': clock_benchmarks.throughput_result(
+        num_clocks, duration, unit='clocks/s')}
+
+
+def bench_input(filename, batch_size, num_iters, num_warmup):
+    """ Images per second of the input pipeline (reading and decoding). """
+    with tf.Graph().as_default():
+        images, hours, minutes, _ = clock_data.setup_inputs(batch_size,
+                                                            fname=filename)
+        with tf.compat.v1.Session() as sess:
+            sess.run(tf.compat.v1.local_variables_initializer())
+            coord = tf.compat.v1.train.Coordinator()
+            threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                             coord=coord)
+            durations = _timed_runs(
+                lambda: sess.run([images, hours, minutes]), num_iters,
+                num_warmup)
+            coord.request_stop()
+            coord.join(threads, stop_grace_period_secs=10)
+    return {'input': clock_benchmarks.throughput_result(
+        batch_size * num_iters, sum(durations), unit='images/s')}
+
+
+def bench_train_step(batch_size, num_iters, num_warmup):
+    """ Latency of a training step, on a fixed batch. """
+    images, hours, minutes = _random_batch(batch_size)
+    with tf.Graph().as_default():
+        global_step = tf.Variable(0, trainable=False)
+        logits = clock_model.inference_multitask(tf.constant(images),
+                                                 is_training=True)
+        loss = clock_model.loss_multitask(logits[0], tf.constant(hours),
+                                          logits[1], tf.constant(minutes))
+        train_op = clock_model.train(loss, global_step,
+                                     num_examples_per_epoch=batch_size,
+                                     total_steps=num_iters + num_warmup + 1)
+        with tf.compat.v1.Session() as sess:
+            sess.run(tf.compat.v1.global_variables_initializer())
+            durations = _timed_runs(lambda: sess.run(train_op), num_iters,
+                                    num_warmup)
+    return {'train_step_{}'.format(batch_size):
+            clock_benchmarks.latency_result(durations, batch_size)}
+
+
+def bench_inference(batch_sizes, num_iters, num_warmup):
+    """ Latency of inference, per batch size (1: a single image). """
+    results = {}
+    for batch_size in batch_sizes:
+        images, _, _ = _random_batch(batch_size)
+        with tf.Graph().as_default():
+            logits = clock_model.inference_multitask(tf.constant(images))
+            with tf.compat.v1.Session() as sess:
+                sess.run(tf.compat.v1.global_variables_initializer())
+                durations = _timed_runs(lambda: sess.run(logits), num_iters,
+                                        num_warmup)
+        results['inference_{}'.format(batch_size)] = \
+            clock_benchmarks.latency_result(durations, batch_size)
+    return results
+
+
+def bench_eval_pass(filename, batch_size):
+    """ Images per second of an evaluation pass (untrained model). """
+    with tf.Graph().as_default():
+        images, labels, num_records, _ = clock_data.load_inputs_both(
+            batch_size=batch_size, filename=filename)
+        models = clock_model.inference_multitask(images)
+        metrics = clock_streaming_metrics.StreamingTimeMetrics(
+            clock_model.time_predictions(models, labels))
+        with tf.compat.v1.Session() as sess:
+            sess.run([tf.compat.v1.global_variables_initializer(),
+                      tf.compat.v1.local_variables_initializer()])
+            coord = tf.compat.v1.train.Coordinator()
+            threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                             coord=coord)
+            start_time = time.time()
+            confusion = metrics.evaluate(sess, coord, num_records, batch_size)
+            duration = time.time() - start_time
+            coord.request_stop()
+            coord.join(threads, stop_grace_period_secs=10)
+    return {'eval_pass': clock_benchmarks.throughput_result(
+        int(np.sum(confusion)), duration, unit='images/s')}
+
+
+def bench_time_errors(num_rows, num_iters, num_warmup):
+    """ Latency of compute_time_errors and compute_precision. """
+    rng = np.random.RandomState(0)
+    predicted = benchmark_time_errors.random_times(num_rows, rng)
+    true = benchmark_time_errors.random_times(num_rows, rng)
+    durations = _timed_runs(
+        lambda: (clock_evaluation.compute_time_errors(predicted, true),
+                 clock_evaluation.compute_precision(predicted, true)),
+        num_iters, num_warmup)
+    return {'time_errors': clock_benchmarks.latency_result(durations,
+                                                           num_rows)}
+
+
+def run(cases):
+    """
+    Run the benchmarks.
+
+    :param cases: Names of the benchmarks (see the flags).
+    :return: dict of result name -> result (see clock_benchmarks). A case
+    that raised has a single result, named after the case, with its error.
+    """
+    batch_sizes = [int(batch_size) for batch_size
+                   in FLAGS.benchmark_suite_batch_sizes.split(',')]
+    iters, warmup = FLAGS.benchmark_suite_iters, FLAGS.benchmark_suite_warmup
+    benchmarks = {
+        'generate': lambda: bench_generate(FLAGS.benchmark_suite_clocks),
+        'input': lambda: bench_input(FLAGS.benchmark_suite_file,
+                                     FLAGS.batch_size, iters, warmup),
+        'train_step': lambda: dict(
+            item for batch_size in batch_sizes for item in
+            bench_train_step(batch_size, iters, warmup).items()),
+        'inference': lambda: bench_inference([1] + batch_sizes, iters,
+                                             warmup),
+        'eval_pass': lambda: bench_eval_pass(FLAGS.benchmark_suite_file,
+                                             FLAGS.batch_size),
+        'time_errors': lambda: bench_time_errors(FLAGS.benchmark_suite_rows,
+                                                 iters, warmup),
+    }
+    results = {}
+    for case in cases:
+        print('Running {}...'.format(case))
+        try:
+            results.update(benchmarks[case]())
+        except ImportError as e:
+            print('Skipping {}: {}'.format(case, e))
+        except Exception as e:  # pylint: disable=broad-except
+            # Keep the results of the other benchmarks.
+            traceback.print_exc()
+            print('{} failed: {}'.format(case, e))
+            results[case] = clock_benchmarks.failed_result(e)
+    return results
+
+
+def print_results(results):
+    print('  {:<18s} {:>20s} {:>12s} {:>12s}'.format('benchmark', 'value',
+                                                     'p99', 'items/s'))
+    for (name, result) in sorted(results.items()):
+        if 'error' in result:
+            print('  {:<18s} FAILED: {}'.format(name, result['error']))
+            continue
+        items_per_sec = result.get('items_per_sec')
+        print('  {:<18s} {:>10.4g} {:<9s} {:>12s} {:>12s}'.format(
+            name, result['value'], result['unit'],
+            '{:.4g}'.format(result['p99']) if 'p99' in result else '',
+            '{:.1f}'.format(items_per_sec) if items_per_sec else ''))
+
+
+def print_comparison(baseline, current, threshold):
+    """
+    Print the comparison; :return: the number of regressions (and of failed
+    benchmarks in the current results).
+    """
+    for (key, before, after) in clock_benchmarks.host_differences(baseline,
+                                                                  current):
+        print('NOTE: {} differs: {} (baseline) vs {}'.format(key, before,
+                                                             after))
+    rows = clock_benchmarks.compare(baseline, current, threshold)
+    print('  {:<18s} {:>12s} {:>12s} {:>9s}'.format('benchmark', 'baseline',
+                                                    'current', 'change'))
+    for (name, before, after, change, regressed) in rows:
+        print('  {:<18s} {:>12.4g} {:>12.4g} {:>+8.1f}% {}'.format(
+            name, before, after, 100 * change,
+            'REGRESSION' if regressed else ''))
+    regressions = sum(1 for row in rows if row[-1])
+    print('{} regressions (worse by more than {:.0f}%).'.format(
+        regressions, 100 * threshold))
+    failures = clock_benchmarks.failures(current)
+    for (name, error) in failures:
+        print('FAILED: {}: {}'.format(name, error))
+    return regressions + len(failures)
+
+
+def main(argv=None):
+
+    if not argv or len(argv) < 2 or argv[1] not in ('run', 'compare') or \
+            (argv[1] == 'compare' and len(argv) != 4):
+        print('Usage: python benchmark_suite.py run [--benchmark_suite_...]\n'
+              '       python benchmark_suite.py compare BASELINE.json '
+              'RESULTS.json')
+        sys.exit(2)
+
+    if argv[1] == 'run':
+        cases = FLAGS.benchmark_suite_cases.split(',') \
+            if FLAGS.benchmark_suite_cases else \
+            ['generate', 'input', 'train_step', 'inference', 'eval_pass',
+             'time_errors']
+        results = run(cases)
+        clock_benchmarks.save_results(FLAGS.benchmark_suite_output, results)
+        print('==================')
+        print('Saved to {}:'.format(FLAGS.benchmark_suite_output))
+        print_results(results)
+        if any('error' in result for result in results.values()):
+            sys.exit(1)
+    else:
+        regressions = print_comparison(
+            clock_benchmarks.load_results(argv[2]),
+            clock_benchmarks.load_results(argv[3]),
+            FLAGS.benchmark_suite_threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
@@ -0,0 +1,121 @@
+""" Speed of scoring many predictions: time errors and precision.
+
+Scores random (hours, minutes) predictions against random labels with
+clock_evaluation.compute_time_errors() and compute_precision(), and, for the
+smaller sizes, with the per-row Python loops they replaced (which give the
+same results, and are checked to).
+
+Example:
+    python benchmark_time_errors.py --time_errors_rows=1000000,10000000
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import clock_evaluation
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_string('time_errors_rows', '1000000,10000000',
+                           """Comma-separated numbers of predictions.""")
+tf.compat.v1.app.flags.DEFINE_integer('time_errors_loop_max_rows', 1000000,
+                            """Largest number of predictions to also score """
+                            """with the Python loops.""")
+
+
+def loop_precision(predicted_times, true_times):
+    # Reference: one comparison per row.
+    correct = 0
+    for (predicted, true) in zip(predicted_times, true_times):
+        if predicted == true:
+            correct += 1
+    return float(correct) / len(predicted_times)
+
+
+def loop_time_errors(predicted_times, true_times):
+    # Reference: modulo arithmetic per row.
+    errors = np.zeros((len(predicted_times), 3))
+    for (idx, (predicted, true)) in enumerate(zip(predicted_times, true_times)):
+        delta_t = (60 * predicted[0] + predicted[1]) - (60 * true[0] + true[1])
+        delta_h = predicted[0] - true[0]
+        delta_m = predicted[1] - true[1]
+        errors[idx, 0] = min(delta_t % 720, -delta_t % 720)
+        errors[idx, 1] = min(delta_h % 12, -delta_h % 12)
+        errors[idx, 2] = min(delta_m % 60, -delta_m % 60)
+    return errors
+
+
+def random_times(num_rows, rng):
+    # [N, 2] int16 array of (hours, minutes), as collected during evaluation.
+    return np.stack([rng.randint(0, 12, num_rows),
+                     rng.randint(0, 60, num_rows)], axis=1).astype(np.int16)
+
+
+def _timed(fn, *args):
+    start = time.time()
+    result = fn(*args)
+    return result, time.time() - start
+
+
+def measure(num_rows, with_loops, seed=0):
+    """
+    :return: dict with 'rows', 'vectorized_secs' and 'loop_secs' (None
+    without the loops).
+    """
+    rng = np.random.RandomState(seed)
+    predicted = random_times(num_rows, rng)
+    true = random_times(num_rows, rng)
+    # Make some predictions correct, so the precision is not ~0.
+    true[::3] = predicted[::3]
+
+    (errors, precision), vectorized_secs = _timed(
+        lambda p, t: (clock_evaluation.compute_time_errors(p, t),
+                      clock_evaluation.compute_precision(p, t)),
+        predicted, true)
+
+    loop_secs = None
+    if with_loops:
+        predicted_list = [tuple(row) for row in predicted.tolist()]
+        true_list = [tuple(row) for row in true.tolist()]
+        (loop_errors, loop_prec), loop_secs = _timed(
+            lambda p, t: (loop_time_errors(p, t), loop_precision(p, t)),
+            predicted_list, true_list)
+        if not (np.array_equal(errors, loop_errors) and
+                precision == loop_prec):
+            raise AssertionError('The vectorized results differ from the '
+                                 'loops for {} rows'.format(num_rows))
+
+    return {'rows': num_rows, 'vectorized_secs': vectorized_secs,
+            'loop_secs': loop_secs}
+
+
+def main(argv=None):  # pylint: disable=unused-argument
+
+    results = []
+    for num_rows in FLAGS.time_errors_rows.split(','):
+        num_rows = int(num_rows)
+        print('Scoring {} predictions...'.format(num_rows))
+        results.append(measure(
+            num_rows, num_rows <= FLAGS.time_errors_loop_max_rows))
+
+    print('==================')
+    print('  {:>12s} {:>16s} {:>12s} {:>10s}'.format(
+        'rows', 'vectorized secs', 'loop secs', 'speedup'))
+    for result in results:
+        if result['loop_secs'] is None:
+            loop, speedup = '-', '-'
+        else:
+            loop = '{:.3f}'.format(result['loop_secs'])
+            speedup = '{:.0f}x'.format(
+                result['loop_secs'] / max(result['vectorized_secs'], 1e-9))
+        print('  {:>12d} {:>16.3f} {:>12s} {:>10s}'.format(
+            result['rows'], result['vectorized_secs'], loop, speedup))
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
@@ -0,0 +1,190 @@
+""" Time-to-accuracy benchmark of the optimizer and learning rate schedules.
+
+Trains the model with each configuration until its mean time error on the
+training set reaches a target (e.g. 5 minutes), and reports how many steps and
+how many seconds of training that took. Evaluation time is not counted.
+
+A configuration sets any of the command-line flags of the model (optimizer,
+learning_rate, lr_schedule, momentum, batch_size, accumulation_steps,
+architecture) or of the input sampling (hard_example_mining,
+hard_example_floor). With hard-example mining, the time error is measured on
+a separate, uniformly sampled, input queue.
+
+Example:
+    python benchmark_time_to_accuracy.py --benchmark_target_error=5 \
+        --benchmark_configs=sgd_exponential,adam_cosine
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import json
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import clock_data
+import clock_evaluation
+import clock_model
+import clock_sampler
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_string('benchmark_configs', '',
+                           """Comma-separated configurations to run """
+                           """(default: all of them).""")
+tf.compat.v1.app.flags.DEFINE_float('benchmark_target_error', 5.0,
+                          """Target mean time error, in minutes.""")
+tf.compat.v1.app.flags.DEFINE_integer('benchmark_max_steps', 3000,
+                            """Give up after this many steps.""")
+tf.compat.v1.app.flags.DEFINE_integer('benchmark_eval_steps', 50,
+                            """Evaluate the time error every N steps.""")
+tf.compat.v1.app.flags.DEFINE_string('benchmark_file', 'clocks_all.txt',
+                           """Index file of the training images.""")
+tf.compat.v1.app.flags.DEFINE_string('benchmark_output', '',
+                           """If set, append the results to this JSONL """
+                           """file.""")
+
+CONFIGS = {
+    'sgd_exponential': {'optimizer': 'sgd', 'lr_schedule': 'exponential'},
+    'sgd_cosine': {'optimizer': 'sgd', 'lr_schedule': 'cosine'},
+    'momentum_cosine': {'optimizer': 'momentum', 'lr_schedule': 'cosine'},
+    'momentum_one_cycle': {'optimizer': 'momentum',
+                           'lr_schedule': 'one_cycle'},
+    'adam_cosine': {'optimizer': 'adam', 'lr_schedule': 'cosine'},
+    'adam_one_cycle': {'optimizer': 'adam', 'lr_schedule': 'one_cycle'},
+    'sgd_exponential_hard': {'optimizer': 'sgd', 'lr_schedule': 'exponential',
+                             'hard_example_mining': True},
+    'adam_cosine_hard': {'optimizer': 'adam', 'lr_schedule': 'cosine',
+                         'hard_example_mining': True},
+}
+
+
+def time_to_target(config, target_error, max_steps, eval_steps, filename):
+    """
+    Train with a configuration until the time error reaches the target.
+
+    The schedules that need the length of the run (cosine, one-cycle) use
+    max_steps.
+
+    :param config: dict of flag name -> value.
+    :return: dict with 'reached', 'steps', 'seconds' (of training only) and
+    the last 'time_error'.
+    """
+    previous = dict((name, getattr(FLAGS, name)) for name in config)
+    for (name, value) in config.items():
+        setattr(FLAGS, name, value)
+
+    try:
+        with tf.Graph().as_default():
+            global_step = tf.Variable(0, trainable=False)
+            sampler = clock_sampler.from_flags()
+            images, labels, num_records, _ = clock_data.load_inputs_both(
+                batch_size=FLAGS.batch_size, filename=filename,
+                sampler=sampler)
+            logits = clock_model.inference_multitask(images, is_training=True)
+            loss = clock_model.loss_multitask(logits[0], labels[0],
+                                              logits[1], labels[1])
+            if sampler is not None:
+                sampler.add_update(clock_model.example_losses_multitask(
+                    logits[0], labels[0], logits[1], labels[1]))
+            train_op = clock_model.train(loss, global_step,
+                                         num_examples_per_epoch=num_records,
+                                         total_steps=max_steps)
+
+            eval_logits, eval_labels = logits, labels
+            if sampler is not None:
+                # Measure the time error on uniformly sampled examples.
+                eval_images, eval_labels, _, _ = clock_data.load_inputs_both(
+                    batch_size=FLAGS.batch_size, filename=filename)
+                with tf.compat.v1.variable_scope(
+                        tf.compat.v1.get_variable_scope(), reuse=True):
+                    eval_logits = clock_model.inference_multitask(eval_images)
+
+            eval_predictions = clock_model.time_predictions(eval_logits,
+                                                            eval_labels)
+            accumulate_op = clock_model.accumulate_gradients_op()
+            init = tf.group(tf.compat.v1.global_variables_initializer(),
+                            tf.compat.v1.local_variables_initializer())
+            tf.compat.v1.get_default_graph().finalize()
+
+            with tf.compat.v1.Session() as sess:
+                sess.run(init)
+                coord = tf.compat.v1.train.Coordinator()
+                threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                                 coord=coord)
+
+                result = {'reached': False, 'steps': max_steps,
+                          'seconds': 0.0, 'time_error': None}
+                for step in range(max_steps):
+                    start_time = time.time()
+                    for _ in range(FLAGS.accumulation_steps - 1):
+                        sess.run(accumulate_op)
+                    sess.run(train_op)
+                    result['seconds'] += time.time() - start_time
+
+                    if (step + 1) % eval_steps and step + 1 < max_steps:
+                        continue
+                    predicted_times, true_times, _ = \
+                        clock_model.compute_time_predictions(
+                            sess, coord, eval_predictions, num_records,
+                            FLAGS.batch_size)
+                    time_error = np.mean(clock_evaluation.compute_time_errors(
+                        predicted_times, true_times)[:, 0])
+                    result['time_error'] = float(time_error)
+                    print('  step %d: time error = %.2fm (%.1f sec)' % (
+                        step + 1, time_error, result['seconds']))
+                    if time_error <= target_error:
+                        result['reached'] = True
+                        result['steps'] = step + 1
+                        break
+
+                coord.request_stop()
+                coord.join(threads, stop_grace_period_secs=10)
+    finally:
+        for (name, value) in previous.items():
+            setattr(FLAGS, name, value)
+
+    return result
+
+
+def main(argv=None):  # pylint: disable=unused-argument
+
+    if FLAGS.benchmark_configs:
+        names = FLAGS.benchmark_configs.split(',')
+    else:
+        names = sorted(CONFIGS)
+
+    results = []
+    for name in names:
+        print('Running {}: {}'.format(name, CONFIGS[name]))
+        result = time_to_target(CONFIGS[name], FLAGS.benchmark_target_error,
+                                FLAGS.benchmark_max_steps,
+                                FLAGS.benchmark_eval_steps,
+                                FLAGS.benchmark_file)
+        result.update({'config': name,
+                       'target_error': FLAGS.benchmark_target_error,
+                       'batch_size': FLAGS.batch_size})
+        results.append(result)
+
+        if FLAGS.benchmark_output:
+            with open(FLAGS.benchmark_output, 'a') as f:
+                f.write(json.dumps(result) + '\n')
+
+    print('==================')
+    print('Time to reach a mean time error of {:.1f} minutes:'.format(
+        FLAGS.benchmark_target_error))
+    for result in sorted(results, key=lambda r: (not r['reached'],
+                                                 r['seconds'])):
+        # (None if no evaluation ran.)
+        time_error = '-' if result['time_error'] is None else \
+            '{:.2f}m'.format(result['time_error'])
+        print('  {:<20s} {:>6s} {:>6d} steps {:>9.1f} sec   (error {})'
+              .format(result['config'],
+                      'OK' if result['reached'] else 'FAILED',
+                      result['steps'], result['seconds'], time_error))
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
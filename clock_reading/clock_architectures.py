@@ -0,0 +1,144 @@
+""" Registry of network architecture variants for the clock reading model.
+
+Each architecture is a plain dictionary describing the shared layers built by
+clock_model._inference_shared():
+
+    conv:      list of (output_channels, kernel_size), one per conv layer.
+    norm:      normalization after each conv block: 'lrn', 'batch_norm' or
+               None.
+    separable: if True, use depthwise-separable convolutions.
+    fc:        list of fully connected layer sizes (the last one feeds the
+               softmax classifiers).
+
+Every variant builds through the same clock_model.inference_multitask() API,
+so you can train and evaluate any of them with --architecture=<name>. A config
+can also be read from a JSON file, --architecture=<path>.json (e.g. a pruned
+model, see prune_channels.py).
+
+The 'baseline' entry is the original cifar10-style network; layer names are
+kept the same (conv1, conv2, local3, local4) so old checkpoints still load.
+
+"""
+
+import copy
+import json
+
+# Max pooling used after each conv block: 3x3 window, stride 2, SAME padding.
+POOL_SIZE = 3
+POOL_STRIDE = 2
+
+NORM_TYPES = ('lrn', 'batch_norm', None)
+
+ARCHITECTURES = {
+    'baseline': {
+        'conv': [(64, 5), (64, 5)],
+        'norm': 'lrn',
+        'separable': False,
+        'fc': [384, 192],
+    },
+    'narrow': {
+        'conv': [(32, 5), (32, 5)],
+        'norm': 'lrn',
+        'separable': False,
+        'fc': [192, 96],
+    },
+    'small_bn': {
+        'conv': [(16, 3), (32, 3)],
+        'norm': 'batch_norm',
+        'separable': False,
+        'fc': [128, 64],
+    },
+    'separable': {
+        'conv': [(32, 5), (64, 5)],
+        'norm': 'batch_norm',
+        'separable': True,
+        'fc': [128, 64],
+    },
+    'tiny': {
+        'conv': [(8, 3), (16, 3)],
+        'norm': None,
+        'separable': False,
+        'fc': [64],
+    },
+}
+
+
+def get_architecture(arch):
+    """
+    Look up an architecture by name, or validate a config dictionary.
+
+    :param arch: Name in ARCHITECTURES, a config dictionary, or a JSON file
+    with a config dictionary.
+    :return: A (copied) config dictionary.
+    """
+    if isinstance(arch, dict):
+        config = copy.deepcopy(arch)
+    elif arch.endswith('.json'):
+        with open(arch) as f:
+            config = json.load(f)
+    elif arch in ARCHITECTURES:
+        config = copy.deepcopy(ARCHITECTURES[arch])
+    else:
+        raise ValueError('Unknown architecture: {} (available: {})'.format(
+            arch, ', '.join(sorted(ARCHITECTURES))))
+
+    config.setdefault('norm', None)
+    config.setdefault('separable', False)
+    if not config.get('conv') or not config.get('fc'):
+        raise ValueError('Architecture needs at least one conv and one fc '
+                         'layer: {}'.format(config))
+    if config['norm'] not in NORM_TYPES:
+        raise ValueError('Invalid normalization: {}'.format(config['norm']))
+    return config
+
+
+def _pooled_size(size):
+    # Output size of a SAME-padded pooling layer.
+    return -(-size // POOL_STRIDE)
+
+
+def layer_stats(arch, image_size1, image_size2, image_channels=1,
+                head_sizes=(12, 60)):
+    """
+    Compute the parameter count and FLOPs of every layer of an architecture.
+
+    FLOPs count one multiply-add as two operations, per single image.
+    Normalization and pooling layers are not counted as separate layers; their
+    parameters (batch norm) are attributed to the preceding conv layer.
+
+    :param arch: Architecture name or config dictionary.
+    :param image_size1: Input image height.
+    :param image_size2: Input image width.
+    :param image_channels: Input image channels.
+    :param head_sizes: Output sizes of the softmax classifiers.
+    :return: list of (layer_name, params, flops) tuples.
+    """
+    config = get_architecture(arch)
+    stats = []
+
+    height, width, channels = image_size1, image_size2, image_channels
+    for (idx, (out_channels, kernel)) in enumerate(config['conv']):
+        if config['separable']:
+            params = kernel * kernel * channels + channels * out_channels
+        else:
+            params = kernel * kernel * channels * out_channels
+        flops = 2 * params * height * width
+        params += out_channels  # Biases.
+        if config['norm'] == 'batch_norm':
+            params += 2 * out_channels  # Scale and offset.
+
+        stats.append(('conv{}'.format(idx + 1), params, flops))
+        height, width = _pooled_size(height), _pooled_size(width)
+        channels = out_channels
+
+    dim = height * width * channels
+    for (idx, size) in enumerate(config['fc']):
+        stats.append(('local{}'.format(idx + len(config['conv']) + 1),
+                      dim * size + size, 2 * dim * size))
+        dim = size
+
+    for (name, size) in zip(['softmax_linear_hours', 'softmax_linear_minutes'],
+                            head_sizes):
+        stats.append((name, dim * size + size, 2 * dim * size))
+
+    return stats
@@ -0,0 +1,137 @@
+""" Results of the benchmark suite: JSON files, and regression comparison.
+
+Every benchmark of benchmark_suite.py produces a result: a dict with its
+'value' (the number that is compared, e.g. the median latency), its 'unit',
+whether higher is better, and any details (percentiles, number of runs). The
+results of a run of the suite are saved together with the metadata of the
+host (CPU, versions of Python, TensorFlow and numpy, git commit), as:
+    {"host": {...}, "created": <timestamp>, "results": {name: result, ...}}
+
+A benchmark that raised has a result with its 'error' and no value (see
+failed_result()).
+
+compare() matches the results of two files by name, and flags the ones that
+got worse than the baseline by more than a threshold (10% by default).
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Relative change (worse than the baseline) reported as a regression.
+REGRESSION_THRESHOLD = 0.1
+
+
+def latency_result(durations, items_per_run=1):
+    """
+    :param durations: Seconds of each timed run.
+    :param items_per_run: Number of items (e.g. images) processed per run.
+    :return: Result with the median latency as value, its percentiles and the
+    throughput.
+    """
+    durations = np.asarray(durations, dtype=np.float64)
+    p50, p99 = np.percentile(durations, [50, 99])
+    return {'value': float(p50), 'unit': 's', 'higher_is_better': False,
+            'p50': float(p50), 'p99': float(p99),
+            'mean': float(np.mean(durations)), 'runs': len(durations),
+            'items_per_sec': items_per_run / float(p50) if p50 else None}
+
+
+def throughput_result(num_items, seconds, unit='items/s'):
+    """ :return: Result with the number of items per second as value. """
+    return {'value': num_items / float(seconds), 'unit': unit,
+            'higher_is_better': True, 'items': num_items,
+            'seconds': float(seconds)}
+
+
+def failed_result(error):
+    """ :return: Result of a benchmark that raised error. """
+    return {'value': None, 'error': '{}: {}'.format(type(error).__name__,
+                                                    error)}
+
+
+def failures(results):
+    """ :return: list of (name, error) of the failed benchmarks. """
+    return [(name, result['error'])
+            for (name, result) in sorted(results['results'].items())
+            if 'error' in result]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def host_metadata():
+    """ :return: dict describing the host and the software versions. """
+    metadata = {'hostname': socket.gethostname(),
+                'platform': platform.platform(),
+                'processor': platform.processor() or platform.machine(),
+                'cpu_count': os.cpu_count(),
+                'python': sys.version.split()[0],
+                'numpy': np.__version__,
+                'git_commit': _git_commit()}
+    try:
+        import tensorflow as tf
+        metadata['tensorflow'] = tf.__version__
+    except ImportError:
+        metadata['tensorflow'] = None
+    return metadata
+
+
+def save_results(path, results, host=None):
+    """ Save the results (dict of name -> result) of a run, as JSON. """
+    with open(path, 'w') as f:
+        json.dump({'host': host_metadata() if host is None else host,
+                   'created': time.time(), 'results': results}, f,
+                  indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare the results of two runs (as loaded by load_results).
+
+    :return: list of (name, baseline value, current value, relative change,
+    regressed) for the benchmarks of both runs (that didn't fail, see
+    failures()). The relative change is positive when the current value is
+    better.
+    """
+    rows = []
+    for (name, result) in sorted(current['results'].items()):
+        if name not in baseline['results']:
+            continue
+        before, after = baseline['results'][name]['value'], result['value']
+        if before is None or after is None or not before:
+            continue
+        change = (after - before) / abs(before)
+        if not result['higher_is_better']:
+            change = -change
+        rows.append((name, before, after, change, change < -threshold))
+    return rows
+
+
+def host_differences(baseline, current):
+    """ :return: list of (key, baseline value, current value) that differ. """
+    keys = ('hostname', 'processor', 'cpu_count', 'python', 'numpy',
+            'tensorflow')
+    return [(key, baseline['host'].get(key), current['host'].get(key))
+            for key in keys
+            if baseline['host'].get(key) != current['host'].get(key)]
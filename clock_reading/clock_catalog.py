@@ -0,0 +1,370 @@
+""" Catalog of the training runs and checkpoints of a directory, with metrics.
+
+The catalog is a small SQLite database in the base directory of the runs
+(--train_dir of clock_training.py, --checkpoint_dir of clock_evaluation.py)
+that records:
+ - runs:        every run directory and when it was created,
+ - checkpoints: the step, creation time and size on disk of every checkpoint
+                (and whether the retention policy deleted it), with the time
+                error of its weights (from the background evaluation of its
+                step, when there is one),
+ - evaluations: the metrics of every evaluation of a checkpoint on a data set
+                (index file), e.g. by clock_evaluation.py.
+
+Training adds the runs and checkpoints, evaluation adds the metrics, so the
+latest run, the latest or best checkpoint and whether a checkpoint was
+evaluated are indexed lookups, without listing directories (or relying on
+the order of the run_HH.MM.SS names, which breaks across days). SQLite handles
+the concurrent writes of the training and evaluation processes.
+
+Paths are stored relative to the base directory, so it can be moved.
+
+Query it with:
+    python clock_catalog.py <command> --catalog_dir=./tf_data
+where the command is one of:
+    runs         all the runs, newest first,
+    checkpoints  the checkpoints of --catalog_run (default: the latest run),
+    latest       the latest checkpoint of --catalog_run,
+    best         the checkpoint with the lowest time error on
+                 --catalog_dataset (or from the background evaluation, if
+                 not set),
+    evaluations  the evaluations of --catalog_run on --catalog_dataset,
+    rebuild      add the existing runs and checkpoints of the directory.
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+
+import tensorflow as tf
+
+import clock_checkpoints
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_string('catalog_dir', './tf_data',
+                           """Base directory of the runs (and catalog).""")
+tf.compat.v1.app.flags.DEFINE_string('catalog_run', '',
+                           """Run name to query (default: the latest).""")
+tf.compat.v1.app.flags.DEFINE_string('catalog_dataset', '',
+                           """Data set (index file) of the evaluations.""")
+
+CATALOG_FILENAME = 'catalog.sqlite'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run TEXT PRIMARY KEY,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    run TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    created REAL NOT NULL,
+    size_bytes INTEGER,
+    metric REAL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run, step)
+);
+CREATE INDEX IF NOT EXISTS checkpoints_metric ON checkpoints (metric);
+CREATE TABLE IF NOT EXISTS evaluations (
+    run TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    dataset TEXT NOT NULL,
+    evaluated REAL NOT NULL,
+    time_error REAL,
+    metrics TEXT NOT NULL,
+    PRIMARY KEY (run, step, dataset)
+);
+CREATE INDEX IF NOT EXISTS evaluations_error
+    ON evaluations (dataset, time_error);
+"""
+
+
+def dataset_name(filename):
+    # Data set of an index file, e.g. 'clocks_test' for clocks_test.txt.
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def checkpoint_size(prefix):
+    """ Size in bytes of all the files of a checkpoint. """
+    return sum(tf.io.gfile.stat(path).length
+               for path in clock_checkpoints.checkpoint_files(prefix))
+
+
+class Catalog(object):
+
+    def __init__(self, base_dir):
+        """
+        :param base_dir: Directory of the run directories; the catalog is
+        base_dir/catalog.sqlite (created if needed).
+        """
+        self.base_dir = base_dir
+        self.path = os.path.join(base_dir, CATALOG_FILENAME)
+        tf.io.gfile.makedirs(base_dir)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        # A connection per call: the catalog is used from several threads
+        # (e.g. the checkpoint writer) and processes.
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _execute(self, query, args=()):
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(query, args)
+
+    def _query(self, query, args=()):
+        with closing(self._connect()) as conn:
+            return [dict(row) for row in conn.execute(query, args)]
+
+    def run_name(self, run_dir):
+        # Runs are stored relative to the base directory.
+        return os.path.relpath(run_dir, self.base_dir)
+
+    def run_dir(self, run):
+        return os.path.join(self.base_dir, run)
+
+    def add_run(self, run_dir, created=None):
+        """ Record a run directory (kept as is if already recorded). """
+        self._execute('INSERT OR IGNORE INTO runs (run, created) '
+                      'VALUES (?, ?)',
+                      (self.run_name(run_dir),
+                       time.time() if created is None else created))
+
+    def add_checkpoint(self, checkpoint_path, step=None, metric=None,
+                       created=None):
+        """
+        Record a (complete) checkpoint, and its run.
+
+        :param checkpoint_path: Checkpoint prefix.
+        :param step: Global step (default: from the checkpoint name).
+        :param metric: Time error of the checkpoint, or None if not known
+        (yet, see set_checkpoint_metric()).
+        :param created: Creation time (default: now).
+        """
+        if step is None:
+            step = clock_checkpoints.checkpoint_step(checkpoint_path)
+        created = time.time() if created is None else created
+        run_dir = os.path.dirname(checkpoint_path)
+        self.add_run(run_dir, created)
+        self._execute(
+            'INSERT OR REPLACE INTO checkpoints '
+            '(run, step, name, created, size_bytes, metric, deleted) '
+            'VALUES (?, ?, ?, ?, ?, ?, 0)',
+            (self.run_name(run_dir), int(step),
+             os.path.basename(checkpoint_path), created,
+             checkpoint_size(checkpoint_path),
+             None if metric is None else float(metric)))
+
+    def set_checkpoint_metric(self, checkpoint_path, metric):
+        """ Record the time error of a checkpoint, once it is known. """
+        self._execute('UPDATE checkpoints SET metric = ? '
+                      'WHERE run = ? AND name = ?',
+                      (float(metric),
+                       self.run_name(os.path.dirname(checkpoint_path)),
+                       os.path.basename(checkpoint_path)))
+
+    def remove_checkpoint(self, checkpoint_path):
+        """ Mark a checkpoint as deleted (its evaluations are kept). """
+        self._execute('UPDATE checkpoints SET deleted = 1 '
+                      'WHERE run = ? AND name = ?',
+                      (self.run_name(os.path.dirname(checkpoint_path)),
+                       os.path.basename(checkpoint_path)))
+
+    def add_evaluation(self, checkpoint_path, dataset, metrics, step=None):
+        """
+        Cache the metrics of an evaluation.
+
+        :param dataset: Data set name, see dataset_name().
+        :param metrics: dict of metric name -> value, with 'error/combined'.
+        """
+        if step is None:
+            step = clock_checkpoints.checkpoint_step(checkpoint_path)
+        metrics = dict((name, float(value))
+                       for (name, value) in metrics.items())
+        self._execute(
+            'INSERT OR REPLACE INTO evaluations '
+            '(run, step, dataset, evaluated, time_error, metrics) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (self.run_name(os.path.dirname(checkpoint_path)), int(step),
+             dataset, time.time(), metrics.get('error/combined'),
+             json.dumps(metrics, sort_keys=True)))
+
+    def runs(self):
+        """ :return: list of dicts (run, created, run_dir), newest first. """
+        rows = self._query('SELECT * FROM runs ORDER BY created DESC')
+        for row in rows:
+            row['run_dir'] = self.run_dir(row['run'])
+        return rows
+
+    def latest_run(self):
+        """ :return: The directory of the newest run, or None. """
+        rows = self._query('SELECT run FROM runs '
+                           'ORDER BY created DESC LIMIT 1')
+        return self.run_dir(rows[0]['run']) if rows else None
+
+    def _checkpoint_rows(self, rows):
+        for row in rows:
+            row['path'] = os.path.join(self.run_dir(row['run']), row['name'])
+        return rows
+
+    def checkpoints(self, run_dir, include_deleted=False):
+        """ :return: list of dicts of the checkpoints of a run, by step. """
+        return self._checkpoint_rows(self._query(
+            'SELECT * FROM checkpoints WHERE run = ? AND deleted <= ? '
+            'ORDER BY step', (self.run_name(run_dir), int(include_deleted))))
+
+    def latest_checkpoint(self, run_dir=None):
+        """
+        :param run_dir: Run directory (default: the latest run).
+        :return: dict of the latest existing checkpoint of the run, or None.
+        """
+        run_dir = run_dir or self.latest_run()
+        if run_dir is None:
+            return None
+        rows = self._checkpoint_rows(self._query(
+            'SELECT * FROM checkpoints WHERE run = ? AND deleted = 0 '
+            'ORDER BY step DESC LIMIT 1', (self.run_name(run_dir),)))
+        return rows[0] if rows else None
+
+    def best_checkpoint(self, dataset=None, run_dir=None):
+        """
+        The existing checkpoint with the lowest time error.
+
+        :param dataset: Data set of the evaluations; None: the time error
+        recorded with the checkpoint (from the background evaluation of its
+        step).
+        :param run_dir: Run directory (default: all runs).
+        :return: dict of the checkpoint (with 'time_error'), or None.
+        """
+        run_filter, args = '', []
+        if run_dir is not None:
+            run_filter = 'AND c.run = ? '
+            args.append(self.run_name(run_dir))
+        if dataset is None:
+            query = ('SELECT c.*, c.metric AS time_error FROM checkpoints c '
+                     'WHERE c.deleted = 0 AND c.metric IS NOT NULL ' +
+                     run_filter + 'ORDER BY c.metric, c.step DESC LIMIT 1')
+        else:
+            query = ('SELECT c.*, e.time_error FROM evaluations e '
+                     'JOIN checkpoints c ON c.run = e.run AND c.step = e.step '
+                     'WHERE e.dataset = ? AND c.deleted = 0 '
+                     'AND e.time_error IS NOT NULL ' + run_filter +
+                     'ORDER BY e.time_error, c.step DESC LIMIT 1')
+            args.insert(0, dataset)
+        rows = self._checkpoint_rows(self._query(query, args))
+        return rows[0] if rows else None
+
+    def evaluations(self, run_dir, dataset):
+        """ :return: list of dicts of the evaluations of a run, by step. """
+        rows = self._query('SELECT * FROM evaluations WHERE run = ? '
+                           'AND dataset = ? ORDER BY step',
+                           (self.run_name(run_dir), dataset))
+        for row in rows:
+            row['metrics'] = json.loads(row['metrics'])
+        return rows
+
+    def evaluated_steps(self, run_dir, dataset):
+        """ :return: set of the steps of a run evaluated on a data set. """
+        return set(row['step'] for row in self._query(
+            'SELECT step FROM evaluations WHERE run = ? AND dataset = ?',
+            (self.run_name(run_dir), dataset)))
+
+    def is_evaluated(self, checkpoint_path, dataset):
+        return bool(self._query(
+            'SELECT 1 FROM evaluations WHERE run = ? AND step = ? '
+            'AND dataset = ?',
+            (self.run_name(os.path.dirname(checkpoint_path)),
+             clock_checkpoints.checkpoint_step(checkpoint_path), dataset)))
+
+    def rebuild(self):
+        """
+        Add the runs and checkpoints already in the base directory (e.g. of
+        runs from before the catalog). This scans the directories once.
+
+        :return: Number of checkpoints added.
+        """
+        count = 0
+        for run in tf.io.gfile.listdir(self.base_dir):
+            run_dir = os.path.join(self.base_dir, run.rstrip('/'))
+            if not tf.io.gfile.isdir(run_dir):
+                continue
+            state = tf.train.get_checkpoint_state(run_dir)
+            if state is None:
+                continue
+            self.add_run(run_dir, tf.io.gfile.stat(run_dir).mtime_nsec / 1e9)
+            for path in state.all_model_checkpoint_paths:
+                if not os.path.isabs(path):
+                    path = os.path.join(run_dir, path)
+                if not tf.io.gfile.exists(path + '.index'):
+                    continue
+                self.add_checkpoint(
+                    path, created=tf.io.gfile.stat(
+                        path + '.index').mtime_nsec / 1e9)
+                count += 1
+        return count
+
+
+def _format_time(seconds):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(seconds))
+
+
+def main(argv=None):
+
+    commands = ('runs', 'checkpoints', 'latest', 'best', 'evaluations',
+                'rebuild')
+    if not argv or len(argv) < 2 or argv[1] not in commands:
+        print('Usage: python clock_catalog.py {{{}}} [--catalog_dir=...]'
+              .format('|'.join(commands)))
+        sys.exit(2)
+    command = argv[1]
+    catalog = Catalog(FLAGS.catalog_dir)
+    run_dir = catalog.run_dir(FLAGS.catalog_run) if FLAGS.catalog_run \
+        else catalog.latest_run()
+
+    if command == 'rebuild':
+        print('Added {} checkpoints to {}'.format(catalog.rebuild(),
+                                                  catalog.path))
+    elif command == 'runs':
+        for row in catalog.runs():
+            print('{}  {}'.format(_format_time(row['created']), row['run']))
+    elif command in ('checkpoints', 'latest', 'best'):
+        if command == 'checkpoints':
+            rows = catalog.checkpoints(run_dir) if run_dir else []
+        elif command == 'latest':
+            rows = [catalog.latest_checkpoint(run_dir)]
+        else:
+            rows = [catalog.best_checkpoint(
+                FLAGS.catalog_dataset or None,
+                run_dir if FLAGS.catalog_run else None)]
+        for row in rows:
+            if row is None:
+                continue
+            error = row.get('time_error', row['metric'])
+            print('{}  step {:>7d}  {:>8.1f} MB  time error {}  {}'.format(
+                _format_time(row['created']), row['step'],
+                (row['size_bytes'] or 0) / 2.0 ** 20,
+                '-' if error is None else '{:.2f}m'.format(error),
+                row['path']))
+    elif command == 'evaluations':
+        if not FLAGS.catalog_dataset:
+            raise ValueError('Set --catalog_dataset.')
+        for row in catalog.evaluations(run_dir, FLAGS.catalog_dataset):
+            print('step {:>7d}  {}'.format(row['step'], ', '.join(
+                '{} {:.3f}'.format(name, value) for (name, value)
+                in sorted(row['metrics'].items()))))
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
@@ -0,0 +1,387 @@
+""" Asynchronous checkpointing with a retention policy.
+
+The training loop only takes an in-memory snapshot of the variables (a single
+sess.run); a background thread then writes the checkpoint from the snapshot,
+using a small graph of its own, so the training steps are not blocked by disk
+I/O.
+
+The checkpoints use the regular TF (V2) format and 'checkpoint' state file, so
+tf.train.get_checkpoint_state() and Saver.restore() work as before.
+
+A checkpoint is written under a temporary name and renamed once it is
+complete; only then is the 'checkpoint' state file (atomically) updated to
+point to it. A crash during a save therefore leaves the previous checkpoint as
+the latest one.
+
+The retention policy keeps a checkpoint if any of these rules keeps it:
+ - keep_last:   the N most recent checkpoints,
+ - keep_best:   the N checkpoints with the lowest time error (of the weights
+                of the checkpoint, e.g. from the background evaluation of its
+                step; see set_metric()),
+ - keep_every_n_hours: one checkpoint every K hours of training.
+The newest checkpoint is always kept; all other checkpoints are deleted.
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import threading
+import time
+
+try:
+    import queue
+except ImportError:  # Python 2.
+    import Queue as queue
+
+import numpy as np
+import tensorflow as tf
+
+import clock_metrics
+
+# Stores the step, time and metric of every retained checkpoint.
+METADATA_FILENAME = 'checkpoints.json'
+TMP_SUFFIX = '.tmp'
+
+
+class RetentionPolicy(object):
+
+    def __init__(self, keep_last=5, keep_best=1, keep_every_n_hours=0.0):
+        """
+        :param keep_last: Keep the N most recent checkpoints.
+        :param keep_best: Keep the N checkpoints with the lowest metric.
+        :param keep_every_n_hours: Keep one checkpoint every K hours (0: off).
+        """
+        if not (keep_last > 0 or keep_best > 0 or keep_every_n_hours > 0):
+            raise ValueError('The retention policy needs at least one of '
+                             'keep_last, keep_best and keep_every_n_hours.')
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.keep_every_n_hours = keep_every_n_hours
+
+    def select(self, checkpoints):
+        """
+        Choose which checkpoints to keep.
+
+        :param checkpoints: list of dicts with 'step', 'time' (seconds since
+        the epoch) and 'metric' (lower is better, or None if unknown).
+        :return: set of the steps to keep (with the newest checkpoint, e.g.
+        the one just written, even if no rule keeps it).
+        """
+        by_step = sorted(checkpoints, key=lambda c: c['step'])
+        keep = set()
+        if by_step:
+            keep.add(by_step[-1]['step'])
+
+        if self.keep_last:
+            keep.update(c['step'] for c in by_step[-self.keep_last:])
+
+        if self.keep_best:
+            scored = [c for c in by_step if c['metric'] is not None]
+            scored.sort(key=lambda c: (c['metric'], -c['step']))
+            keep.update(c['step'] for c in scored[:self.keep_best])
+
+        if self.keep_every_n_hours:
+            interval = self.keep_every_n_hours * 3600.0
+            last_kept = None
+            for c in by_step:
+                if last_kept is None or c['time'] >= last_kept + interval:
+                    keep.add(c['step'])
+                    last_kept = c['time']
+
+        return keep
+
+
+def resolve_checkpoint(path):
+    """
+    Find a checkpoint from a run directory (its latest checkpoint) or a
+    checkpoint prefix.
+
+    :return: checkpoint prefix, or None if there is none.
+    """
+    if tf.io.gfile.isdir(path):
+        return tf.train.latest_checkpoint(path)
+    if tf.io.gfile.exists(path + '.index'):
+        return path
+    return None
+
+
+def checkpoint_step(checkpoint_path):
+    # Step from a checkpoint name of the form model.ckpt-NNNN.
+    return int(os.path.basename(checkpoint_path).split('-')[-1])
+
+
+def warm_start_variables(checkpoint_path, variables):
+    """
+    Match variables to the tensors of a checkpoint by name and shape.
+
+    :param checkpoint_path: Checkpoint prefix.
+    :param variables: Candidate variables.
+    :return: (dict checkpoint name -> variable, list of skipped variables).
+    """
+    shapes = dict(tf.train.list_variables(checkpoint_path))
+    matched = {}
+    skipped = []
+    for var in variables:
+        name = var.op.name
+        if name in shapes and \
+                list(shapes[name]) == var.get_shape().as_list():
+            matched[name] = var
+        else:
+            skipped.append(var)
+    return matched, skipped
+
+
+def restore_into_scope(sess, variables, scope, checkpoint_path):
+    """
+    Load variables built in a variable scope (e.g. 'teacher/conv1/weights')
+    from the checkpoint of a model built without it ('conv1/weights'): their
+    moving averages, when the checkpoint has them, as used for evaluation.
+
+    :return: Number of variables restored.
+    """
+    names = set(name for (name, _) in tf.train.list_variables(checkpoint_path))
+    mapping = {}
+    for var in variables:
+        name = var.op.name[len(scope) + 1:]
+        average_name = name + '/ExponentialMovingAverage'
+        mapping[average_name if average_name in names else name] = var
+
+    missing = sorted(name for name in mapping if name not in names)
+    if missing:
+        raise ValueError('The checkpoint {} does not match the model '
+                         '(missing: {})'.format(checkpoint_path,
+                                                ', '.join(missing)))
+    tf.compat.v1.train.Saver(mapping).restore(sess, checkpoint_path)
+    return len(mapping)
+
+
+def checkpoint_files(prefix):
+    # All the files of a (V2) checkpoint.
+    return tf.io.gfile.glob(prefix + '.index') + \
+        tf.io.gfile.glob(prefix + '.data-*')
+
+
+class AsyncCheckpointer(object):
+
+    def __init__(self, save_dir, variables, policy, async_writes=True,
+                 basename='model.ckpt', summary_writer=None, catalog=None):
+        """
+        :param save_dir: Directory of the checkpoints.
+        :param variables: Variables to save (in the training graph).
+        :param policy: RetentionPolicy.
+        :param async_writes: If False, write checkpoints in save() directly.
+        :param basename: Checkpoint file name; the step is appended.
+        :param summary_writer: If given, the save durations are written as
+        summaries.
+        :param catalog: If given, the written and deleted checkpoints are
+        recorded in it (see clock_catalog).
+        """
+        self.save_dir = save_dir
+        self.policy = policy
+        self.async_writes = async_writes
+        self.basename = basename
+        self.summary_writer = summary_writer
+        self.catalog = catalog
+        self._variables = list(variables)
+
+        # Durations (in seconds) of the snapshots (blocking the training loop)
+        # and of the writes (in the background).
+        self.snapshot_secs = []
+        self.write_secs = []
+
+        self._checkpoints = self._load_metadata()
+        self._remove_partial_checkpoints()
+        # Metrics of steps not written yet (see set_metric()).
+        self._pending_metrics = {}
+
+        # A small graph that writes fed values to a checkpoint.
+        self._graph = tf.Graph()
+        with self._graph.as_default():
+            self._prefix = tf.compat.v1.placeholder(tf.string, [])
+            self._placeholders = [
+                tf.compat.v1.placeholder(var.dtype.base_dtype,
+                                         var.get_shape())
+                for var in self._variables]
+            self._save_op = tf.raw_ops.SaveV2(
+                prefix=self._prefix,
+                tensor_names=[var.op.name for var in self._variables],
+                shape_and_slices=[''] * len(self._variables),
+                tensors=self._placeholders)
+        self._sess = tf.compat.v1.Session(graph=self._graph)
+
+        self._error = None
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = None
+        if async_writes:
+            self._thread = threading.Thread(target=self._run,
+                                            name='checkpoint_writer')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _metadata_path(self):
+        return os.path.join(self.save_dir, METADATA_FILENAME)
+
+    def _load_metadata(self):
+        path = self._metadata_path()
+        if not tf.io.gfile.exists(path):
+            return []
+        with tf.io.gfile.GFile(path) as f:
+            return json.load(f)
+
+    def _remove_partial_checkpoints(self):
+        # Left over by a crash during a save.
+        for path in tf.io.gfile.glob(os.path.join(
+                self.save_dir, self.basename + '-*' + TMP_SUFFIX + '*')):
+            tf.io.gfile.remove(path)
+
+    def save(self, sess, step, metric=None):
+        """
+        Snapshot the variables and queue the checkpoint to be written.
+
+        If a snapshot is already waiting behind the checkpoint being written,
+        this waits, so at most three snapshots are held in memory.
+
+        :param sess: Training session.
+        :param step: Global step, appended to the checkpoint name.
+        :param metric: Metric for keep_best (lower is better), e.g. the time
+        error; None if not known.
+        """
+        if self._error is not None:
+            raise self._error
+
+        start_time = time.time()
+        values = sess.run(self._variables)
+        self.snapshot_secs.append(time.time() - start_time)
+
+        self._apply((self._write, (step, values, metric, time.time())))
+
+    def set_metric(self, step, metric):
+        """
+        Record the metric of the checkpoint of a step, e.g. when the
+        evaluation of the weights of that step finishes after the checkpoint
+        was saved, and apply the retention policy again. A metric for a step
+        that is not saved yet is used when it is.
+        """
+        if self._error is not None:
+            raise self._error
+        self._apply((self._update_metric, (step, metric)))
+
+    def _apply(self, item):
+        # Run (function, args) in the writer thread, which owns the metadata.
+        if self.async_writes:
+            self._queue.put(item)
+        else:
+            item[0](*item[1])
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                item[0](*item[1])
+            except Exception as e:  # pylint: disable=broad-except
+                print('Failed to write checkpoint: {}'.format(e))
+                self._error = e
+
+    def _write(self, step, values, metric, save_time):
+        start_time = time.time()
+        prefix = os.path.join(self.save_dir,
+                              '{}-{}'.format(self.basename, step))
+
+        # Write under a temporary name, then rename the data before the index:
+        # a checkpoint exists once its index file exists.
+        feed_dict = dict(zip(self._placeholders, values))
+        feed_dict[self._prefix] = prefix + TMP_SUFFIX
+        self._sess.run(self._save_op, feed_dict=feed_dict)
+        tmp_files = checkpoint_files(prefix + TMP_SUFFIX)
+        tmp_files.sort(key=lambda f: f.endswith('.index'))
+        for tmp_file in tmp_files:
+            tf.io.gfile.rename(tmp_file,
+                               tmp_file.replace(prefix + TMP_SUFFIX, prefix),
+                               overwrite=True)
+
+        if metric is None:
+            metric = self._pending_metrics.get(step)
+        self._pending_metrics = dict(
+            (s, m) for (s, m) in self._pending_metrics.items() if s > step)
+
+        if self.catalog is not None:
+            self.catalog.add_checkpoint(prefix, step, metric, save_time)
+
+        self._checkpoints = [c for c in self._checkpoints
+                             if c['step'] != step]
+        self._checkpoints.append({
+            'step': int(step), 'path': prefix, 'time': save_time,
+            'metric': None if metric is None else float(metric)})
+        self._apply_retention()
+
+        duration = time.time() - start_time
+        self.write_secs.append(duration)
+        if self.summary_writer is not None:
+            self.summary_writer.add_summary(clock_metrics.scalar_summary({
+                'checkpoint/snapshot_secs': self.snapshot_secs[-1],
+                'checkpoint/write_secs': duration}), step)
+
+    def _update_metric(self, step, metric):
+        for c in self._checkpoints:
+            if c['step'] == step:
+                c['metric'] = float(metric)
+                if self.catalog is not None:
+                    self.catalog.set_checkpoint_metric(c['path'], metric)
+                self._apply_retention()
+                return
+        if not any(c['step'] > step for c in self._checkpoints):
+            self._pending_metrics[step] = metric
+        # (Otherwise the checkpoint was deleted, or the step has none.)
+
+    def _apply_retention(self):
+        keep = self.policy.select(self._checkpoints)
+        kept = []
+        for c in sorted(self._checkpoints, key=lambda c: c['step']):
+            if c['step'] in keep:
+                kept.append(c)
+                continue
+            for path in checkpoint_files(c['path']):
+                tf.io.gfile.remove(path)
+            if self.catalog is not None:
+                self.catalog.remove_checkpoint(c['path'])
+        self._checkpoints = kept
+
+        # Point 'checkpoint' to the newest checkpoint (atomic write), then
+        # update the metadata (also written to a temporary file first).
+        tf.compat.v1.train.update_checkpoint_state(
+            self.save_dir, kept[-1]['path'],
+            all_model_checkpoint_paths=[c['path'] for c in kept])
+        tmp_path = self._metadata_path() + TMP_SUFFIX
+        with tf.io.gfile.GFile(tmp_path, 'w') as f:
+            json.dump(kept, f, indent=1)
+        tf.io.gfile.rename(tmp_path, self._metadata_path(), overwrite=True)
+
+    @property
+    def checkpoints(self):
+        """ Metadata of the retained checkpoints, oldest first. """
+        return list(self._checkpoints)
+
+    def close(self):
+        """ Wait for the pending checkpoints to be written. """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._sess.close()
+        if self._error is not None:
+            raise self._error
+
+    def report(self):
+        if not self.snapshot_secs:
+            return
+        print('Checkpoints: {} saved, {} retained. Snapshot {:.3f} sec '
+              '(max {:.3f}), write {:.3f} sec (max {:.3f}){}.'.format(
+                  len(self.snapshot_secs), len(self._checkpoints),
+                  np.mean(self.snapshot_secs), np.max(self.snapshot_secs),
+                  np.mean(self.write_secs or [0]),
+                  np.max(self.write_secs or [0]),
+                  ' in the background' if self.async_writes else ''))
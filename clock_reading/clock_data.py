@@ -12,11 +12,31 @@ Each queue is randomized, and repeatedly samples from the master file (with
 replacement). Sampling a queue gives a single batch of examples (the batch size
 is specified as an input).
 
+Instead of cycling through the file, the records can be drawn by a sampler,
+e.g. one favoring hard examples (see clock_sampler.py).
+
+The images are decoded by --input_threads threads into the batch queue, which
+holds a shuffling buffer (--input_min_after_dequeue images) and
+--input_prefetch_batches batches decoded ahead. They can be tuned for the host
+and batch size with --input_autotune (see clock_input_tuning.py).
+
 """
 
 import numpy as np
 import tensorflow as tf
 
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_integer('input_threads', 1,
+                            """Number of threads reading and decoding the """
+                            """images.""")
+tf.compat.v1.app.flags.DEFINE_integer('input_min_after_dequeue', 10,
+                            """Images left in the batch queue after a """
+                            """batch is dequeued (the shuffling buffer).""")
+tf.compat.v1.app.flags.DEFINE_integer('input_prefetch_batches', 2,
+                            """Batches decoded ahead, on top of the """
+                            """shuffling buffer.""")
+
 image_size1 = 66
 image_size2 = 63
 
@@ -40,8 +60,13 @@ def read_labeled_image_list(image_list_file):
 
 def read_image_and_label(image_label_q):
     # Returns three Tensors: the decoded PNG image, the hour, and the minute.
+    return decode_image_and_label(image_label_q.dequeue())
+
+
+def decode_image_and_label(record):
+    # Same as above, from a line of the index file.
     filename, hour_str, minute_str = tf.io.decode_csv(
-        image_label_q.dequeue(), [[""], [""], [""]], " ")
+        record, [[""], [""], [""]], " ")
     file_contents = tf.io.read_file(filename)
 
     # Decode image from PNG, and cast it to a float.
@@ -63,16 +88,57 @@ def read_image_and_label(image_label_q):
     return image, hour, minute
 
 
-def setup_inputs(batch_size, fname='clocks.txt'):
-    """ Get *all* inputs: the images, the hours, and the minutes. """
+def queue_capacity(batch_size, min_after_dequeue=None,
+                   prefetch_batches=None):
+    """
+    Capacity of the batch queue: the shuffling buffer, plus the batches
+    decoded ahead (by default, from the command-line flags).
+    """
+    if min_after_dequeue is None:
+        min_after_dequeue = FLAGS.input_min_after_dequeue
+    if prefetch_batches is None:
+        prefetch_batches = FLAGS.input_prefetch_batches
+    return min_after_dequeue + max(prefetch_batches, 1) * batch_size
+
+
+def setup_inputs(batch_size, fname='clocks.txt', seed=None, sampler=None):
+    """ Get *all* inputs: the images, the hours, and the minutes.
+
+    The seed (optional) sets the shuffling order, e.g. so that a resumed
+    training run does not replay the examples of the start of the run.
+
+    The sampler (optional, e.g. clock_sampler.HardExampleSampler) chooses the
+    records instead; the index of each record of a batch (its line in the
+    file) is then set as sampler.batch_indices.
+    """
     combined_strings = read_labeled_image_list(fname)
     num_records = len(combined_strings)
-    combined_queue = tf.compat.v1.train.string_input_producer(combined_strings)
-    img, hour, minute = read_image_and_label(combined_queue)
-
-    # Batch up training examples (images and labels).
-    img_batch, hour_batch, minute_batch = tf.compat.v1.train.shuffle_batch([img, hour, minute], batch_size=batch_size, num_threads=1, capacity=100, min_after_dequeue=10)
-    tf.data.Dataset.shuffle([img, hour, minute])
+    if sampler is None:
+        combined_queue = tf.compat.v1.train.string_input_producer(
+            combined_strings, seed=seed)
+        img, hour, minute = read_image_and_label(combined_queue)
+
+        # Batch up training examples (images and labels).
+        img_batch, hour_batch, minute_batch = tf.compat.v1.train.shuffle_batch(
+            [img, hour, minute], batch_size=batch_size,
+            num_threads=FLAGS.input_threads,
+            capacity=queue_capacity(batch_size),
+            min_after_dequeue=FLAGS.input_min_after_dequeue, seed=seed)
+
+        return img_batch, hour_batch, minute_batch, num_records
+
+    index = sampler.sample(num_records, seed=seed)
+    img, hour, minute = decode_image_and_label(
+        tf.gather(tf.constant(combined_strings), index))
+
+    # The records are already drawn at random: keep their order (and so the
+    # sampling distribution of the latest running losses), with a single
+    # thread and no shuffling buffer.
+    img_batch, hour_batch, minute_batch, sampler.batch_indices = \
+        tf.compat.v1.train.batch([img, hour, minute, index],
+                                 batch_size=batch_size, num_threads=1,
+                                 capacity=queue_capacity(
+                                     batch_size, min_after_dequeue=0))
 
     return img_batch, hour_batch, minute_batch, num_records
 
@@ -91,10 +157,10 @@ def load_inputs_minutes(batch_size, filename):
     return img_batch, minute_batch, num_records, num_classes
 
 
-def load_inputs_both(batch_size, filename):
+def load_inputs_both(batch_size, filename, seed=None, sampler=None):
     # This is useful for multitask learning.
     img_batch, hour_batch, minute_batch, num_records = setup_inputs(
-        batch_size, fname=filename)
+        batch_size, fname=filename, seed=seed, sampler=sampler)
 
     num_classes = (60, 12)
     return img_batch, (hour_batch, minute_batch), num_records, num_classes
@@ -0,0 +1,148 @@
+""" Knowledge distillation: train a small model to mimic a large one.
+
+A trained (teacher) model is restored, frozen, next to the model being trained
+(the student, usually a smaller --architecture). The student is trained on the
+hard labels plus the teacher's hour and minute distributions softened with a
+temperature T:
+
+    loss = hard loss + w * T^2 * (KL(p_hours || q_hours) +
+                                  KL(p_minutes || q_minutes))
+
+where p = softmax(teacher logits / T) and q = softmax(student logits / T)
+
+(the T^2 keeps the gradients of the soft targets at the same scale for any T,
+see Hinton et al., "Distilling the knowledge in a neural network"). With a
+larger w or T, lower the learning rate: with the default SGD learning rate, a
+tiny student diverges with w = 1 and T = 4.
+
+The teacher is built in the 'teacher' variable scope, and is left out of the
+collections used for training: its variables are not trained, averaged or
+saved in the student checkpoints, and its summaries and weight decay losses
+are dropped. Its weights are the moving averages from the teacher checkpoint,
+as used for evaluation.
+
+Train with:
+    python clock_training.py --distill_from=./tf_data/run_10.00.00 \
+        --teacher_architecture=baseline --architecture=tiny
+and compare the models with compare_distillation.py.
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+import clock_checkpoints
+import clock_model
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_string('distill_from', '',
+                           """Run directory or checkpoint of a teacher """
+                           """model: train with distillation.""")
+tf.compat.v1.app.flags.DEFINE_string('teacher_architecture', 'baseline',
+                           """Architecture of the teacher model.""")
+tf.compat.v1.app.flags.DEFINE_float('distillation_temperature', 2.0,
+                          """Temperature of the softened distributions.""")
+tf.compat.v1.app.flags.DEFINE_float('distillation_weight', 0.5,
+                          """Weight of the soft targets in the loss.""")
+
+TEACHER_SCOPE = 'teacher'
+# Collection of the (frozen) teacher variables.
+TEACHER_VARIABLES = 'teacher_variables'
+
+
+def _in_scope(item, scope):
+    # Whether a collection item (variable, tensor or op) is in a scope.
+    name = getattr(getattr(item, 'op', item), 'name', None)
+    return name is not None and name.startswith(scope + '/')
+
+
+def build_teacher(images, arch):
+    """
+    Build the frozen teacher model.
+
+    :param images: Input images (the same batch as the student).
+    :param arch: Architecture of the teacher.
+    :return: (hour logits, minute logits), without gradients.
+    """
+    graph = tf.compat.v1.get_default_graph()
+    with tf.compat.v1.variable_scope(TEACHER_SCOPE):
+        logits_h, logits_m = clock_model.inference_multitask(images, arch=arch)
+
+    # Take the teacher out of the training collections. Its variables are
+    # local, so they are initialized (then restored) but not saved.
+    teacher_variables = [var for var in tf.compat.v1.global_variables()
+                         if _in_scope(var, TEACHER_SCOPE)]
+    for key in graph.get_all_collection_keys():
+        collection = graph.get_collection_ref(key)
+        collection[:] = [item for item in collection
+                         if not _in_scope(item, TEACHER_SCOPE)]
+    for var in teacher_variables:
+        tf.compat.v1.add_to_collection(tf.compat.v1.GraphKeys.LOCAL_VARIABLES,
+                                       var)
+        tf.compat.v1.add_to_collection(TEACHER_VARIABLES, var)
+
+    return tf.stop_gradient(logits_h), tf.stop_gradient(logits_m)
+
+
+def restore_teacher(sess, checkpoint_path):
+    """
+    Load the teacher weights (their moving averages, when the checkpoint has
+    them) from a checkpoint of a model trained on its own.
+    """
+    try:
+        count = clock_checkpoints.restore_into_scope(
+            sess, tf.compat.v1.get_collection(TEACHER_VARIABLES),
+            TEACHER_SCOPE, checkpoint_path)
+    except ValueError as e:
+        raise ValueError('{} (check --teacher_architecture)'.format(e))
+    print('Restored the teacher from {} ({} variables).'.format(
+        checkpoint_path, count))
+
+
+def _soft_kl_divergence(student_logits, teacher_logits, temperature):
+    # KL(teacher || student) of the softened distributions: the cross entropy
+    # minus the (constant) entropy of the teacher, so that it goes to 0.
+    teacher_log_p = tf.nn.log_softmax(teacher_logits / temperature)
+    student_log_p = tf.nn.log_softmax(student_logits / temperature)
+    return tf.reduce_mean(tf.reduce_sum(
+        tf.exp(teacher_log_p) * (teacher_log_p - student_log_p), axis=1))
+
+
+def distillation_loss(student_logits, teacher_logits, temperature):
+    """
+    KL divergence between the softened teacher and student distributions, of
+    hours and minutes, scaled by temperature^2.
+
+    :param student_logits: (hour logits, minute logits) of the student.
+    :param teacher_logits: (hour logits, minute logits) of the teacher.
+    :return: Scalar loss.
+    """
+    soft_loss = tf.add(
+        _soft_kl_divergence(student_logits[0], teacher_logits[0],
+                            temperature),
+        _soft_kl_divergence(student_logits[1], teacher_logits[1],
+                            temperature))
+    return tf.multiply(soft_loss, temperature ** 2, name='distillation')
+
+
+def add_distillation(images, student_logits, hard_loss):
+    """
+    Build the teacher (from the flags) and add the soft targets to the loss.
+
+    :return: (total loss, teacher checkpoint to restore after initialization).
+    """
+    checkpoint_path = clock_checkpoints.resolve_checkpoint(FLAGS.distill_from)
+    if checkpoint_path is None:
+        raise ValueError('No checkpoint found in {}'.format(
+            FLAGS.distill_from))
+
+    teacher_logits = build_teacher(images, FLAGS.teacher_architecture)
+    soft_loss = distillation_loss(student_logits, teacher_logits,
+                                  FLAGS.distillation_temperature)
+    # Also tracked by the loss summaries (see clock_model.train()).
+    tf.compat.v1.add_to_collection('losses', soft_loss)
+    total_loss = tf.add(hard_loss, FLAGS.distillation_weight * soft_loss,
+                        name='total_loss_distillation')
+    return total_loss, checkpoint_path
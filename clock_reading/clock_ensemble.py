@@ -0,0 +1,69 @@
+""" Ensembles of checkpoints, evaluated in a single graph.
+
+Each member is a copy of the multi-task model in its own variable scope
+(member_0, member_1, ...) of the same graph, on the same images; a checkpoint
+of a model built without a scope is restored into each. The ensemble averages
+the probabilities (softmax) of the members, for the hours and for the minutes.
+
+Usage (see evaluate_ensemble.py):
+    member_predictions, ensemble_predictions = clock_ensemble.build_ensemble(
+        images, labels, ['baseline'] * 3)
+    ...
+    clock_ensemble.restore_members(sess, checkpoint_paths)
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+import clock_checkpoints
+import clock_model
+
+MEMBER_SCOPE = 'member_{}'
+
+
+def latest_checkpoints(run_dir, count):
+    """
+    :return: The last count checkpoints of a run directory, oldest first.
+    """
+    state = tf.train.get_checkpoint_state(run_dir)
+    if state is None:
+        return []
+    return list(state.all_model_checkpoint_paths)[-count:]
+
+
+def build_ensemble(images, labels, archs):
+    """
+    Build a model per member on the same images.
+
+    :param archs: Architecture of each member.
+    :return: (predictions of each member, predictions of the ensemble), as
+    built by clock_model.time_predictions().
+    """
+    member_predictions = []
+    probabilities = []
+    for (k, arch) in enumerate(archs):
+        with tf.compat.v1.variable_scope(MEMBER_SCOPE.format(k)):
+            logits_h, logits_m = clock_model.inference_multitask(images,
+                                                                 arch=arch)
+        member_predictions.append(clock_model.time_predictions(
+            (logits_h, logits_m), labels))
+        probabilities.append((tf.nn.softmax(logits_h),
+                              tf.nn.softmax(logits_m)))
+
+    # Average the probabilities of the hours, and of the minutes.
+    averages = tuple(tf.add_n(list(p)) / len(archs)
+                     for p in zip(*probabilities))
+    return member_predictions, clock_model.time_predictions(averages, labels)
+
+
+def restore_members(sess, checkpoint_paths):
+    """ Restore a checkpoint into the variable scope of each member. """
+    for (k, checkpoint_path) in enumerate(checkpoint_paths):
+        scope = MEMBER_SCOPE.format(k)
+        variables = tf.compat.v1.global_variables(scope=scope + '/')
+        count = clock_checkpoints.restore_into_scope(sess, variables, scope,
+                                                     checkpoint_path)
+        print('Restored {} from {} ({} variables).'.format(
+            scope, checkpoint_path, count))
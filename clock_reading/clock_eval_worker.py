@@ -0,0 +1,186 @@
+""" Background evaluation of the model while it is training.
+
+The EvalWorker owns a separate graph with its own input pipeline and session,
+and runs in a background thread. The training loop periodically takes an
+in-memory snapshot of the moving-average (EMA) weights and submits it; the
+worker loads the snapshot into its graph, evaluates it on the whole data set,
+and writes the metrics to the summary writer (and prints them) when they are
+ready.
+
+Training never waits on evaluation: if the worker is still busy when a new
+snapshot is submitted, the older pending snapshot is dropped and only the most
+recent one is evaluated.
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import threading
+from datetime import datetime
+
+try:
+    import queue
+except ImportError:  # Python 2.
+    import Queue as queue
+
+import tensorflow as tf
+
+import clock_data
+import clock_metrics
+import clock_model
+import clock_streaming_metrics
+
+
+class EvalWorker(threading.Thread):
+
+    def __init__(self, summary_writer, filename, batch_size, arch=None,
+                 num_threads=1, prefix='training'):
+        """
+        Build the evaluation graph (in the calling thread).
+
+        :param summary_writer: Where to write the metrics (add_summary()).
+        :param filename: Index file of the images to evaluate.
+        :param batch_size: Batch size for evaluation.
+        :param arch: Architecture of the model (see clock_architectures).
+        :param num_threads: Threads used by the evaluation session, so that it
+        does not compete with training for all the cores.
+        :param prefix: Summary tag prefix, e.g. training_precision/hours.
+        """
+        threading.Thread.__init__(self, name='eval_worker')
+        self.daemon = True
+
+        self.metric_logger = clock_metrics.MetricLogger(
+            summary_writer, prefix=prefix + '_')
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.num_threads = num_threads
+
+        # The (step, metrics) of the latest evaluation, None before the first.
+        self.latest = None
+        # Number of snapshots dropped because the worker was busy.
+        self.skipped = 0
+
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            images, labels, self.num_records, _ = \
+                clock_data.load_inputs_both(batch_size=batch_size,
+                                            filename=filename)
+            models = clock_model.inference_multitask(images, arch=arch)
+            self._metrics = clock_streaming_metrics.StreamingTimeMetrics(
+                clock_model.time_predictions(models, labels))
+
+            # Map the name of each EMA shadow variable in the training graph
+            # to the variable that receives its value here.
+            variable_averages = tf.compat.v1.train.ExponentialMovingAverage(
+                clock_model.MOVING_AVERAGE_DECAY)
+            self._variables = variable_averages.variables_to_restore()
+            self._init = tf.compat.v1.global_variables_initializer()
+        self.graph.finalize()
+
+        self._pending = queue.Queue(maxsize=1)
+        # The exception that stopped the worker, if any (see stop()).
+        self._error = None
+
+    def snapshot(self, sess):
+        """
+        Copy the moving-average weights out of the training session.
+
+        :param sess: Training session.
+        :return: dict of variable name -> numpy value.
+        """
+        train_variables = dict(
+            (var.op.name, var) for var in sess.graph.get_collection(
+                tf.compat.v1.GraphKeys.GLOBAL_VARIABLES))
+        names = sorted(self._variables)
+        values = sess.run([train_variables[name] for name in names])
+        return dict(zip(names, values))
+
+    def submit(self, step, snapshot):
+        """ Queue a snapshot for evaluation, replacing any pending one. """
+        try:
+            self._pending.get_nowait()
+            self.skipped += 1
+        except queue.Empty:
+            pass
+        self._pending.put_nowait((step, snapshot))
+
+    def stop(self, drop_pending=True):
+        """
+        Finish the current snapshot and stop.
+
+        :param drop_pending: If False, also evaluate the pending snapshot
+        (e.g. of the final weights) before stopping.
+        :raise: The exception that stopped the worker, if it failed.
+        """
+        if drop_pending:
+            try:
+                self._pending.get_nowait()
+            except queue.Empty:
+                pass
+        # A worker that failed doesn't take the pending snapshot anymore.
+        while self.is_alive():
+            try:
+                self._pending.put(None, timeout=1.0)
+                break
+            except queue.Full:
+                pass
+        self.join()
+        if self._error is not None:
+            raise self._error
+
+    def run(self):
+        config = tf.compat.v1.ConfigProto(
+            intra_op_parallelism_threads=self.num_threads,
+            inter_op_parallelism_threads=self.num_threads)
+        with self.graph.as_default(), \
+                tf.compat.v1.Session(config=config) as sess:
+            sess.run(self._init)
+
+            coord = tf.compat.v1.train.Coordinator()
+            threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                             coord=coord)
+            try:
+                while not coord.should_stop():
+                    item = self._pending.get()
+                    if item is None:
+                        break
+                    step, snapshot = item
+
+                    for (name, value) in snapshot.items():
+                        self._variables[name].load(value, sess)
+
+                    metrics = self.evaluate(sess, coord)
+                    self.latest = (step, metrics)
+                    self._report(step, metrics)
+            except Exception as e:  # pylint: disable=broad-except
+                print('Evaluation worker failed: {}'.format(e))
+                self._error = e
+
+            coord.request_stop()
+            coord.join(threads, stop_grace_period_secs=10)
+
+    def evaluate(self, sess, coord):
+        """
+        Compute precision and time error over (at least) the whole data set.
+
+        :return: dict of metric name -> value.
+        """
+        confusion = self._metrics.evaluate(sess, coord, self.num_records,
+                                           self.batch_size)
+        return clock_streaming_metrics.time_metrics(confusion)
+
+    def _report(self, step, metrics):
+        print('%s: [eval step %d] %s set precision = %.3f(h) %.3f(m) \t '
+              '(%d samples)' % (datetime.now(), step, self.prefix,
+                                metrics['precision/hours'],
+                                metrics['precision/minutes'],
+                                metrics['sample_count']))
+        print('%s: [eval step %d] %s set time error = %.3fm (total) \t'
+              ' %.3f(h) %.3f(m)'
+              % (datetime.now(), step, self.prefix, metrics['error/combined'],
+                 metrics['error/hours_only'], metrics['error/minutes_only']))
+
+        # Tags are e.g. training_precision/hours, training_error/combined.
+        self.metric_logger.log(step, dict(
+            (name, value) for (name, value) in metrics.items()
+            if name != 'sample_count'))
@@ -4,8 +4,11 @@ Run this pipeline separately from the clock_training pipeline, and it will
 evaluate the performance of the latest trained model available. You can run
 this in parallel to see how the test-set performance improves per iterations.
 
-By default it evaluates the model every few seconds (eval_interval_secs), but
-you can also evaluate once and quit.
+By default it evaluates every new checkpoint of the latest run, once, as soon
+as it is written (see clock_watcher.py), but you can also evaluate the latest
+checkpoint once and quit (run_once). The metrics are recorded in the catalog
+of the runs (see clock_catalog.py), so a restarted evaluation only evaluates
+the new checkpoints.
 
 It saves the output to a separate summary directory, so you can run another
 Tensorboard instance.
@@ -25,8 +28,14 @@ from datetime import datetime
 import numpy as np
 import tensorflow as tf
 
+import clock_catalog
+import clock_checkpoints
 import clock_model
 import clock_data
+import clock_memory
+import clock_metrics
+import clock_streaming_metrics
+import clock_watcher
 
 FLAGS = tf.compat.v1.app.flags.FLAGS
 
@@ -35,221 +44,253 @@ tf.compat.v1.app.flags.DEFINE_string('eval_dir', './tf_eval',
 tf.compat.v1.app.flags.DEFINE_string('checkpoint_dir', './tf_data',
                            """Directory where to read model checkpoints.""")
 tf.compat.v1.app.flags.DEFINE_integer('eval_interval_secs', 30,
-                            """How often to run the eval.""")
+                            """How often to look for new checkpoints.""")
 tf.compat.v1.app.flags.DEFINE_boolean('run_once', False,
                             """Whether to run eval only once.""")
+tf.compat.v1.app.flags.DEFINE_boolean('eval_inotify', True,
+                            """Wait for new checkpoints with inotify (if """
+                            """available) rather than polling.""")
 
+# Rows scored at once by compute_precision() and compute_time_errors().
+EVAL_CHUNK_SIZE = 1 << 20
 
-def find_model_dir(base_dir):
-    # Get the latest model checkpoint folder from a bunch of date-named folders
-    # inside the base directory.
 
-    directories = tf.compat.v1.gfile.ListDirectory(base_dir)
+def find_model_dir(base_dir):
+    # Get the latest run directory inside the base directory: from the catalog
+    # (see clock_catalog) if it has one, otherwise the most recently modified
+    # one (the run_HH.MM.SS names don't sort across days).
+    if tf.io.gfile.exists(os.path.join(base_dir,
+                                       clock_catalog.CATALOG_FILENAME)):
+        latest = clock_catalog.Catalog(base_dir).latest_run()
+        if latest is not None and tf.io.gfile.isdir(latest):
+            return latest
+
+    if not tf.io.gfile.isdir(base_dir):
+        return None
+    directories = [os.path.join(base_dir, name.rstrip('/')) for name in
+                   tf.compat.v1.gfile.ListDirectory(base_dir)]
+    directories = [d for d in directories if tf.io.gfile.isdir(d)]
     if not directories:
         return None
-    latest = directories[-1]
-
-    return os.path.join(base_dir, latest)
-
-
-def load_model(session, saver):
-    ckpt_dir = find_model_dir(FLAGS.checkpoint_dir)
-    print('Trying to load model from: {}...'.format(ckpt_dir))
-
-    # Get directory for latest run inside checkpoints folder: run_HH.MM.SS.
-    ckpt = tf.train.get_checkpoint_state(ckpt_dir)
-    if ckpt and ckpt.model_checkpoint_path:
-        # Restores from checkpoint
-        saver.restore(session, ckpt.model_checkpoint_path)
-        # Get global step from filename of the form model.ckpt-NNNN.
-        global_step = ckpt.model_checkpoint_path.split('/')[-1].split('-')[-1]
-        print('Loaded saved model from step {}'.format(global_step))
-        return global_step
-    else:
-        print('No checkpoint file found, cannot load model.')
+
+    return max(directories, key=lambda d: tf.io.gfile.stat(d).mtime_nsec)
+
+
+def watch_run(watcher, model_dir, catalog, dataset):
+    """
+    Watch the checkpoints of the latest run.
+
+    :param watcher: CheckpointWatcher of the run watched so far, or None.
+    :param model_dir: Latest run directory (see find_model_dir()).
+    :param catalog: Catalog with the steps already evaluated.
+    :param dataset: Data set of the evaluations (see clock_catalog).
+    :return: CheckpointWatcher of model_dir: the given one, or a new one if a
+    newer run was started (the given one is then closed).
+    """
+    if watcher is not None and watcher.checkpoint_dir == model_dir:
+        return watcher
+    if watcher is not None:
+        watcher.close()
+    print('Watching {} for checkpoints...'.format(model_dir))
+    return clock_watcher.CheckpointWatcher(
+        model_dir, catalog.evaluated_steps(model_dir, dataset),
+        poll_secs=FLAGS.eval_interval_secs, use_inotify=FLAGS.eval_inotify)
+
+
+def restore_checkpoint(session, saver, checkpoint_path):
+    """
+    Restore the variables of the evaluation session from a checkpoint.
+
+    :return: Global step of the checkpoint, or None if the checkpoint is gone
+    (e.g. deleted by the retention policy of the training run).
+    """
+    try:
+        saver.restore(session, checkpoint_path)
+    except (tf.errors.NotFoundError, ValueError):
+        if tf.io.gfile.exists(checkpoint_path + '.index'):
+            raise  # The checkpoint is there, but not the variables.
+        print('Checkpoint {} not found, skipping it.'.format(checkpoint_path))
         return None
+    # Get global step from filename of the form model.ckpt-NNNN.
+    global_step = clock_checkpoints.checkpoint_step(checkpoint_path)
+    print('Loaded saved model from step {}'.format(global_step))
+    return global_step
+
 
+def eval_all(sess, coord, global_step, metric_logger, streaming_metrics,
+             num_records):
+    """ Evaluate all samples in a single pass, compute statistics.
 
-def eval_aggregate(saver, summary_writer, top_k_ops, num_records,
-                   models, labels):
-    """ Evaluate all samples in aggregate, compute statistics.
+    Every batch is pulled once and added to the confusion matrix of the times,
+    in the graph (see clock_streaming_metrics); all the metrics (precision,
+    time errors, the list of mistakes) are computed from it. The ops are built
+    once by evaluate(); the results are logged as Python values by the
+    metric_logger.
+
+    :return: dict of metric name -> value.
     """
-    with tf.Session() as sess:
-
-        global_step = load_model(sess, saver)
-        if global_step is None:
-            return
-
-        # Start the queue runners.
-        coord = tf.train.Coordinator()
-        threads = []
-        try:
-            for qr in tf.get_collection(tf.GraphKeys.QUEUE_RUNNERS):
-                threads.extend(qr.create_threads(sess, coord=coord, daemon=True,
-                                                 start=True))
-
-            # This is the classification accuracy (how often do we get classes
-            # correct).
-            precisions, total_count = clock_model.evaluate_precision(
-                sess, coord, num_records, FLAGS.batch_size, top_k_ops)
-            precision_h, precision_m = precisions
-
-            print('%s: Test set precision = %.3f(h) %.3f(m) \t '
-                  '(%d samples)' % (datetime.now(), precision_h,
-                                    precision_m, total_count))
-
-            # This is the actual time error (how many minutes off we are from
-            # the truth).
-            time_error_losses = clock_model.time_error_loss(
-                models[0], models[1], labels[0], labels[1])
-            (time_err_c, time_err_h, time_err_m) = sess.run(time_error_losses)
-
-            print('%s: Test set time error = %.3fm (combined) \t'
-                  ' %.3f(h) %.3f(m)'
-                  % (datetime.now(), time_err_c, time_err_h, time_err_m))
-
-            # Add everything to the summary writer.
-            precision_summary_h = tf.scalar_summary(
-                'test_precision/hours', precision_h)
-            precision_summary_m = tf.scalar_summary(
-                'test_precision/minutes', precision_m)
-            precision_summary_c = tf.scalar_summary(
-                'test_precision/combined',
-                (precision_h + precision_m) * 0.5)
-
-            time_summary_c = tf.scalar_summary(
-                'test_error/combined', time_err_c)
-            time_summary_h = tf.scalar_summary(
-                'test_error/hours_only', time_err_h)
-            time_summary_m = tf.scalar_summary(
-                'test_error/minutes_only', time_err_m)
-
-            summaries = sess.run(
-                [precision_summary_c, precision_summary_h, precision_summary_m,
-                 time_summary_c, time_summary_h, time_summary_m])
-            for summary in summaries:
-                summary_writer.add_summary(summary, global_step)
-
-        except Exception as e:  # pylint: disable=broad-except
-            coord.request_stop(e)
-
-        coord.request_stop()
-        coord.join(threads, stop_grace_period_secs=10)
-
-
-def eval_samples(saver, summary_writer, models, labels):
-    # Evaluate individual samples and print their predictions.
-    with tf.Session() as sess:
-
-        global_step = load_model(sess, saver)
-        if global_step is None:
-            return
-
-        # Start the queue runners.
-        coord = tf.train.Coordinator()
-        threads = []
-        try:
-            for qr in tf.get_collection(tf.GraphKeys.QUEUE_RUNNERS):
-                threads.extend(qr.create_threads(sess, coord=coord, daemon=True,
-                                                 start=True))
-                pass
-
-            predicted_times, true_times, sample_count = \
-                clock_model.compute_time_predictions(
-                    sess, coord, models, labels, num_records=FLAGS.batch_size,
-                    batch_size=FLAGS.batch_size)
-            time_errors = compute_time_errors(predicted_times, true_times)
-
-            # This is the actual time error (how many minutes off we are from
-            # the truth).
-            time_error_losses = clock_model.time_error_loss(
-                models[0], models[1], labels[0], labels[1])
-            (time_err_c, time_err_h, time_err_m) = sess.run(time_error_losses)
-
-            print('%s: Test set time error = %.3fm (combined) \t'
-                  ' %.3f(h) %.3f(m)'
-                  % (datetime.now(), time_err_c, time_err_h, time_err_m))
-
-
-            print('Showing mistakes only:')
-            correct_count = 0
-
-            for (idx, (p, t)) in enumerate(zip(predicted_times, true_times)):
-                if p == t:  # Don't show correct predictions.
-                    correct_count += 1
-                    continue
-
-                print('   Predicted {:02d}\'{:02d} -- Actual {:02d}\'{:02d} '
-                      '\t Error: {:.2f}'.format(
-                    p[0], p[1], t[0], t[1], time_errors[idx, 0]))
-            print('Skipped {} correct examples'.format(correct_count))
-
-        except Exception as e:  # pylint: disable=broad-except
-            coord.request_stop(e)
-
-        coord.request_stop()
-        coord.join(threads, stop_grace_period_secs=10)
-
-    pass
-
-
-def compute_precision(predicted_times, true_times):
+    confusion = streaming_metrics.evaluate(sess, coord, num_records,
+                                           FLAGS.batch_size)
+    metrics = clock_streaming_metrics.time_metrics(confusion)
+    sample_count = metrics.pop('sample_count')
+
+    print_mistakes(confusion)
+
+    # This is the classification accuracy (how often do we get classes
+    # correct).
+    print('%s: Test set precision = %.3f(h) %.3f(m) \t '
+          '(%d samples)' % (datetime.now(), metrics['precision/hours'],
+                            metrics['precision/minutes'], sample_count))
+
+    # This is the actual time error (how many minutes off we are from
+    # the truth).
+    print('%s: Test set time error = %.3fm (combined) \t'
+          ' %.3f(h) %.3f(m) \t median %.1fm, 90%% %.1fm'
+          % (datetime.now(), metrics['error/combined'],
+             metrics['error/hours_only'], metrics['error/minutes_only'],
+             metrics['error/p50'], metrics['error/p90']))
+
+    # Add everything to the summary writer.
+    metric_logger.log(int(global_step), metrics)
+    return metrics
+
+
+def print_mistakes(confusion):
+    # Print the (predicted, actual) times that are not exactly correct, with
+    # their number of samples.
+    print('Showing mistakes only:')
+    correct_count = int(np.trace(confusion))
+
+    true, predicted, counts = \
+        clock_streaming_metrics.sparse_confusion(confusion)
+    for (t, p, count) in zip(true, predicted, counts):
+        if t == p:  # Don't show correct predictions.
+            continue
+        error = min((p - t) % 720, (t - p) % 720)
+        print('   Predicted {:02d}\'{:02d} -- Actual {:02d}\'{:02d} '
+              '\t Error: {:.2f} \t ({} samples)'.format(
+            p // 60, p % 60, t // 60, t % 60, error, count))
+    print('Skipped {} correct examples'.format(correct_count))
+
+
+def _as_times(times):
+    # [N, 2] array of (hours, minutes), from an array or a list of tuples.
+    return np.asarray(times).reshape(-1, 2)
+
+
+def compute_precision(predicted_times, true_times,
+                      chunk_size=EVAL_CHUNK_SIZE):
     """
     Compute percentage of exactly correct times.
-    :param predicted_times:
-    :param true_times:
+    :param predicted_times: [N, 2] array (or list of tuples) of
+    (hours, minutes).
+    :param true_times: [N, 2] array (or list of tuples) of (hours, minutes).
+    :param chunk_size: Number of rows compared at once.
     :return: float, percentage of times that are exactly correct.
     """
+    predicted_times = _as_times(predicted_times)
+    true_times = _as_times(true_times)
 
     correct = 0
-    for (predicted, true) in zip(predicted_times, true_times):
-        if predicted == true:
-            correct += 1
+    for start in range(0, len(predicted_times), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        correct += int(np.count_nonzero(np.all(
+            predicted_times[chunk] == true_times[chunk], axis=1)))
     correct_percentage = float(correct) / len(predicted_times)
 
     return correct_percentage
 
 
-def compute_time_errors(predicted_times, true_times):
+def _wraparound(delta, period):
+    # Distance on a circle of the given period.
+    return np.minimum(delta % period, -delta % period)
+
+
+def compute_time_errors(predicted_times, true_times,
+                        chunk_size=EVAL_CHUNK_SIZE):
     """
     Compute the time-telling error. We compute the aggregate error (expressed
     in minutes), but also the number of hours and minutes separately.
 
-    :param predicted_times:
-    :param true_times:
+    :param predicted_times: [N, 2] array (or list of tuples) of
+    (hours, minutes).
+    :param true_times: [N, 2] array (or list of tuples) of (hours, minutes).
+    :param chunk_size: Number of rows computed at once, which bounds the
+    memory used by intermediate arrays.
     :return: N x 3 np array, where each row is
     [total_error_in_minutes, hours_error, minute_error].
     """
+    predicted_times = _as_times(predicted_times)
+    true_times = _as_times(true_times)
 
     errors = np.zeros((len(predicted_times), 3))
-    for (idx, (predicted, true)) in enumerate(zip(predicted_times, true_times)):
-
-        time_predicted = 60 * predicted[0] + predicted[1]
-        time_real = 60 * true[0] + true[1]
-        delta_t = time_predicted - time_real
+    for start in range(0, len(predicted_times), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        # int32, so that int16 predictions do not overflow below.
+        predicted = predicted_times[chunk].astype(np.int32)
+        true = true_times[chunk].astype(np.int32)
 
-        delta_h = predicted[0] - true[0]
-        delta_m = predicted[1] - true[1]
+        delta_h = predicted[:, 0] - true[:, 0]
+        delta_m = predicted[:, 1] - true[:, 1]
+        delta_t = 60 * delta_h + delta_m
 
         # Account for wraparound times.
-        errors[idx, 0] = min(delta_t % 720, -delta_t % 720)
-
-        errors[idx, 1] = min(delta_h % 12, -delta_h % 12)
-        errors[idx, 2] = min(delta_m % 60, -delta_m % 60)
+        errors[chunk, 0] = _wraparound(delta_t, 720)
+        errors[chunk, 1] = _wraparound(delta_h, 12)
+        errors[chunk, 2] = _wraparound(delta_m, 60)
     return errors
 
 
+def evaluate_checkpoint(checkpoint_path, arch, filename, batch_size):
+    """
+    Time error and precision of a trained model, on (at least) all the images
+    of an index file.
+
+    :return: dict with 'time_error' (mean, in minutes) and 'precision'
+    (mean of the hours and minutes precision).
+    """
+    with tf.Graph().as_default():
+        images, labels, num_records, _ = clock_data.load_inputs_both(
+            batch_size=batch_size, filename=filename)
+        models = clock_model.inference_multitask(images, arch=arch)
+        predictions = clock_model.time_predictions(models, labels)
+
+        variable_averages = tf.compat.v1.train.ExponentialMovingAverage(
+            clock_model.MOVING_AVERAGE_DECAY)
+        saver = tf.compat.v1.train.Saver(
+            variable_averages.variables_to_restore())
+
+        with tf.compat.v1.Session() as sess:
+            saver.restore(sess, checkpoint_path)
+            coord = tf.compat.v1.train.Coordinator()
+            threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                             coord=coord)
+            predicted, true, _ = clock_model.compute_time_predictions(
+                sess, coord, predictions, num_records, batch_size)
+            coord.request_stop()
+            coord.join(threads, stop_grace_period_secs=10)
+
+    time_errors = compute_time_errors(predicted, true)
+    return {'time_error': float(np.mean(time_errors[:, 0])),
+            'precision': float(np.mean(predicted == true))}
+
+
 def evaluate(summary_path):
     """ Periodically evaluate the latest-available model.
 
     Sets up the same graph (defined in clock_model), then periodically searches
     for (and loads) the latest available
     """
+    # Memory use of each phase (if --memory_profile is set).
+    memory = clock_memory.from_flags()
+    memory.start_phase('build_graph')
+
     with tf.Graph().as_default() as g:
         # Get images and labels for CIFAR-10.
+        filename = 'clocks_test.txt'
         images, (labels_hours, labels_minutes), num_records, num_classes = \
             clock_data.load_inputs_both(
-                batch_size=FLAGS.batch_size, filename='clocks_test.txt')
+                batch_size=FLAGS.batch_size, filename=filename)
         print('Loaded {} test images.'.format(num_records))
 
         # Build a Graph that computes the logits predictions from the
@@ -257,43 +298,93 @@ def evaluate(summary_path):
         print('Building model...')
         (logits_hours, logits_minutes) = clock_model.inference_multitask(images)
 
-        # Calculate whether prediction is correct or not.
-        top_k_op_h = tf.nn.in_top_k(logits_hours, labels_hours, 1)
-        top_k_op_m = tf.nn.in_top_k(logits_minutes, labels_minutes, 1)
-        top_k_ops = [top_k_op_h, top_k_op_m]
+        # Confusion matrix of the times, accumulated batch by batch: all the
+        # metrics (precision, time errors, mistakes) are computed from it.
+        streaming_metrics = clock_streaming_metrics.StreamingTimeMetrics(
+            clock_model.time_predictions(
+                (logits_hours, logits_minutes),
+                (labels_hours, labels_minutes)))
 
         # Restore the moving average version of the learned variables for eval.
-        variable_averages = tf.train.ExponentialMovingAverage(
+        variable_averages = tf.compat.v1.train.ExponentialMovingAverage(
             clock_model.MOVING_AVERAGE_DECAY)
         variables_to_restore = variable_averages.variables_to_restore()
-        saver = tf.train.Saver(variables_to_restore)
-
-        # Build the summary operation based on the TF collection of Summaries.
-        summary_op = tf.merge_all_summaries()
-
-        summary_writer = tf.train.SummaryWriter(summary_path, g)
-
-        # Run the evaluation every few seconds.
-        while True:
-
-            do_samples = False
-            do_samples = True
-
-            do_aggregate = False
-            do_aggregate = True
-
-            if do_samples:
-                eval_samples(saver, summary_writer, (logits_hours, logits_minutes), (labels_hours, labels_minutes))
-            if do_aggregate:
-                eval_aggregate(saver, summary_writer, top_k_ops, num_records,
-                               (logits_hours, logits_minutes),
-                               (labels_hours, labels_minutes))
-
-            if FLAGS.run_once:
-                break
-            print('{}: sleeping {} seconds'.format(
-                datetime.now(), FLAGS.eval_interval_secs))
-            time.sleep(FLAGS.eval_interval_secs)
+        saver = tf.compat.v1.train.Saver(variables_to_restore)
+
+        summary_writer = tf.compat.v1.summary.FileWriter(summary_path, g)
+        metric_logger = clock_metrics.MetricLogger(summary_writer,
+                                                   prefix='test_')
+
+        # All the ops are built: make sure the evaluation loop doesn't add any.
+        g.finalize()
+
+        # The evaluations are recorded in the catalog of the runs, so that a
+        # restarted evaluation skips the evaluated checkpoints.
+        catalog = clock_catalog.Catalog(FLAGS.checkpoint_dir)
+        dataset = clock_catalog.dataset_name(filename)
+
+        # One session for all the checkpoints: only the variables are
+        # restored for each one.
+        memory.start_phase('start')
+        with tf.compat.v1.Session() as sess:
+            coord = tf.compat.v1.train.Coordinator()
+            threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                             coord=coord)
+            watcher = None
+            try:
+                while not coord.should_stop():
+                    model_dir = find_model_dir(FLAGS.checkpoint_dir)
+                    if model_dir is not None and FLAGS.run_once:
+                        latest = catalog.latest_checkpoint(model_dir)
+                        checkpoint_path = latest['path'] if latest else \
+                            tf.train.latest_checkpoint(model_dir)
+                        step = None if checkpoint_path is None else \
+                            clock_checkpoints.checkpoint_step(checkpoint_path)
+                    elif model_dir is not None:
+                        watcher = watch_run(watcher, model_dir, catalog,
+                                            dataset)
+                        # Wait for a checkpoint, but look for a newer run
+                        # every eval_interval_secs.
+                        found = watcher.next_checkpoint(
+                            timeout=FLAGS.eval_interval_secs)
+                        if found is None:
+                            continue
+                        step, checkpoint_path = found
+                    else:
+                        checkpoint_path = None
+
+                    if checkpoint_path is None:
+                        print('No checkpoint file found, cannot load model.')
+                    elif restore_checkpoint(sess, saver,
+                                            checkpoint_path) is not None:
+                        memory.start_phase('evaluate')
+                        if memory.wants_trace('evaluate'):
+                            # A traced batch (eval_all resets the metrics).
+                            sess.run(streaming_metrics.reset_op)
+                            memory.run(sess, streaming_metrics.update_op,
+                                       'evaluate')
+                        metrics = eval_all(sess, coord, step, metric_logger,
+                                           streaming_metrics, num_records)
+                        catalog.add_evaluation(checkpoint_path, dataset,
+                                               metrics, step=step)
+                        memory.write_report(FLAGS.memory_profile_dir or
+                                            summary_path)
+
+                    if FLAGS.run_once:
+                        break
+                    if watcher is None:
+                        print('{}: sleeping {} seconds'.format(
+                            datetime.now(), FLAGS.eval_interval_secs))
+                        time.sleep(FLAGS.eval_interval_secs)
+            except Exception as e:  # pylint: disable=broad-except
+                coord.request_stop(e)
+            finally:
+                if watcher is not None:
+                    watcher.close()
+
+            coord.request_stop()
+            coord.join(threads, stop_grace_period_secs=10)
+        summary_writer.close()
 
 
 def main(argv=None):  # pylint: disable=unused-argument
@@ -301,7 +392,7 @@ def main(argv=None):  # pylint: disable=unused-argument
     time_str = time.strftime('%H.%M.%S')
     summary_path = os.path.join(FLAGS.eval_dir, 'eval_{}'.format(time_str))
 
-    tf.io.gfile.MakeDirs(summary_path)
+    tf.io.gfile.makedirs(summary_path)
     evaluate(summary_path)
 
 
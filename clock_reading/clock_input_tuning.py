@@ -0,0 +1,213 @@
+""" Auto-tuning of the input pipeline (--input_autotune).
+
+The training steps wait on the batch queue when the decoding threads can't
+keep up; a larger queue absorbs the jitter of the decoding, but holds more
+images in memory. Before training, the tuner runs a few warm-up training steps
+(of the real model, on the real input pipeline) with candidate settings, and
+for each measures:
+ - the fraction of the step time spent waiting on the input queue (from a
+   software trace of each step, see clock_trace.step_breakdown),
+ - the occupancy of the batch queue before each step.
+
+It starts from a single thread and one prefetched batch, then doubles the
+number of threads (up to the number of CPUs) while the input wait is above
+the target, and then the number of prefetched batches. It stops growing a
+setting when doubling it doesn't reduce the wait by at least 20% (e.g. the
+host is out of cores), so that no memory or threads are spent for nothing.
+
+The chosen settings are set as the flags of clock_data.py, printed as
+command-line flags (to pin them in production runs), and written to
+INPUT_SETTINGS_FILENAME in the run directory with all the measurements.
+With --hard_example_mining, the warm-up steps sample the records as the
+training does, but the records are batched in order by a single thread: only
+the prefetched batches are tuned.
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import clock_data
+import clock_model
+import clock_sampler
+import clock_step_metrics
+import clock_trace
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_boolean('input_autotune', False,
+                            """Tune --input_threads and """
+                            """--input_prefetch_batches on warm-up steps """
+                            """before training.""")
+tf.compat.v1.app.flags.DEFINE_integer('input_autotune_steps', 24,
+                            """Warm-up steps per candidate setting.""")
+tf.compat.v1.app.flags.DEFINE_float('input_autotune_target_wait', 0.05,
+                          """Acceptable fraction of the step time spent """
+                          """waiting on the input queue.""")
+tf.compat.v1.app.flags.DEFINE_integer('input_autotune_max_threads', 0,
+                            """Maximum number of input threads (0: the """
+                            """number of CPUs).""")
+
+# Measurements and chosen settings, written to the run directory.
+INPUT_SETTINGS_FILENAME = 'input_settings.json'
+
+MAX_PREFETCH_BATCHES = 8
+# Relative reduction of the input wait that justifies doubling a setting.
+MIN_IMPROVEMENT = 0.2
+
+
+def measure(filename, batch_size, num_threads, prefetch_batches, num_steps):
+    """
+    Train for a few steps with the given input settings (and the sampler
+    of the training, see clock_sampler.from_flags()).
+
+    The first quarter of the steps are not measured: the queue is full when
+    the training starts.
+
+    :return: dict with the settings ('threads', 'prefetch_batches',
+    'capacity'), 'wait_fraction' (of the step time spent waiting on the
+    input queue), 'queue_fill' (mean fraction of the batch queue filled before
+    a step) and 'examples_per_sec'.
+    """
+    previous = (FLAGS.input_threads, FLAGS.input_prefetch_batches)
+    FLAGS.input_threads = num_threads
+    FLAGS.input_prefetch_batches = prefetch_batches
+    try:
+        with tf.Graph().as_default():
+            global_step = tf.Variable(0, trainable=False)
+            sampler = clock_sampler.from_flags()
+            images, labels, num_records, _ = clock_data.load_inputs_both(
+                batch_size=batch_size, filename=filename, sampler=sampler)
+            logits = clock_model.inference_multitask(images, is_training=True)
+            loss = clock_model.loss_multitask(logits[0], labels[0],
+                                              logits[1], labels[1])
+            if sampler is not None:
+                sampler.add_update(clock_model.example_losses_multitask(
+                    logits[0], labels[0], logits[1], labels[1]))
+            train_op = clock_model.train(loss, global_step,
+                                         num_examples_per_epoch=num_records,
+                                         total_steps=num_steps + 1)
+            queue_fill = clock_step_metrics.queue_fill_ops(
+                [runner for runner in tf.compat.v1.get_collection(
+                    tf.compat.v1.GraphKeys.QUEUE_RUNNERS)
+                 if 'batch' in runner.queue.name])
+            init = tf.group(tf.compat.v1.global_variables_initializer(),
+                            tf.compat.v1.local_variables_initializer())
+            options = tf.compat.v1.RunOptions(
+                trace_level=tf.compat.v1.RunOptions.SOFTWARE_TRACE)
+
+            with tf.compat.v1.Session() as sess:
+                sess.run(init)
+                coord = tf.compat.v1.train.Coordinator()
+                threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                                 coord=coord)
+
+                num_warmup = num_steps // 4
+                for _ in range(num_warmup):
+                    sess.run(train_op)
+
+                fills = []
+                wall_time = 0
+                input_wait = 0
+                start_time = time.time()
+                for _ in range(num_steps - num_warmup):
+                    fills.append(np.mean(list(sess.run(queue_fill).values())))
+                    run_metadata = tf.compat.v1.RunMetadata()
+                    sess.run(train_op, options=options,
+                             run_metadata=run_metadata)
+                    _, step_wall_time, step_input_wait = \
+                        clock_trace.step_breakdown(sess.graph,
+                                                   run_metadata.step_stats)
+                    wall_time += step_wall_time
+                    input_wait += step_input_wait
+                duration = time.time() - start_time
+
+                coord.request_stop()
+                coord.join(threads, stop_grace_period_secs=10)
+    finally:
+        FLAGS.input_threads, FLAGS.input_prefetch_batches = previous
+
+    return {'threads': num_threads, 'prefetch_batches': prefetch_batches,
+            'capacity': clock_data.queue_capacity(
+                batch_size, prefetch_batches=prefetch_batches,
+                min_after_dequeue=0 if sampler is not None else None),
+            'wait_fraction': input_wait / float(max(wall_time, 1)),
+            'queue_fill': float(np.mean(fills)),
+            'examples_per_sec': batch_size * (num_steps - num_warmup) /
+            duration}
+
+
+def tune(filename, batch_size, num_steps, target_wait, max_threads):
+    """
+    Search the input settings (see the module docstring).
+
+    :return: (the chosen measurement, list of all the measurements).
+    """
+    results = []
+
+    def run(num_threads, prefetch_batches):
+        result = measure(filename, batch_size, num_threads,
+                         prefetch_batches, num_steps)
+        print('  {} threads, {} prefetched batches: input wait {:.1f}%, '
+              'queue {:.0f}% full, {:.1f} examples/sec'.format(
+                  num_threads, prefetch_batches,
+                  100 * result['wait_fraction'], 100 * result['queue_fill'],
+                  result['examples_per_sec']))
+        results.append(result)
+        return result
+
+    best = run(1, 1)
+    for setting, limit in (('threads', max_threads),
+                           ('prefetch_batches', MAX_PREFETCH_BATCHES)):
+        while best['wait_fraction'] > target_wait and \
+                best[setting] * 2 <= limit:
+            candidate = dict(best)
+            candidate[setting] *= 2
+            result = run(candidate['threads'], candidate['prefetch_batches'])
+            if result['wait_fraction'] > \
+                    (1 - MIN_IMPROVEMENT) * best['wait_fraction']:
+                break
+            best = result
+    return best, results
+
+
+def autotune(run_dir, filename):
+    """
+    Tune the input settings for the training, set them as the flags of
+    clock_data, and write them to the run directory.
+
+    :return: The chosen measurement (see measure()).
+    """
+    max_threads = FLAGS.input_autotune_max_threads or \
+        multiprocessing.cpu_count()
+    if FLAGS.hard_example_mining:
+        # The sampled records are batched by a single thread.
+        max_threads = 1
+    print('Tuning the input pipeline (batch size {}, up to {} threads)...'
+          .format(FLAGS.batch_size, max_threads))
+    best, results = tune(filename, FLAGS.batch_size,
+                         FLAGS.input_autotune_steps,
+                         FLAGS.input_autotune_target_wait, max_threads)
+
+    FLAGS.input_threads = best['threads']
+    FLAGS.input_prefetch_batches = best['prefetch_batches']
+    settings = {'input_threads': FLAGS.input_threads,
+                'input_prefetch_batches': FLAGS.input_prefetch_batches,
+                'input_min_after_dequeue': FLAGS.input_min_after_dequeue}
+    with tf.io.gfile.GFile(os.path.join(run_dir, INPUT_SETTINGS_FILENAME),
+                           'w') as f:
+        json.dump({'settings': settings, 'batch_size': FLAGS.batch_size,
+                   'chosen': best, 'measurements': results}, f, indent=1,
+                  sort_keys=True)
+    print('Input pipeline settings (input wait {:.1f}%): {}'.format(
+        100 * best['wait_fraction'], ' '.join(
+            '--{}={}'.format(name, value)
+            for (name, value) in sorted(settings.items()))))
+    return best
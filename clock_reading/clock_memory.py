@@ -0,0 +1,269 @@
+""" Memory profiling of training, evaluation and inference (--memory_profile).
+
+A MemoryProfiler splits a run into consecutive phases (e.g. building the
+graph, starting the session and the queues, the training steps) and records
+for each:
+ - the peak RSS of the process during the phase (on Linux, the high-water mark
+   is reset at the start of every phase through /proc/self/clear_refs;
+   elsewhere it is the peak since the start of the process),
+ - the Python allocations (tracemalloc): the peak during the phase, and the
+   lines that allocated the most memory that is still held at its end (e.g. a
+   growing list),
+ - for the traced runs of the phase (see run()): the peak memory of the TF
+   allocators, and the ops that allocated the most (activations, queue
+   buffers, summaries, ...),
+ - the stats of the TF allocators, where the device reports them.
+
+A phase that is run several times (e.g. one evaluation per checkpoint) keeps
+the largest peaks. The report is printed, and written as JSON to
+REPORT_FILENAME in the run directory (or --memory_profile_dir).
+
+When profiling is disabled, the profiler does nothing, and run() is just
+sess.run().
+
+Usage:
+    memory = clock_memory.from_flags()
+    memory.start_phase('build_graph')
+    ...
+    memory.start_phase('train')  # Ends the previous phase.
+    results = memory.run(sess, fetches, 'train')  # Traced, the first time.
+    ...
+    memory.end_phase()
+    memory.write_report(run_dir)
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+import tensorflow as tf
+
+import clock_trace
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_boolean('memory_profile', False,
+                            """Record the memory use of each phase of the """
+                            """run (peak RSS, TF allocations per op, Python """
+                            """allocations), and write a report.""")
+tf.compat.v1.app.flags.DEFINE_string('memory_profile_dir', '',
+                           """Directory of the memory report (default: the """
+                           """run directory).""")
+tf.compat.v1.app.flags.DEFINE_integer('memory_profile_top', 15,
+                            """Number of ops and Python allocation sites in """
+                            """the memory report.""")
+
+REPORT_FILENAME = 'memory_report.json'
+
+MB = 2.0 ** 20
+
+
+def _proc_status_bytes(key):
+    # A memory size (e.g. VmRSS) from /proc/self/status, or None.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(key + ':'):
+                    return int(line.split()[1]) * 1024
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def rss_bytes():
+    """ :return: Current resident set size of the process, or None. """
+    return _proc_status_bytes('VmRSS')
+
+
+def peak_rss_bytes():
+    """ :return: Peak resident set size of the process. """
+    peak = _proc_status_bytes('VmHWM')
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform != 'darwin':  # In kilobytes, except on OSX.
+            peak *= 1024
+    return peak
+
+
+def reset_peak_rss():
+    """
+    Reset the peak RSS to the current RSS (Linux only).
+
+    :return: Whether the peak was reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def allocator_stats():
+    """
+    :return: dict of device -> {'current': bytes, 'peak': bytes} of the TF
+    allocators, for the devices that report them.
+    """
+    stats = {}
+    for device in tf.config.list_logical_devices():
+        try:
+            stats[device.name] = tf.config.experimental.get_memory_info(
+                device.name)
+        except (ValueError, RuntimeError):
+            continue
+    return stats
+
+
+def _top_allocations(before, after, top):
+    # Lines that allocated the most memory between two tracemalloc snapshots.
+    rows = []
+    for stat in after.compare_to(before, 'lineno'):
+        if stat.size_diff <= 0:
+            continue
+        frame = stat.traceback[0]
+        rows.append({'where': '{}:{}'.format(frame.filename, frame.lineno),
+                     'mb': stat.size_diff / MB, 'count': stat.count_diff})
+    rows.sort(key=lambda row: -row['mb'])
+    return rows[:top]
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__),
+         tracemalloc.Filter(False, '<frozen importlib._bootstrap>')))
+
+
+class MemoryProfiler(object):
+
+    def __init__(self, enabled, top=15, trace_runs=1):
+        """
+        :param enabled: Whether to profile (otherwise, do nothing).
+        :param top: Number of ops and Python allocation sites per phase.
+        :param trace_runs: Number of runs traced per phase by run().
+        """
+        self.enabled = enabled
+        self.top = top
+        self.trace_runs = trace_runs
+        self.phases = collections.OrderedDict()
+        self._current = None
+        self._traced = collections.Counter()
+        self._options = tf.compat.v1.RunOptions(
+            trace_level=tf.compat.v1.RunOptions.FULL_TRACE)
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stats(self, name):
+        # Stats of a phase (across its runs).
+        return self.phases.setdefault(name, {
+            'runs': 0, 'seconds': 0.0, 'peak_rss_mb': 0.0,
+            'python_peak_mb': 0.0, 'tf_peak_mb': None, 'top_ops': []})
+
+    def start_phase(self, name):
+        """ Start a phase (and end the current one, if any). """
+        if not self.enabled:
+            return
+        self.end_phase()
+        self._current = {'name': name, 'start_time': time.time(),
+                         'rss_start': rss_bytes(),
+                         'peak_reset': reset_peak_rss(),
+                         'snapshot': _snapshot()}
+        tracemalloc.reset_peak()
+
+    def end_phase(self):
+        if not self.enabled or self._current is None:
+            return
+        current, self._current = self._current, None
+        python_peak = tracemalloc.get_traced_memory()[1]
+        snapshot = _snapshot()
+
+        phase = self._stats(current['name'])
+        phase['runs'] += 1
+        phase['seconds'] += time.time() - current['start_time']
+        phase['peak_rss_mb'] = max(phase['peak_rss_mb'],
+                                   peak_rss_bytes() / MB)
+        phase['peak_rss_is_process_peak'] = not current['peak_reset']
+        if current['rss_start'] is not None:
+            phase['rss_start_mb'] = current['rss_start'] / MB
+            phase['rss_end_mb'] = rss_bytes() / MB
+        phase['python_peak_mb'] = max(phase['python_peak_mb'],
+                                      python_peak / MB)
+        phase['python_growth'] = _top_allocations(current['snapshot'],
+                                                  snapshot, self.top)
+        phase['allocators'] = dict(
+            (device, dict((key, value / MB) for (key, value) in info.items()))
+            for (device, info) in allocator_stats().items())
+
+    def wants_trace(self, phase):
+        """ Whether run() traces the next run of a phase. """
+        return self.enabled and self._traced[phase] < self.trace_runs
+
+    def run(self, sess, fetches, phase, **kwargs):
+        """
+        Same as sess.run(fetches), but with a full trace for the first runs of
+        the phase, to record the memory allocated by each op.
+        """
+        if not self.wants_trace(phase):
+            return sess.run(fetches, **kwargs)
+        self._traced[phase] += 1
+
+        run_metadata = tf.compat.v1.RunMetadata()
+        result = sess.run(fetches, options=self._options,
+                          run_metadata=run_metadata, **kwargs)
+
+        tf_phase = self._stats(phase)
+        tf_peak = clock_trace.peak_memory(run_metadata.step_stats) / MB
+        tf_phase['tf_peak_mb'] = max(tf_phase['tf_peak_mb'] or 0.0, tf_peak)
+        op_memory = clock_trace.op_memory(run_metadata.step_stats)
+        tf_phase['top_ops'] = [
+            {'op': name, 'mb': allocated / MB} for (name, allocated)
+            in sorted(op_memory.items(), key=lambda r: -r[1])[:self.top]]
+        return result
+
+    def report(self):
+        """ :return: The report, as a dict of phase name -> stats. """
+        return dict(self.phases)
+
+    def write_report(self, output_dir):
+        """ Print the report, and write it to REPORT_FILENAME. """
+        if not self.enabled:
+            return
+        self.end_phase()
+        path = os.path.join(output_dir, REPORT_FILENAME)
+        with tf.io.gfile.GFile(path, 'w') as f:
+            json.dump(self.report(), f, indent=1, sort_keys=True)
+
+        print('==================')
+        print('Memory per phase (report written to {}):'.format(path))
+        print('  {:<14s} {:>5s} {:>13s} {:>12s} {:>12s} {:>11s}'.format(
+            'phase', 'runs', 'peak RSS MB', 'RSS end MB', 'Python peak',
+            'TF peak MB'))
+        for (name, phase) in self.phases.items():
+            print('  {:<14s} {:>5d} {:>13.1f} {:>12s} {:>12.1f} {:>11s}'
+                  .format(name, phase['runs'], phase['peak_rss_mb'],
+                          '{:.1f}'.format(phase['rss_end_mb'])
+                          if 'rss_end_mb' in phase else '-',
+                          phase['python_peak_mb'],
+                          '{:.1f}'.format(phase['tf_peak_mb'])
+                          if phase['tf_peak_mb'] is not None else '-'))
+        for (name, phase) in self.phases.items():
+            for row in phase['top_ops'][:5]:
+                print('  {:<14s} op {:<40s} {:>9.2f} MB'.format(
+                    name, row['op'][-40:], row['mb']))
+            for row in phase.get('python_growth', [])[:3]:
+                if row['mb'] < 0.01:
+                    break
+                print('  {:<14s} py {:<40s} {:>9.2f} MB'.format(
+                    name, row['where'][-40:], row['mb']))
+        print('==================')
+
+
+def from_flags():
+    """ Build the memory profiler from the command-line flags. """
+    return MemoryProfiler(FLAGS.memory_profile, top=FLAGS.memory_profile_top)
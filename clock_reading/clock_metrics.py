@@ -0,0 +1,47 @@
+""" Log metrics computed in Python to Tensorboard, without growing the graph.
+
+Creating a tf.summary op for every value we want to log (e.g. every evaluation
+cycle) keeps adding ops to the graph, so memory and the setup time of
+sess.run() creep up over long runs. Instead, we build Summary protobufs
+directly from the Python values and hand them to the summary writer. The graph
+can then be finalized before the training or evaluation loop.
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+
+def scalar_summary(values):
+    """
+    Build a Summary protobuf from Python values, without adding ops to a graph.
+
+    :param values: dict of tag -> float.
+    :return: Summary.
+    """
+    return tf.compat.v1.Summary(value=[
+        tf.compat.v1.Summary.Value(tag=tag, simple_value=float(value))
+        for (tag, value) in sorted(values.items())])
+
+
+class MetricLogger(object):
+
+    def __init__(self, summary_writer, prefix=''):
+        """
+        :param summary_writer: Object with add_summary(summary, global_step).
+        :param prefix: Prepended to every tag, e.g. 'test_'.
+        """
+        self.summary_writer = summary_writer
+        self.prefix = prefix
+
+    def log(self, step, values):
+        """
+        Write scalar values.
+
+        :param step: Global step.
+        :param values: dict of tag -> float, e.g. {'error/combined': 4.2}.
+        """
+        tagged = dict((self.prefix + tag, value)
+                      for (tag, value) in values.items())
+        self.summary_writer.add_summary(scalar_summary(tagged), step)
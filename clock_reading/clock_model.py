@@ -5,6 +5,10 @@ Summary of available functions:
  # Compute inference on the model inputs to make a prediction.
  predictions = inference(inputs)
 
+ # The network architecture is selected with --architecture, or by passing
+ # arch=<name or config> (see clock_architectures).
+ predictions = inference_multitask(inputs, arch='small_bn')
+
  # Compute the total loss of the prediction with respect to the labels.
  loss = loss(predictions, labels)
 
@@ -24,6 +28,7 @@ import re
 import tensorflow as tf
 import numpy as np
 
+import clock_architectures
 import clock_data
 
 FLAGS = tf.compat.v1.app.flags.FLAGS
@@ -31,11 +36,32 @@ FLAGS = tf.compat.v1.app.flags.FLAGS
 # Basic model parameters.
 tf.compat.v1.app.flags.DEFINE_integer('batch_size', 128,
                             """Number of images to process in a batch.""")
+tf.compat.v1.app.flags.DEFINE_string('architecture', 'baseline',
+                           """Network architecture variant (see """
+                           """clock_architectures.ARCHITECTURES).""")
+tf.compat.v1.app.flags.DEFINE_string('optimizer', 'sgd',
+                           """Optimizer: sgd, momentum or adam.""")
+tf.compat.v1.app.flags.DEFINE_float('learning_rate', 0.0,
+                          """Initial (or peak) learning rate. 0 uses the """
+                          """default of the optimizer.""")
+tf.compat.v1.app.flags.DEFINE_string('lr_schedule', 'exponential',
+                           """Learning rate schedule: exponential, cosine """
+                           """or one_cycle.""")
+tf.compat.v1.app.flags.DEFINE_float('momentum', 0.9,
+                          """Momentum of the momentum optimizer.""")
+tf.compat.v1.app.flags.DEFINE_float('weight_decay', 0.004,
+                          """L2 weight decay of the fully connected """
+                          """layers.""")
+tf.compat.v1.app.flags.DEFINE_integer('accumulation_steps', 1,
+                            """Accumulate the gradients of this many """
+                            """batches before applying them (effective """
+                            """batch size: batch_size * accumulation_steps).""")
 
 # Global constants describing the clock data set.
 IMAGE_SIZE1 = clock_data.image_size1
 IMAGE_SIZE2 = clock_data.image_size2
-NUM_EXAMPLES_PER_EPOCH_FOR_TRAIN = 50
+# Used if the size of the data set isn't given to train() (clocks_all.txt).
+NUM_EXAMPLES_PER_EPOCH_FOR_TRAIN = 720
 NUM_EXAMPLES_PER_EPOCH_FOR_EVAL = 10
 
 # Constants describing the training process.
@@ -44,6 +70,35 @@ NUM_EPOCHS_PER_DECAY = 700.0  # Epochs after which learning rate decays.
 LEARNING_RATE_DECAY_FACTOR = 0.1  # Learning rate decay factor.
 INITIAL_LEARNING_RATE = 0.1  # Initial learning rate.
 
+# Initial (or peak) learning rate of each optimizer, unless --learning_rate is
+# given.
+DEFAULT_LEARNING_RATES = {
+    'sgd': INITIAL_LEARNING_RATE,
+    'momentum': 0.01,
+    'adam': 0.001,
+}
+# One-cycle schedule: fraction of the steps spent warming up, and the ratio
+# between the peak and the initial learning rate.
+ONE_CYCLE_WARMUP_FRACTION = 0.3
+ONE_CYCLE_DIV_FACTOR = 25.0
+
+# Constants describing batch normalization (for architectures that use it).
+BATCH_NORM_DECAY = 0.99
+BATCH_NORM_EPSILON = 1e-3
+
+# Collection holding the output of every layer, used for profiling.
+LAYER_ENDPOINTS = 'layer_endpoints'
+
+# Collection holding the learning rate tensor of train().
+LEARNING_RATE = 'learning_rate'
+
+# Collection holding the op that accumulates the gradients of a micro-batch
+# (with --accumulation_steps > 1), see train().
+ACCUMULATE_GRADIENTS = 'accumulate_gradients'
+
+# Variable scopes of the layers shared by the single- and multi-task models.
+SHARED_LAYER_RE = re.compile(r'^(conv|local)[0-9]+/')
+
 # If a model is trained with multiple GPUs, prefix all Op names with tower_name
 # to differentiate the operations. Note that this prefix is removed from the
 # names of the summaries when visualizing a model.
@@ -65,24 +120,29 @@ def _activation_summary(x):
     # Remove 'tower_[0-9]/' from the name in case this is a multi-GPU training
     # session. This helps the clarity of presentation on tensorboard.
     tensor_name = re.sub('%s_[0-9]*/' % TOWER_NAME, '', x.op.name)
-    tf.summary.histogram(tensor_name + '/activations', x)
-    tf.summary.scalar(tensor_name + '/sparsity', tf.nn.zero_fraction(x))
+    tf.compat.v1.summary.histogram(tensor_name + '/activations', x)
+    tf.compat.v1.summary.scalar(tensor_name + '/sparsity',
+                                tf.nn.zero_fraction(x))
 
 
-def _variable_on_cpu(name, shape, initializer):
+def _variable_on_cpu(name, shape, initializer, trainable=True):
     """Helper to create a Variable stored on CPU memory.
 
     Args:
       name: name of the variable
       shape: list of ints
       initializer: initializer for Variable
+      trainable: whether to add the variable to the trainable variables
 
     Returns:
       Variable Tensor
     """
     with tf.device('/cpu:0'):
         var = tf.compat.v1.get_variable(name, shape, initializer=initializer,
-                              dtype=tf.float32)
+                              dtype=tf.float32, trainable=trainable,
+                              collections=[
+                                  tf.compat.v1.GraphKeys.GLOBAL_VARIABLES,
+                                  tf.compat.v1.GraphKeys.MODEL_VARIABLES])
     return var
 
 
@@ -112,34 +172,40 @@ def _variable_with_weight_decay(name, shape, stddev, wd):
     return var
 
 
-def inference(images, num_classes):
+def inference(images, num_classes, arch=None, is_training=False):
     """ Build a time reading model for *either* hours or minutes.
 
     Args:
       images: Images returned from distorted_inputs() or inputs().
       num_classes: 12 for hours, 60 for minutes.
+      arch: Architecture name or config (see clock_architectures). Defaults
+            to --architecture.
+      is_training: Whether the graph is used for training (batch norm uses
+                   batch statistics and updates its moving averages).
 
     Returns:
       Logits.
     """
 
-    local4 = _inference_shared(images)
+    local4 = _inference_shared(images, arch, is_training)
 
+    fc_dim = int(local4.get_shape()[1])
     dim = num_classes
 
     # softmax, i.e. softmax(WX + b)
     with tf.compat.v1.variable_scope('softmax_linear') as scope:
-        weights = _variable_with_weight_decay('weights', [192, dim],
-                                              stddev=1 / 192.0, wd=0.0)
+        weights = _variable_with_weight_decay('weights', [fc_dim, dim],
+                                              stddev=1 / float(fc_dim), wd=0.0)
         biases = _variable_on_cpu('biases', [dim],
                                   tf.constant_initializer(0.0))
         softmax_linear = tf.add(tf.matmul(local4, weights), biases,
                                 name=scope.name)
         _activation_summary(softmax_linear)
+        tf.compat.v1.add_to_collection(LAYER_ENDPOINTS, softmax_linear)
     return softmax_linear
 
 
-def inference_multitask(images):
+def inference_multitask(images, arch=None, is_training=False):
     """
     Builds a time reading model that predicts hours *and* minutes in a
     multi-task setting.
@@ -151,15 +217,20 @@ def inference_multitask(images):
     outputs instead of one.
 
     :param images: Input to to the model.
+    :param arch: Architecture name or config (see clock_architectures).
+    Defaults to --architecture.
+    :param is_training: Whether the graph is used for training.
     :return: tuple of softmax: hours and minutes.
     """
-    local4 = _inference_shared(images)
+    local4 = _inference_shared(images, arch, is_training)
+
+    fc_dim = int(local4.get_shape()[1])
 
     # softmax, i.e. softmax(WX + b)
     with tf.compat.v1.variable_scope('softmax_linear_hours') as scope:
         dim = 12
-        weights = _variable_with_weight_decay('weights', [192, dim],
-                                              stddev=1 / 192.0, wd=0.0)
+        weights = _variable_with_weight_decay('weights', [fc_dim, dim],
+                                              stddev=1 / float(fc_dim), wd=0.0)
         biases = _variable_on_cpu('biases', [dim],
                                   tf.constant_initializer(0.0))
         softmax_linear_hours = tf.add(tf.matmul(local4, weights), biases,
@@ -168,25 +239,79 @@ def inference_multitask(images):
 
     with tf.compat.v1.variable_scope('softmax_linear_minutes') as scope:
         dim = 60
-        weights = _variable_with_weight_decay('weights', [192, dim],
-                                              stddev=1 / 192.0, wd=0.0)
+        weights = _variable_with_weight_decay('weights', [fc_dim, dim],
+                                              stddev=1 / float(fc_dim), wd=0.0)
         biases = _variable_on_cpu('biases', [dim],
                                   tf.constant_initializer(0.0))
         softmax_linear_minutes = tf.add(tf.matmul(local4, weights), biases,
                                         name=scope.name)
         _activation_summary(softmax_linear_minutes)
 
+    tf.compat.v1.add_to_collection(LAYER_ENDPOINTS, softmax_linear_hours)
+    tf.compat.v1.add_to_collection(LAYER_ENDPOINTS, softmax_linear_minutes)
+
     return softmax_linear_hours, softmax_linear_minutes
 
 
-def _inference_shared(images):
+def _batch_norm(x, is_training):
+    """Helper to add batch normalization over the channels of a conv layer.
+
+    During training, normalizes with the batch statistics and adds ops to
+    update the moving mean/variance to the UPDATE_OPS collection (these are
+    run by train()). Otherwise, normalizes with the moving statistics.
+
+    Args:
+      x: 4-D Tensor.
+      is_training: Whether to use the batch statistics.
+    Returns:
+      Normalized Tensor.
+    """
+    channels = int(x.get_shape()[-1])
+    beta = _variable_on_cpu('beta', [channels], tf.constant_initializer(0.0))
+    gamma = _variable_on_cpu('gamma', [channels], tf.constant_initializer(1.0))
+    moving_mean = _variable_on_cpu('moving_mean', [channels],
+                                   tf.constant_initializer(0.0),
+                                   trainable=False)
+    moving_variance = _variable_on_cpu('moving_variance', [channels],
+                                       tf.constant_initializer(1.0),
+                                       trainable=False)
+
+    if is_training:
+        mean, variance = tf.nn.moments(x, [0, 1, 2])
+        for (var, value) in [(moving_mean, mean), (moving_variance, variance)]:
+            update = tf.compat.v1.assign_sub(
+                var, (var - value) * (1.0 - BATCH_NORM_DECAY))
+            tf.compat.v1.add_to_collection(
+                tf.compat.v1.GraphKeys.UPDATE_OPS, update)
+    else:
+        mean, variance = moving_mean, moving_variance
+
+    return tf.nn.batch_normalization(x, mean, variance, beta, gamma,
+                                     BATCH_NORM_EPSILON)
+
+
+def _lrn(x, name):
+    return tf.nn.local_response_normalization(
+        x, 4, bias=1.0, alpha=0.001 / 9.0, beta=0.75, name=name)
+
+
+def _inference_shared(images, arch=None, is_training=False):
     """
     Build the shared layers of the inference model, which can then be used for
     *either* the single-task or multi-task learning objective.
 
-    :param images:
-    :return:
+    The layers are built from an architecture config (see
+    clock_architectures). Each layer output is added to the LAYER_ENDPOINTS
+    collection so it can be profiled.
+
+    :param images: Input images, shape [batch, height, width, channels].
+    :param arch: Architecture name or config. Defaults to --architecture.
+    :param is_training: Whether the graph is used for training.
+    :return: Output of the last fully connected layer.
     """
+    if arch is None:
+        arch = FLAGS.architecture
+    config = clock_architectures.get_architecture(arch)
 
     # We instantiate all variables using tf.get_variable() instead of
     # tf.Variable() in order to share variables across multiple GPU training
@@ -194,67 +319,91 @@ def _inference_shared(images):
     # function by replacing all instances of tf.get_variable() with
     # tf.Variable().
 
-    # conv1
-    with tf.compat.v1.variable_scope('conv1') as scope:
-        kernel = _variable_with_weight_decay('weights',
-                                             shape=[5, 5, 1, 64],
-                                             stddev=5e-2,
-                                             wd=0.0)
-        conv = tf.nn.conv2d(images, kernel, [1, 1, 1, 1], padding='SAME')
-        biases = _variable_on_cpu('biases', [64], tf.constant_initializer(0.0))
-        bias = tf.nn.bias_add(conv, biases)
-        conv1 = tf.nn.relu(bias, name=scope.name)
-        _activation_summary(conv1)
-
-    # pool1
-    pool1 = tf.nn.max_pool(conv1, ksize=[1, 3, 3, 1], strides=[1, 2, 2, 1],
-                           padding='SAME', name='pool1')
-    # norm1
-    norm1 = tf.nn.lrn(pool1, 4, bias=1.0, alpha=0.001 / 9.0, beta=0.75,
-                      name='norm1')
-
-    # conv2
-    with tf.compat.v1.variable_scope('conv2') as scope:
-        kernel = _variable_with_weight_decay('weights',
-                                             shape=[5, 5, 64, 64],
-                                             stddev=5e-2,
-                                             wd=0.0)
-        conv = tf.nn.conv2d(norm1, kernel, [1, 1, 1, 1], padding='SAME')
-        biases = _variable_on_cpu('biases', [64], tf.constant_initializer(0.1))
-        bias = tf.nn.bias_add(conv, biases)
-        conv2 = tf.nn.relu(bias, name=scope.name)
-        _activation_summary(conv2)
-
-    # norm2
-    norm2 = tf.nn.local_response_normalization(
-        conv2, 4, bias=1.0, alpha=0.001 / 9.0, beta=0.75,
-        name='norm2')
-    # pool2
-    pool2 = tf.nn.max_pool(norm2, ksize=[1, 3, 3, 1],
-                           strides=[1, 2, 2, 1], padding='SAME', name='pool2')
-
-    # local3
-    with tf.compat.v1.variable_scope('local3') as scope:
-        # Move everything into depth so we can perform a single matrix multiply.
-        batch_size = int(images.get_shape()[0])
-        reshape = tf.reshape(pool2, [batch_size, -1])
-        dim = reshape.get_shape()[1]
-        weights = _variable_with_weight_decay('weights', shape=[dim, 384],
-                                              stddev=0.04, wd=0.004)
-        biases = _variable_on_cpu('biases', [384], tf.constant_initializer(0.1))
-        local3 = tf.nn.relu(tf.matmul(reshape, weights) + biases,
-                            name=scope.name)
-        _activation_summary(local3)
-
-    # local4
-    with tf.compat.v1.variable_scope('local4') as scope:
-        weights = _variable_with_weight_decay('weights', shape=[384, 192],
-                                              stddev=0.04, wd=0.004)
-        biases = _variable_on_cpu('biases', [192], tf.constant_initializer(0.1))
-        local4 = tf.nn.relu(tf.matmul(local3, weights) + biases,
-                            name=scope.name)
-        _activation_summary(local4)
-    return local4
+    pool_ksize = [1, clock_architectures.POOL_SIZE,
+                  clock_architectures.POOL_SIZE, 1]
+    pool_strides = [1, clock_architectures.POOL_STRIDE,
+                    clock_architectures.POOL_STRIDE, 1]
+
+    net = images
+    for (idx, (out_channels, ksize)) in enumerate(config['conv']):
+        layer_num = idx + 1
+        in_channels = int(net.get_shape()[-1])
+
+        # conv
+        with tf.compat.v1.variable_scope('conv{}'.format(layer_num)) as scope:
+            if config['separable']:
+                depthwise = _variable_with_weight_decay(
+                    'depthwise_weights',
+                    shape=[ksize, ksize, in_channels, 1], stddev=5e-2, wd=0.0)
+                pointwise = _variable_with_weight_decay(
+                    'pointwise_weights',
+                    shape=[1, 1, in_channels, out_channels], stddev=5e-2,
+                    wd=0.0)
+                conv = tf.nn.separable_conv2d(net, depthwise, pointwise,
+                                              [1, 1, 1, 1], padding='SAME')
+            else:
+                kernel = _variable_with_weight_decay(
+                    'weights', shape=[ksize, ksize, in_channels, out_channels],
+                    stddev=5e-2, wd=0.0)
+                conv = tf.nn.conv2d(net, kernel, [1, 1, 1, 1], padding='SAME')
+            # The first conv layer starts with zero biases, later ones with a
+            # small positive bias (as in cifar10).
+            bias_init = 0.0 if idx == 0 else 0.1
+            biases = _variable_on_cpu('biases', [out_channels],
+                                      tf.constant_initializer(bias_init))
+            bias = tf.nn.bias_add(conv, biases)
+            if config['norm'] == 'batch_norm':
+                bias = _batch_norm(bias, is_training)
+            net = tf.nn.relu(bias, name=scope.name)
+            _activation_summary(net)
+            tf.compat.v1.add_to_collection(LAYER_ENDPOINTS, net)
+
+        # The first block pools before normalizing, later blocks normalize
+        # before pooling. This is the order of the original cifar10 model.
+        pool_name = 'pool{}'.format(layer_num)
+        norm_name = 'norm{}'.format(layer_num)
+        if idx == 0:
+            net = tf.nn.max_pool(net, ksize=pool_ksize, strides=pool_strides,
+                                   padding='SAME', name=pool_name)
+            if config['norm'] == 'lrn':
+                net = _lrn(net, norm_name)
+        else:
+            if config['norm'] == 'lrn':
+                net = _lrn(net, norm_name)
+            net = tf.nn.max_pool(net, ksize=pool_ksize, strides=pool_strides,
+                                   padding='SAME', name=pool_name)
+
+    # Move everything into depth so we can perform a single matrix multiply.
+    batch_size = int(images.get_shape()[0])
+    net = tf.reshape(net, [batch_size, -1])
+
+    for (idx, size) in enumerate(config['fc']):
+        layer_name = 'local{}'.format(idx + len(config['conv']) + 1)
+        with tf.compat.v1.variable_scope(layer_name) as scope:
+            dim = int(net.get_shape()[1])
+            weights = _variable_with_weight_decay('weights', shape=[dim, size],
+                                                  stddev=0.04,
+                                                  wd=FLAGS.weight_decay)
+            biases = _variable_on_cpu('biases', [size],
+                                      tf.constant_initializer(0.1))
+            net = tf.nn.relu(tf.matmul(net, weights) + biases,
+                             name=scope.name)
+            _activation_summary(net)
+            tf.compat.v1.add_to_collection(LAYER_ENDPOINTS, net)
+    return net
+
+
+def shared_variables():
+    """
+    Variables of the shared layers built by _inference_shared() (conv* and
+    local*). These are the same for the single-task and multi-task models,
+    which only differ in the softmax layers.
+
+    :return: list of variables in the default graph.
+    """
+    return [var for var in tf.compat.v1.get_collection(
+                tf.compat.v1.GraphKeys.MODEL_VARIABLES)
+            if SHARED_LAYER_RE.match(var.op.name)]
 
 
 def loss(logits, labels):
@@ -285,69 +434,28 @@ def _loss_shared(logits, labels):
     # Calculate the average cross entropy loss across the batch.
     labels = tf.cast(labels, tf.int64)
     cross_entropy = tf.nn.sparse_softmax_cross_entropy_with_logits(
-        logits, labels, name='cross_entropy_per_example')
+        labels=labels, logits=logits, name='cross_entropy_per_example')
     cross_entropy_mean = tf.reduce_mean(cross_entropy, name='cross_entropy')
-    tf.add_to_collection('losses', cross_entropy_mean)
+    tf.compat.v1.add_to_collection('losses', cross_entropy_mean)
 
     # The total loss is defined as the cross entropy loss plus all of the weight
     # decay terms (L2 loss).
-    return tf.add_n(tf.get_collection('losses'), name='total_loss')
+    return tf.add_n(tf.compat.v1.get_collection('losses'), name='total_loss')
 
 
-def time_error_loss(model_h, model_m, label_h, label_m):
-    """
-    Compute the time error (in minutes) of the current model.
-
-    Total time difference is expressed in minutes:
-       1/N sum( delta(PP, TT))
-    where PP and TT are the predicted and true times, expressed in number of
-    minutes.
-    The delta operator takes care of 'wraparound', so that the difference
-    between 9'58 and 10'02 is 4 minutes.
-
-    We also return the individual errors for hours and minutes. Just for fun.
-
-    :param model_h:
-    :param model_m:
-    :param label_h:
-    :param label_m:
-    :return: losses for (combined, hours, minutes)
+def example_losses_multitask(logits_h, labels_h, logits_m, labels_m):
     """
+    Cross entropy of each example (hours + minutes), e.g. for hard-example
+    mining (see clock_sampler).
 
-    # Take classifier argmax for most likely hour/minute, and cast everything to
-    # float32.
-    hours_predicted = tf.cast(tf.argmax(model_h, 1), tf.float32)
-    hours_true = tf.cast(label_h, tf.float32)
-    minutes_predicted = tf.cast(tf.argmax(model_m, 1), tf.float32)
-    minutes_true = tf.cast(label_m, tf.float32)
-
-    delta_time = tf.sub(tf.add(60 * hours_predicted, minutes_predicted),
-                        tf.add(60 * hours_true, minutes_true))
-    delta_hours = tf.sub(hours_predicted, hours_true)
-    delta_minutes = tf.sub(minutes_predicted, minutes_true)
-
-    # TF's mod operator returns negative values:
-    #    -7 mod 3 = -1 (we want 2)
-    # so we need to do a little extra work.
-    def positive_mod(val, div):
-        # Return the positive result of the modulo operator.
-        # Does x = ((v % div) + div) % div
-        return tf.mod(tf.add(tf.mod(val, div), div), div)
-
-    # Handle time wrapping around by comparing the mod of the positive and
-    # negative time differences.
-    time_error_c = tf.minimum(positive_mod(delta_time, 720),
-                              positive_mod(-1 * delta_time, 720))
-    time_error_h = tf.minimum(positive_mod(delta_hours, 12.0),
-                              positive_mod(-1 * delta_hours, 12.0))
-    time_error_m = tf.minimum(positive_mod(delta_minutes, 60.0),
-                              positive_mod(-1 * delta_minutes, 60.0))
-
-    avg_error_c = tf.reduce_mean(time_error_c)
-    avg_error_h = tf.reduce_mean(time_error_h)
-    avg_error_m = tf.reduce_mean(time_error_m)
-
-    return avg_error_c, avg_error_h, avg_error_m
+    :return: 1-D tensor of shape [batch_size].
+    """
+    return tf.add(
+        tf.nn.sparse_softmax_cross_entropy_with_logits(
+            logits=logits_h, labels=tf.cast(labels_h, tf.int64)),
+        tf.nn.sparse_softmax_cross_entropy_with_logits(
+            logits=logits_m, labels=tf.cast(labels_m, tf.int64)),
+        name='example_losses')
 
 
 def evaluate_precision(sess, coord, num_records, batch_size, operators):
@@ -394,7 +502,25 @@ def evaluate_precision(sess, coord, num_records, batch_size, operators):
     return precisions, total_sample_count
 
 
-def compute_time_predictions(sess, coord, models, labels, num_records, batch_size):
+def time_predictions(models, labels):
+    """
+    Build the ops for the predicted and true times of a batch (the most likely
+    class is found in the graph, so only the classes are fetched).
+
+    :param models: The models to evaluate, tuple: (hours, minutes).
+    :param labels: The true labels, tuple: (hours, minutes).
+    :return: (predicted times, true times), each an int16 tensor of shape
+    [batch_size, 2] with rows (hour, minute).
+    """
+    predicted = tf.stack([tf.argmax(models[0], axis=1),
+                          tf.argmax(models[1], axis=1)], axis=1)
+    true = tf.stack([tf.cast(labels[0], tf.int64),
+                     tf.cast(labels[1], tf.int64)], axis=1)
+    return tf.cast(predicted, tf.int16), tf.cast(true, tf.int16)
+
+
+def compute_time_predictions(sess, coord, predictions, num_records, batch_size,
+                             callback=None):
     """
     Compute the time prediction *and* the ground truth time.
 
@@ -403,37 +529,45 @@ def compute_time_predictions(sess, coord, models, labels, num_records, batch_siz
 
     :param sess: TF session
     :param coord: TF training coordinator.
-    :param model: The models to evaluate, tuple: (hours, minutes).
-    :param label: The true labels, tuple: (hours, minutes).
+    :param predictions: The ops built by time_predictions().
     :param num_records: Number of records to evaluate.
     :param batch_size: Batch size for evaluating records.
-    :return: predicted_times, true_times, sample_count. Each time vector a list
-    of tuples with (hour, minute).
+    :param callback: Optional function called with the (predicted, true)
+    arrays of every batch. With a callback, the times are not kept, so that
+    the memory use does not grow with the number of records.
+    :return: predicted_times, true_times, sample_count. Each time array is an
+    int16 array of shape [sample_count, 2] with rows (hour, minute), or None
+    with a callback.
     """
 
-    predicted_times = []
-    true_times = []
-
     # Run on (at least) complete training set, going through as
     # many batches as necessary.
     num_iter = int(np.ceil(num_records / batch_size))
     total_sample_count = num_iter * batch_size
+
+    if callback is None:
+        predicted_times = np.zeros((total_sample_count, 2), dtype=np.int16)
+        true_times = np.zeros((total_sample_count, 2), dtype=np.int16)
+    else:
+        predicted_times, true_times = None, None
+
     batch_num = 0
     while batch_num < num_iter and not coord.should_stop():
 
-        (out_h, out_m, true_h, true_m) = sess.run(
-            [models[0], models[1], labels[0], labels[1]])
-        for (hours_dist, minutes_dist, hour_truth, minute_truth) in zip(
-                out_h, out_m, true_h, true_m):
-            # Find the most likely class.
-            hour_predicted = np.argmax(hours_dist)
-            minute_predicted = np.argmax(minutes_dist)
-
-            predicted_times.append((hour_predicted, minute_predicted))
-            true_times.append((hour_truth, minute_truth))
+        (predicted, true) = sess.run(predictions)
+        if callback is None:
+            batch = slice(batch_num * batch_size, (batch_num + 1) * batch_size)
+            predicted_times[batch] = predicted
+            true_times[batch] = true
+        else:
+            callback(predicted, true)
 
         batch_num += 1
 
+    if callback is None and batch_num < num_iter:
+        # Stopped early: only keep the evaluated samples.
+        predicted_times = predicted_times[:batch_num * batch_size]
+        true_times = true_times[:batch_num * batch_size]
     return predicted_times, true_times, total_sample_count
 
 
@@ -449,8 +583,8 @@ def _add_loss_summaries(total_loss):
       loss_averages_op: op for generating moving averages of losses.
     """
     # Compute the moving average of all individual losses and the total loss.
-    loss_averages = tf.train.ExponentialMovingAverage(0.9, name='avg')
-    losses = tf.get_collection('losses')
+    loss_averages = tf.compat.v1.train.ExponentialMovingAverage(0.9, name='avg')
+    losses = tf.compat.v1.get_collection('losses')
     loss_averages_op = loss_averages.apply(losses + [total_loss])
 
     # Attach a scalar summary to all individual losses and the total loss; do the
@@ -458,67 +592,199 @@ def _add_loss_summaries(total_loss):
     for l in losses + [total_loss]:
         # Name each loss as '(raw)' and name the moving average version of the loss
         # as the original loss name.
-        tf.scalar_summary(l.op.name + ' (raw)', l)
-        tf.scalar_summary(l.op.name, loss_averages.average(l))
+        tf.compat.v1.summary.scalar(l.op.name + ' (raw)', l)
+        tf.compat.v1.summary.scalar(l.op.name, loss_averages.average(l))
 
     return loss_averages_op
 
 
-def train(total_loss, global_step):
+def learning_rate(global_step, num_examples_per_epoch, total_steps):
+    """ Learning rate schedule, selected with --lr_schedule.
+
+      exponential: decay by LEARNING_RATE_DECAY_FACTOR every
+                   NUM_EPOCHS_PER_DECAY epochs (the original schedule).
+      cosine: cosine decay from the initial learning rate to 0 over
+              total_steps.
+      one_cycle: linear warm-up from 1/ONE_CYCLE_DIV_FACTOR of the peak
+                 learning rate to the peak, then cosine decay to 0.
+
+    Args:
+      global_step: Integer Variable counting the number of training steps
+        processed.
+      num_examples_per_epoch: Number of examples in the training set.
+      total_steps: Number of training steps of the run.
+    Returns:
+      Learning rate tensor.
+    """
+    if FLAGS.optimizer not in DEFAULT_LEARNING_RATES:
+        raise ValueError('Invalid optimizer: {}'.format(FLAGS.optimizer))
+    initial_lr = FLAGS.learning_rate or DEFAULT_LEARNING_RATES[FLAGS.optimizer]
+
+    if FLAGS.lr_schedule == 'exponential':
+        # Variables that affect learning rate.
+        num_batches_per_epoch = num_examples_per_epoch / (
+            FLAGS.batch_size * FLAGS.accumulation_steps)
+        decay_steps = max(int(num_batches_per_epoch * NUM_EPOCHS_PER_DECAY), 1)
+
+        # Decay the learning rate exponentially based on the number of steps.
+        return tf.compat.v1.train.exponential_decay(initial_lr,
+                                                    global_step,
+                                                    decay_steps,
+                                                    LEARNING_RATE_DECAY_FACTOR,
+                                                    staircase=True)
+
+    if FLAGS.lr_schedule == 'cosine':
+        return tf.compat.v1.train.cosine_decay(initial_lr, global_step,
+                                               total_steps)
+
+    if FLAGS.lr_schedule == 'one_cycle':
+        step = tf.cast(global_step, tf.float32)
+        warmup_steps = max(ONE_CYCLE_WARMUP_FRACTION * total_steps, 1.0)
+        start_lr = initial_lr / ONE_CYCLE_DIV_FACTOR
+        warmup_lr = start_lr + (initial_lr - start_lr) * step / warmup_steps
+        progress = tf.minimum(
+            (step - warmup_steps) / max(total_steps - warmup_steps, 1.0), 1.0)
+        decay_lr = initial_lr * 0.5 * (1.0 + tf.cos(np.pi * progress))
+        return tf.where(step < warmup_steps, warmup_lr, decay_lr)
+
+    raise ValueError('Invalid learning rate schedule: {}'.format(
+        FLAGS.lr_schedule))
+
+
+def _optimizer(lr):
+    # The optimizer selected with --optimizer.
+    if FLAGS.optimizer == 'momentum':
+        return tf.compat.v1.train.MomentumOptimizer(lr, FLAGS.momentum)
+    if FLAGS.optimizer == 'adam':
+        return tf.compat.v1.train.AdamOptimizer(lr)
+    return tf.compat.v1.train.GradientDescentOptimizer(lr)
+
+
+def train(total_loss, global_step,
+          num_examples_per_epoch=NUM_EXAMPLES_PER_EPOCH_FOR_TRAIN,
+          total_steps=None):
     """ Train the model.
 
     Create an optimizer and apply to all trainable variables. Add moving
     average for all trainable variables.
 
+    With --accumulation_steps K > 1, the gradients of K batches (micro-batches)
+    are summed in variables and their mean is applied once, so a step uses
+    K * batch_size examples without building a K times larger graph. Run the
+    op from accumulate_gradients_op() K - 1 times, then train_op, which
+    accumulates the last micro-batch, applies the gradients and resets the
+    accumulators. global_step (and so the learning rate schedule and the
+    moving averages) counts these effective steps.
+
     Args:
       total_loss: Total loss from loss().
       global_step: Integer Variable counting the number of training steps
         processed.
+      num_examples_per_epoch: Number of examples in the training set (used by
+        the exponential learning rate schedule).
+      total_steps: Number of training steps of the run (used by the cosine and
+        one-cycle learning rate schedules).
     Returns:
       train_op: op for training.
     """
-    # Variables that affect learning rate.
-    num_batches_per_epoch = NUM_EXAMPLES_PER_EPOCH_FOR_TRAIN / FLAGS.batch_size
-    decay_steps = int(num_batches_per_epoch * NUM_EPOCHS_PER_DECAY)
-
-    # Decay the learning rate exponentially based on the number of steps.
-    lr = tf.train.exponential_decay(INITIAL_LEARNING_RATE,
-                                    global_step,
-                                    decay_steps,
-                                    LEARNING_RATE_DECAY_FACTOR,
-                                    staircase=True)
-    tf.scalar_summary('learning_rate', lr)
+    if total_steps is None and FLAGS.lr_schedule != 'exponential':
+        raise ValueError('The {} schedule needs the number of training '
+                         'steps'.format(FLAGS.lr_schedule))
+    lr = learning_rate(global_step, num_examples_per_epoch, total_steps)
+    tf.compat.v1.summary.scalar('learning_rate', lr)
+    tf.compat.v1.add_to_collection(LEARNING_RATE, lr)
 
     # Generate moving averages of all losses and associated summaries.
     loss_averages_op = _add_loss_summaries(total_loss)
 
     # Compute gradients.
     with tf.control_dependencies([loss_averages_op]):
-        opt = tf.train.GradientDescentOptimizer(lr)
+        opt = _optimizer(lr)
         grads = opt.compute_gradients(total_loss)
 
+    # Batch normalization moving averages (if the architecture has any),
+    # updated with every (micro-)batch.
+    update_ops = tf.compat.v1.get_collection(tf.compat.v1.GraphKeys.UPDATE_OPS)
+
+    accumulators = []
+    if FLAGS.accumulation_steps > 1:
+        grads, accumulators = _accumulate_gradients(grads, update_ops)
+
     # Apply gradients.
     apply_gradient_op = opt.apply_gradients(grads, global_step=global_step)
 
     # Add histograms for trainable variables.
-    for var in tf.trainable_variables():
-        tf.histogram_summary(var.op.name, var)
+    for var in tf.compat.v1.trainable_variables():
+        tf.compat.v1.summary.histogram(var.op.name, var)
 
-    # Add histograms for gradients.
+    # Add histograms for gradients (with accumulation, of the mean gradients).
     for grad, var in grads:
         if grad is not None:
-            tf.histogram_summary(var.op.name + '/gradients', grad)
+            tf.compat.v1.summary.histogram(var.op.name + '/gradients', grad)
 
     # Track the moving averages of all trainable variables.
-    variable_averages = tf.train.ExponentialMovingAverage(
+    variable_averages = tf.compat.v1.train.ExponentialMovingAverage(
         MOVING_AVERAGE_DECAY, global_step)
-    variables_averages_op = variable_averages.apply(tf.trainable_variables())
-
-    with tf.control_dependencies([apply_gradient_op, variables_averages_op]):
-        train_op = tf.no_op(name='train')
+    variables_averages_op = variable_averages.apply(
+        tf.compat.v1.trainable_variables())
+
+    with tf.control_dependencies([apply_gradient_op, variables_averages_op] +
+                                 update_ops):
+        if accumulators:
+            # Start the next step from zero.
+            train_op = tf.group(*[acc.assign(tf.zeros_like(acc))
+                                  for acc in accumulators], name='train')
+        else:
+            train_op = tf.no_op(name='train')
 
     return train_op
 
+
+def _accumulate_gradients(grads, update_ops):
+    """
+    Sum the gradients of the micro-batches in (non-trainable, local)
+    variables.
+
+    :param grads: (gradient, variable) pairs of the current micro-batch.
+    :param update_ops: Ops to run with every micro-batch.
+    :return: (mean gradient, variable) pairs over the accumulated
+    micro-batches (including the current one), to apply; and the
+    accumulators.
+    """
+    accumulators = []
+    accumulate_ops = []
+    for (grad, var) in grads:
+        if grad is None:
+            continue
+        acc = tf.compat.v1.get_variable(
+            var.op.name + '/gradient_accumulator', var.get_shape(),
+            var.dtype.base_dtype, initializer=tf.zeros_initializer(),
+            trainable=False,
+            collections=[tf.compat.v1.GraphKeys.LOCAL_VARIABLES])
+        accumulators.append(acc)
+        accumulate_ops.append(acc.assign_add(grad))
+
+    accumulate_op = tf.group(*(accumulate_ops + update_ops),
+                             name='accumulate_gradients')
+    tf.compat.v1.add_to_collection(ACCUMULATE_GRADIENTS, accumulate_op)
+
+    mean_grads = []
+    with tf.control_dependencies(accumulate_ops):
+        for (acc, (_, var)) in zip(accumulators,
+                                   [g for g in grads if g[0] is not None]):
+            mean_grads.append((acc.read_value() / FLAGS.accumulation_steps,
+                               var))
+    return mean_grads, accumulators
+
+
+def accumulate_gradients_op():
+    """
+    The op that accumulates the gradients of a micro-batch, or None without
+    gradient accumulation (see train()).
+    """
+    ops = tf.compat.v1.get_collection(ACCUMULATE_GRADIENTS)
+    return ops[0] if ops else None
+
 # Copyright 2015 The TensorFlow Authors and Felix Duvallet.
 # All Rights Reserved.
 #
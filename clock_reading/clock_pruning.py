@@ -0,0 +1,139 @@
+""" Structured pruning: remove whole channels and neurons from a model.
+
+A layer (conv or fully connected) is pruned by removing some of its output
+channels: the corresponding slices of its weights, biases and batch norm
+parameters, and the matching input slices of the next layer (for the first
+fully connected layer, the input positions of those channels at every pixel).
+The result is a smaller architecture config (see clock_architectures) and the
+weights for it, i.e. a genuinely smaller graph, not a masked one.
+
+The channels to keep are ranked by a score per channel, either:
+ - magnitude: the L1 norm of the weights producing the channel, or
+ - activation: the mean output of the channel over calibration data
+   (computed by prune_channels.py).
+
+The two classifiers (softmax_linear_*) are not pruned.
+
+The weights are a dict of variable name -> numpy array, e.g.
+'conv1/weights'. All of this is plain numpy, see prune_channels.py for the
+tool that restores, prunes, fine-tunes and evaluates a trained model.
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import math
+
+import numpy as np
+
+import clock_architectures
+
+HEADS = ('softmax_linear_hours', 'softmax_linear_minutes')
+# Per-channel parameters of batch normalization.
+BATCH_NORM_VARIABLES = ('beta', 'gamma', 'moving_mean', 'moving_variance')
+
+
+def prunable_layers(config):
+    """
+    :param config: Architecture config.
+    :return: list of (layer name, 'conv' or 'fc', number of channels).
+    """
+    layers = [('conv{}'.format(idx + 1), 'conv', channels)
+              for (idx, (channels, _)) in enumerate(config['conv'])]
+    layers += [('local{}'.format(idx + len(config['conv']) + 1), 'fc', size)
+               for (idx, size) in enumerate(config['fc'])]
+    return layers
+
+
+def magnitude_scores(config, weights):
+    """
+    L1 norm of the weights of every output channel.
+
+    :return: dict of layer name -> 1-D array of scores.
+    """
+    config = clock_architectures.get_architecture(config)
+    scores = {}
+    for (name, kind, _) in prunable_layers(config):
+        if kind == 'conv' and config['separable']:
+            kernel = weights[name + '/pointwise_weights']
+        else:
+            kernel = weights[name + '/weights']
+        scores[name] = np.abs(kernel).reshape(-1, kernel.shape[-1]).sum(
+            axis=0)
+    return scores
+
+
+def select_channels(scores, ratio):
+    """
+    Choose the channels to keep in every layer.
+
+    :param scores: dict of layer name -> score per channel (higher is more
+    important).
+    :param ratio: Fraction of the channels to remove from every layer (at
+    least one channel is kept).
+    :return: dict of layer name -> sorted indices of the channels to keep.
+    """
+    if not 0 <= ratio < 1:
+        raise ValueError('The prune ratio must be in [0, 1): {}'.format(ratio))
+    keep = {}
+    for (name, layer_scores) in scores.items():
+        num_keep = max(int(math.ceil(len(layer_scores) * (1 - ratio))), 1)
+        # Stable sort, so that ties keep the first channels.
+        ranked = np.argsort(-np.asarray(layer_scores), kind='mergesort')
+        keep[name] = np.sort(ranked[:num_keep])
+    return keep
+
+
+def prune(config, weights, keep):
+    """
+    Remove channels from a model.
+
+    :param config: Architecture name or config.
+    :param weights: dict of variable name -> numpy array.
+    :param keep: dict of layer name -> indices of the channels to keep (layers
+    not in the dict are not pruned).
+    :return: (pruned architecture config, pruned weights).
+    """
+    config = clock_architectures.get_architecture(config)
+    layers = prunable_layers(config)
+    weights = dict(weights)
+
+    for (idx, (name, kind, channels)) in enumerate(layers):
+        if name not in keep:
+            continue
+        kept = np.asarray(keep[name])
+
+        # Outputs of the layer.
+        for var in ['weights', 'pointwise_weights', 'biases'] + \
+                list(BATCH_NORM_VARIABLES):
+            key = '{}/{}'.format(name, var)
+            if key in weights:
+                weights[key] = weights[key][..., kept]
+
+        # Inputs of the next layer(s).
+        if idx + 1 == len(layers):
+            for head in HEADS:
+                weights[head + '/weights'] = weights[head + '/weights'][kept]
+            continue
+        (next_name, next_kind, _) = layers[idx + 1]
+        if next_kind == 'conv':
+            for var in ['weights', 'depthwise_weights', 'pointwise_weights']:
+                key = '{}/{}'.format(next_name, var)
+                if key in weights:
+                    weights[key] = weights[key][:, :, kept, :]
+        elif kind == 'conv':
+            # The conv output is flattened as [height, width, channels].
+            key = next_name + '/weights'
+            size = weights[key].shape[1]
+            weights[key] = weights[key].reshape(
+                -1, channels, size)[:, kept, :].reshape(-1, size)
+        else:
+            key = next_name + '/weights'
+            weights[key] = weights[key][kept]
+
+    pruned = dict(config)
+    pruned['conv'] = [(len(keep.get('conv{}'.format(idx + 1), range(c))), k)
+                      for (idx, (c, k)) in enumerate(config['conv'])]
+    pruned['fc'] = [len(keep.get(name, range(size)))
+                    for (name, kind, size) in layers if kind == 'fc']
+    return pruned, weights
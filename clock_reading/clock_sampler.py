@@ -0,0 +1,124 @@
+""" Hard-example mining: sample the training clocks that the model gets wrong.
+
+The default input queue samples every clock uniformly, but the errors cluster
+around specific times (overlapping hands such as 12:00 or 6:30, minutes near an
+hour boundary). The HardExampleSampler keeps a running loss per record (indexed
+by the position of the record in the index file) and samples records with a
+probability that is a mix of:
+ - the running loss of the record, normalized over all records,
+ - the uniform distribution, with weight `floor`, so that easy examples are
+   still seen.
+
+The running loss of a record is updated, as an exponential moving average,
+every time the record is in a training batch. Records start at the loss of a
+uniform prediction, so they are all likely to be sampled early on.
+
+Usage (see clock_training.py):
+    sampler = clock_sampler.from_flags()
+    images, labels, num_records, _ = clock_data.load_inputs_both(
+        batch_size, filename, sampler=sampler)
+    logits = clock_model.inference_multitask(images)
+    sampler.add_update(clock_model.example_losses_multitask(...))
+    train_op = clock_model.train(...)
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_boolean('hard_example_mining', False,
+                            """Sample the training examples with a high """
+                            """running loss more often.""")
+tf.compat.v1.app.flags.DEFINE_float('hard_example_floor', 0.2,
+                          """Fraction of the examples sampled uniformly.""")
+tf.compat.v1.app.flags.DEFINE_float('hard_example_decay', 0.7,
+                          """Decay of the running loss of each example.""")
+
+# Loss (cross entropy of hours + minutes) of a uniform prediction.
+INITIAL_EXAMPLE_LOSS = float(np.log(12) + np.log(60))
+# Number of record indices sampled at once by the queue runner.
+SAMPLES_PER_ENQUEUE = 32
+
+
+class HardExampleSampler(object):
+
+    def __init__(self, floor=0.2, decay=0.7, capacity=128):
+        """
+        :param floor: Fraction of the examples sampled uniformly (1: uniform
+        sampling).
+        :param decay: Decay of the running loss of each example.
+        :param capacity: Capacity of the queue of sampled indices. Samples are
+        drawn from the losses known when they are queued.
+        """
+        if not 0 < floor <= 1:
+            raise ValueError('The floor must be in (0, 1]: {}'.format(floor))
+        self.floor = floor
+        self.decay = decay
+        self.capacity = capacity
+
+        self.example_losses = None
+        self.batch_indices = None
+
+    def sample(self, num_records, seed=None):
+        """
+        Build the queue of sampled record indices (and its queue runner).
+
+        :param num_records: Number of records in the index file.
+        :param seed: Seed of the sampling.
+        :return: Scalar int32 tensor, the index of the next record.
+        """
+        with tf.compat.v1.variable_scope('hard_examples'):
+            self.example_losses = tf.compat.v1.get_variable(
+                'losses', [num_records], tf.float32,
+                initializer=tf.constant_initializer(INITIAL_EXAMPLE_LOSS),
+                trainable=False)
+
+        probabilities = self.floor / num_records + (1 - self.floor) * (
+            self.example_losses / tf.reduce_sum(self.example_losses))
+        indices = tf.random.categorical(
+            tf.math.log(probabilities)[tf.newaxis], SAMPLES_PER_ENQUEUE,
+            dtype=tf.int32, seed=seed)[0]
+
+        index_queue = tf.queue.FIFOQueue(self.capacity, tf.int32, shapes=[[]])
+        tf.compat.v1.train.add_queue_runner(tf.compat.v1.train.QueueRunner(
+            index_queue, [index_queue.enqueue_many(indices)]))
+
+        # How much more likely the hardest example is than a uniform sample.
+        tf.compat.v1.summary.scalar('hard_examples/max_probability_ratio',
+                                    tf.reduce_max(probabilities) * num_records)
+        tf.compat.v1.summary.histogram('hard_examples/losses',
+                                       self.example_losses)
+        return index_queue.dequeue()
+
+    def add_update(self, example_losses):
+        """
+        Update the running losses of the current batch along with the training
+        step (through the UPDATE_OPS collection, which clock_model.train()
+        runs with every batch). Call this before clock_model.train().
+
+        :param example_losses: Loss of each example of the batch (in the order
+        of batch_indices).
+        :return: The update op.
+        """
+        if self.batch_indices is None:
+            raise ValueError('Build the inputs with this sampler first.')
+        previous = tf.gather(self.example_losses, self.batch_indices)
+        update_op = tf.compat.v1.scatter_update(
+            self.example_losses, self.batch_indices,
+            self.decay * previous +
+            (1 - self.decay) * tf.stop_gradient(example_losses))
+        tf.compat.v1.add_to_collection(tf.compat.v1.GraphKeys.UPDATE_OPS,
+                                       update_op)
+        return update_op
+
+
+def from_flags():
+    """ The sampler selected with --hard_example_mining, or None. """
+    if not FLAGS.hard_example_mining:
+        return None
+    return HardExampleSampler(floor=FLAGS.hard_example_floor,
+                              decay=FLAGS.hard_example_decay)
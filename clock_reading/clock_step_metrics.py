@@ -0,0 +1,238 @@
+""" Structured metrics of the training steps: JSONL records and Prometheus.
+
+Every --step_metrics_steps steps, the StepMetrics emitter writes one JSON
+record (one line) to --step_metrics_file in the run directory, with:
+ - step, time (unix), loss,
+ - examples_per_sec and step_secs,
+ - input_wait_secs and compute_secs: the time the step was blocked on the
+   input queue, and the rest of it (from a software trace of the logged
+   steps, see clock_trace.step_breakdown; null if another profiler traced the
+   step),
+ - queue_fill: the fraction of each input queue that is filled (a batch queue
+   that stays empty means the input pipeline starves the training),
+ - learning_rate,
+ - rss_mb: the resident memory of the process.
+
+With --step_metrics_port, it also serves the latest record on
+http://localhost:<port>/metrics in the Prometheus text format (gauges named
+clock_train_<field>, the queues as a label), to scrape from dashboards.
+
+Usage (see clock_training.py):
+    step_metrics = clock_step_metrics.from_flags(run_dir)  # Before finalize().
+    ...
+    results = step_metrics.run(sess, fetches, step)  # Traced if logged.
+    if step_metrics.should_log(step):
+        step_metrics.emit(sess, step, loss_value, duration, num_examples)
+    ...
+    step_metrics.close()
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import tensorflow as tf
+
+import clock_memory
+import clock_model
+import clock_trace
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_string('step_metrics_file', 'step_metrics.jsonl',
+                           """File (in the run directory) of the step """
+                           """metrics records ('' to disable).""")
+tf.compat.v1.app.flags.DEFINE_integer('step_metrics_steps', 20,
+                            """Record the step metrics every N steps.""")
+tf.compat.v1.app.flags.DEFINE_integer('step_metrics_port', 0,
+                            """Serve the latest step metrics in the """
+                            """Prometheus format on this port of localhost """
+                            """(0 to disable).""")
+
+# Prefix of the Prometheus metric names.
+PROMETHEUS_PREFIX = 'clock_train_'
+
+
+def queue_fill_ops(queue_runners):
+    """
+    :return: dict of queue name -> op with the fraction of the queue that is
+    filled.
+    """
+    fill = {}
+    for runner in queue_runners:
+        queue = runner.queue
+        capacity = queue.queue_ref.op.get_attr('capacity')
+        if capacity > 0:  # (Unbounded queues have capacity -1.)
+            fill[queue.name] = tf.cast(queue.size(), tf.float32) / capacity
+    return fill
+
+
+def prometheus_text(record):
+    """ The numeric fields of a record, in the Prometheus text format. """
+    lines = []
+    for (field, value) in sorted(record.items()):
+        name = PROMETHEUS_PREFIX + field
+        if isinstance(value, dict):
+            samples = ['{}{{queue="{}"}} {}'.format(name, key, float(v))
+                       for (key, v) in sorted(value.items())]
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            samples = ['{} {}'.format(name, float(value))]
+        else:
+            continue
+        lines.append('# TYPE {} gauge'.format(name))
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsServer(object):
+    # Serves the latest record on http://localhost:<port>/metrics.
+
+    def __init__(self, port):
+        self.text = ''
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = server.text.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # No log line per scrape.
+                pass
+
+        self._httpd = HTTPServer(('localhost', port), Handler)
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        name='step_metrics_server')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+
+class StepMetrics(object):
+
+    def __init__(self, path, every_n_steps=20, port=0, learning_rate=None,
+                 queue_runners=()):
+        """
+        Build the ops of the metrics, in the default graph (so, before it is
+        finalized).
+
+        :param path: JSONL file of the records (None: no file).
+        :param every_n_steps: Record every N steps.
+        :param port: Port of the Prometheus endpoint (None or 0: none).
+        :param learning_rate: Learning rate tensor (optional).
+        :param queue_runners: Runners of the input queues to report the fill
+        level of.
+        """
+        self.path = path
+        self.every_n_steps = every_n_steps
+        self.latest = None
+        self._fetches = {'queue_fill': queue_fill_ops(queue_runners)}
+        if learning_rate is not None:
+            self._fetches['learning_rate'] = learning_rate
+        self._options = tf.compat.v1.RunOptions(
+            trace_level=tf.compat.v1.RunOptions.SOFTWARE_TRACE)
+        self._breakdown = None  # (step, input wait, compute) in seconds.
+
+        self._file = None
+        if path:
+            self._file = tf.io.gfile.GFile(path, 'a')
+        self.server = _MetricsServer(port) if port else None
+        if self.server is not None:
+            print('Serving the step metrics on http://localhost:{}/metrics'
+                  .format(self.server.port))
+
+    def should_log(self, step):
+        return bool(self.every_n_steps) and step % self.every_n_steps == 0 \
+            and (self._file is not None or self.server is not None)
+
+    def run(self, sess, fetches, step):
+        """
+        Same as sess.run(fetches), but traced (lightly) if the step is logged,
+        to measure the input wait.
+        """
+        if not self.should_log(step):
+            return sess.run(fetches)
+        run_metadata = tf.compat.v1.RunMetadata()
+        result = sess.run(fetches, options=self._options,
+                          run_metadata=run_metadata)
+        _, wall_time, input_wait = clock_trace.step_breakdown(
+            sess.graph, run_metadata.step_stats)
+        self._breakdown = (step, input_wait / 1e6,
+                           (wall_time - input_wait) / 1e6)
+        return result
+
+    def emit(self, sess, step, loss, step_secs, num_examples):
+        """
+        Record the metrics of a step.
+
+        :param loss: Loss of the step.
+        :param step_secs: Duration of the step.
+        :param num_examples: Number of examples of the step.
+        :return: The record.
+        """
+        values = sess.run(self._fetches)
+        record = {'step': int(step), 'time': time.time(),
+                  'loss': float(loss), 'step_secs': float(step_secs),
+                  'examples_per_sec': num_examples / float(step_secs)
+                  if step_secs else None,
+                  'input_wait_secs': None, 'compute_secs': None,
+                  'queue_fill': dict((name, float(fill)) for (name, fill)
+                                     in values['queue_fill'].items()),
+                  'learning_rate': float(values['learning_rate'])
+                  if 'learning_rate' in values else None}
+        if self._breakdown is not None and self._breakdown[0] == step:
+            record['input_wait_secs'], record['compute_secs'] = \
+                self._breakdown[1:]
+        rss = clock_memory.rss_bytes()
+        record['rss_mb'] = rss / clock_memory.MB if rss is not None else None
+
+        if self._file is not None:
+            self._file.write(json.dumps(record, sort_keys=True) + '\n')
+            self._file.flush()
+        if self.server is not None:
+            self.server.text = prometheus_text(record)
+        self.latest = record
+        return record
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+
+def from_flags(run_dir):
+    """
+    Build the step metrics from the command-line flags, with the learning
+    rate of clock_model.train() and the queues of the default graph.
+    """
+    learning_rates = tf.compat.v1.get_collection(clock_model.LEARNING_RATE)
+    return StepMetrics(
+        os.path.join(run_dir, FLAGS.step_metrics_file)
+        if FLAGS.step_metrics_file else None,
+        every_n_steps=FLAGS.step_metrics_steps,
+        port=FLAGS.step_metrics_port,
+        learning_rate=learning_rates[0] if learning_rates else None,
+        queue_runners=tf.compat.v1.get_collection(
+            tf.compat.v1.GraphKeys.QUEUE_RUNNERS))
@@ -0,0 +1,87 @@
+""" Criteria to stop training before max_steps.
+
+ - target error: the mean time error (error/combined, as computed by
+   clock_streaming_metrics.time_metrics) of the latest evaluation is at most
+   a target,
+ - plateau: the time error hasn't improved by at least min_delta for a
+   patience window of steps,
+ - time budget: the training loop has run for a given number of seconds.
+
+The time errors come from the background evaluation (see clock_eval_worker),
+so they describe a snapshot of the weights from a few steps earlier; evaluate
+on a held-out index file (--background_eval_file) for a proper validation
+metric.
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+# Reasons for the end of a run, as recorded in the run summary.
+MAX_STEPS = 'max_steps'
+TARGET_ERROR = 'target_error'
+PLATEAU = 'plateau'
+TIME_BUDGET = 'time_budget'
+
+
+class EarlyStopping(object):
+
+    def __init__(self, target_error=0.0, patience_steps=0, min_delta=0.0,
+                 max_seconds=0.0):
+        """
+        :param target_error: Stop when the time error is at most this, in
+        minutes (0: off).
+        :param patience_steps: Stop when the best time error is this many
+        (evaluated) steps old (0: off).
+        :param min_delta: Smallest decrease of the time error that counts as
+        an improvement, in minutes.
+        :param max_seconds: Stop after this many seconds (0: off).
+        """
+        self.target_error = target_error
+        self.patience_steps = patience_steps
+        self.min_delta = min_delta
+        self.max_seconds = max_seconds
+
+        self.best_error = None
+        self.best_step = None
+        self.latest_error = None
+        self.latest_step = None
+
+    @property
+    def needs_evaluation(self):
+        return bool(self.target_error or self.patience_steps)
+
+    def update(self, step, time_error):
+        """
+        Record the time error of an evaluation. An evaluation seen before
+        (same step) is ignored.
+        """
+        if step == self.latest_step:
+            return
+        self.latest_step = step
+        self.latest_error = time_error
+        if self.best_error is None or \
+                time_error < self.best_error - self.min_delta:
+            self.best_error = time_error
+            self.best_step = step
+
+    def check(self, elapsed_seconds):
+        """
+        :param elapsed_seconds: Time spent in the training loop.
+        :return: The reason to stop (TARGET_ERROR, PLATEAU or TIME_BUDGET), or
+        None to continue.
+        """
+        if self.latest_error is not None:
+            if self.target_error and self.latest_error <= self.target_error:
+                return TARGET_ERROR
+            if self.patience_steps and \
+                    self.latest_step - self.best_step >= self.patience_steps:
+                return PLATEAU
+        if self.max_seconds and elapsed_seconds >= self.max_seconds:
+            return TIME_BUDGET
+        return None
+
+    def __repr__(self):
+        return ('EarlyStopping(target_error={}, patience_steps={}, '
+                'min_delta={}, max_seconds={})'.format(
+                    self.target_error, self.patience_steps, self.min_delta,
+                    self.max_seconds))
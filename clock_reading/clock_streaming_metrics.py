@@ -0,0 +1,186 @@
+""" Streaming evaluation metrics, accumulated in the graph.
+
+The StreamingTimeMetrics accumulate a 720 x 720 confusion matrix of the times
+(true time x predicted time, in minutes since 12:00) in a local variable. Every
+evaluation batch adds to it in the graph, so only the final matrix (not the
+logits, or the predictions) is transferred to the host, once.
+
+The confusion matrix holds all the information of the evaluation, and every
+metric is computed from it exactly:
+ - precision of the hours, minutes and times,
+ - mean time error (combined, hours only and minutes only),
+ - percentiles of the combined time error (an integer number of minutes, so
+   its histogram has 361 bins),
+ - the 12 x 12 confusion matrix of the hours and 60 x 60 of the minutes.
+
+Accumulators of sharded evaluation workers are merged by adding their
+matrices: in numpy (merge_confusions), or into the variable (merge). They are
+stored sparsely (only the non-zero cells) with save_confusion/load_confusion.
+
+Usage:
+    predictions = clock_model.time_predictions(logits, labels)
+    metrics = clock_streaming_metrics.StreamingTimeMetrics(predictions)
+    ...
+    confusion = metrics.evaluate(sess, coord, num_records, batch_size)
+    print(clock_streaming_metrics.time_metrics(confusion))
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+NUM_TIMES = 12 * 60
+# Largest combined time error, in minutes.
+MAX_TIME_ERROR = NUM_TIMES // 2
+# Percentiles of the time error reported by time_metrics().
+PERCENTILES = (50, 90, 99)
+
+
+class StreamingTimeMetrics(object):
+
+    def __init__(self, predictions, name='streaming_time_metrics'):
+        """
+        :param predictions: (predicted times, true times) of a batch, as built
+        by clock_model.time_predictions().
+        :param name: Variable scope of the accumulator.
+        """
+        predicted, true = predictions
+        with tf.compat.v1.variable_scope(name):
+            self.confusion = tf.compat.v1.get_variable(
+                'confusion', [NUM_TIMES, NUM_TIMES], tf.int64,
+                initializer=tf.zeros_initializer(), trainable=False,
+                collections=[tf.compat.v1.GraphKeys.LOCAL_VARIABLES])
+
+            indices = tf.stack([_time_index(true), _time_index(predicted)],
+                               axis=1)
+            self.update_op = tf.compat.v1.scatter_nd_add(
+                self.confusion, indices,
+                tf.ones(tf.shape(indices)[:1], tf.int64))
+            self.reset_op = tf.compat.v1.variables_initializer(
+                [self.confusion])
+
+            # Adds the matrix of another accumulator (e.g. another shard).
+            self._merge_value = tf.compat.v1.placeholder(
+                tf.int64, [NUM_TIMES, NUM_TIMES])
+            self._merge_op = tf.compat.v1.assign_add(self.confusion,
+                                                     self._merge_value)
+
+    def evaluate(self, sess, coord, num_records, batch_size):
+        """
+        Reset the accumulator, run (at least) num_records examples through it,
+        and read it out.
+
+        NOTE: because we run an integer number of batches, the number of
+        evaluated samples may be greater than the desired number of samples.
+
+        :return: The confusion matrix, [720, 720] int64 array.
+        """
+        sess.run(self.reset_op)
+        num_iter = int(np.ceil(num_records / batch_size))
+        batch_num = 0
+        while batch_num < num_iter and not coord.should_stop():
+            sess.run(self.update_op)
+            batch_num += 1
+        return sess.run(self.confusion)
+
+    def merge(self, sess, confusion):
+        """ Add a confusion matrix (e.g. of another shard) to this one. """
+        sess.run(self._merge_op, feed_dict={self._merge_value: confusion})
+
+
+def _time_index(times):
+    # Index of [batch, 2] (hour, minute) times in 0..719.
+    times = tf.cast(times, tf.int32)
+    return 60 * times[:, 0] + times[:, 1]
+
+
+def merge_confusions(confusions):
+    """ Merge the confusion matrices of several shards. """
+    return np.sum(confusions, axis=0, dtype=np.int64)
+
+
+def sparse_confusion(confusion):
+    """
+    :return: (true times, predicted times, counts) of the non-zero cells, the
+    times as indices in 0..719.
+    """
+    true, predicted = np.nonzero(confusion)
+    return true, predicted, confusion[true, predicted]
+
+
+def save_confusion(path, confusion):
+    """ Store a confusion matrix sparsely (.npz). """
+    true, predicted, counts = sparse_confusion(confusion)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, true=true, predicted=predicted, counts=counts)
+
+
+def load_confusion(path):
+    with np.load(path) as data:
+        confusion = np.zeros((NUM_TIMES, NUM_TIMES), dtype=np.int64)
+        np.add.at(confusion, (data['true'], data['predicted']),
+                  data['counts'])
+    return confusion
+
+
+def hour_minute_confusions(confusion):
+    """
+    :return: (12 x 12 confusion matrix of the hours, 60 x 60 of the minutes),
+    true x predicted.
+    """
+    blocks = confusion.reshape(12, 60, 12, 60)
+    return blocks.sum(axis=(1, 3)), blocks.sum(axis=(0, 2))
+
+
+def _wraparound(delta, period):
+    # Distance on a circle of the given period.
+    return np.minimum(delta % period, -delta % period)
+
+
+def _percentile(histogram, q):
+    # Percentile (with linear interpolation, as np.percentile) of values
+    # 0..len(histogram)-1 with the given counts.
+    position = q / 100.0 * (np.sum(histogram) - 1)
+    cumulative = np.cumsum(histogram)
+    lower = np.searchsorted(cumulative, np.floor(position), side='right')
+    upper = np.searchsorted(cumulative, np.ceil(position), side='right')
+    return lower + (upper - lower) * (position - np.floor(position))
+
+
+def time_metrics(confusion):
+    """
+    Metrics of a confusion matrix: precision and mean time errors (as logged
+    to the summaries), the percentiles of the combined time error
+    ('error/pNN') and the sample count.
+
+    :return: dict of metric name -> value.
+    """
+    true, predicted, counts = sparse_confusion(confusion)
+    total = float(np.sum(counts))
+    if not total:
+        raise ValueError('The confusion matrix is empty.')
+
+    time_errors = _wraparound(predicted - true, NUM_TIMES)
+    hour_errors = _wraparound(predicted // 60 - true // 60, 12)
+    minute_errors = _wraparound(predicted % 60 - true % 60, 60)
+
+    precision_h = np.sum(counts[predicted // 60 == true // 60]) / total
+    precision_m = np.sum(counts[predicted % 60 == true % 60]) / total
+    metrics = {
+        'precision/hours': float(precision_h),
+        'precision/minutes': float(precision_m),
+        'precision/combined': float(precision_h + precision_m) * 0.5,
+        'precision/time': float(np.sum(counts[predicted == true]) / total),
+        'error/combined': float(np.sum(counts * time_errors) / total),
+        'error/hours_only': float(np.sum(counts * hour_errors) / total),
+        'error/minutes_only': float(np.sum(counts * minute_errors) / total),
+        'sample_count': int(total),
+    }
+
+    histogram = np.bincount(time_errors, weights=counts,
+                            minlength=MAX_TIME_ERROR + 1)
+    for q in PERCENTILES:
+        metrics['error/p{}'.format(q)] = float(_percentile(histogram, q))
+    return metrics
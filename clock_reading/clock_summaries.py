@@ -0,0 +1,225 @@
+""" Budgeted, asynchronous summary writing for training.
+
+The model adds many summaries to the graph: scalars (losses, learning rate,
+sparsity) are cheap, but histograms of every activation, variable and gradient
+(and the input images) are expensive to compute and to write. This module:
+
+ - splits the summaries into cheap scalars and expensive histograms/images, each
+   with its own interval (in steps),
+ - only evaluates a budget of histograms per histogram step, cycling through
+   all of them over successive histogram steps,
+ - fetches the summaries in the same sess.run() as the training step (so they
+   describe the same batch and don't pull an extra batch from the queue),
+ - hands the serialized summaries to a background thread that does the parsing
+   and file I/O, through a bounded queue. If the queue is full the summary is
+   dropped rather than blocking the training step.
+
+SummaryRunner also keeps track of the step time with and without summaries, so
+the overhead can be reported at the end of training.
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import threading
+
+try:
+    import queue
+except ImportError:  # Python 2.
+    import Queue as queue
+
+import numpy as np
+import tensorflow as tf
+
+SCALAR_SUMMARY_TYPES = ('ScalarSummary',)
+
+
+class SummaryPolicy(object):
+
+    def __init__(self, scalar_steps=20, histogram_steps=20, histogram_budget=0,
+                 async_writes=False, queue_size=100):
+        """
+        :param scalar_steps: Write scalar summaries every N steps (0: never).
+        :param histogram_steps: Write histogram and image summaries every N
+        steps (0: never).
+        :param histogram_budget: Max number of histogram/image summaries
+        evaluated per histogram step (0: all of them).
+        :param async_writes: Write summaries from a background thread.
+        :param queue_size: Max number of pending summaries for the background
+        thread.
+        """
+        self.scalar_steps = scalar_steps
+        self.histogram_steps = histogram_steps
+        self.histogram_budget = histogram_budget
+        self.async_writes = async_writes
+        self.queue_size = queue_size
+
+    def __repr__(self):
+        return ('SummaryPolicy(scalar_steps={}, histogram_steps={}, '
+                'histogram_budget={}, async_writes={}, queue_size={})'.format(
+                    self.scalar_steps, self.histogram_steps,
+                    self.histogram_budget, self.async_writes,
+                    self.queue_size))
+
+
+class AsyncSummaryWriter(object):
+    """
+    Drop-in replacement for FileWriter.add_summary() and add_session_log()
+    that writes from a background thread.
+    """
+
+    def __init__(self, writer, queue_size=100):
+        self.writer = writer
+        self.dropped = 0
+        # The exception of a failed write, if any (see close()).
+        self._error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run,
+                                        name='summary_writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add_summary(self, summary, global_step=None):
+        self._put('add_summary', summary, global_step)
+
+    def add_session_log(self, session_log, global_step=None):
+        self._put('add_session_log', session_log, global_step)
+
+    def _put(self, method, *args):
+        try:
+            self._queue.put_nowait((method, args))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                continue  # Keep draining, so that close() doesn't block.
+            method, args = item
+            try:
+                getattr(self.writer, method)(*args)
+            except Exception as e:  # pylint: disable=broad-except
+                print('Failed to write summaries: {}'.format(e))
+                self._error = e
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        """
+        Write the pending summaries and stop the thread.
+
+        :raise: The exception of a failed write, if any.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self.writer.close()
+        if self._error is not None:
+            raise self._error
+
+
+def split_summaries(summary_ops):
+    """
+    Split summary ops into cheap scalars and the (expensive) others.
+
+    :param summary_ops: Summary tensors, e.g. the SUMMARIES collection.
+    :return: (scalar summaries, histogram/image summaries)
+    """
+    scalars = [s for s in summary_ops if s.op.type in SCALAR_SUMMARY_TYPES]
+    others = [s for s in summary_ops if s.op.type not in SCALAR_SUMMARY_TYPES]
+    return scalars, others
+
+
+class SummaryRunner(object):
+
+    def __init__(self, writer, policy, summary_ops=None):
+        """
+        :param writer: Object with add_summary(summary, global_step), e.g. a
+        FileWriter or AsyncSummaryWriter.
+        :param policy: SummaryPolicy.
+        :param summary_ops: Summaries to write (default: the SUMMARIES
+        collection).
+        """
+        if summary_ops is None:
+            summary_ops = tf.compat.v1.get_collection(
+                tf.compat.v1.GraphKeys.SUMMARIES)
+        scalars, histograms = split_summaries(summary_ops)
+
+        self.writer = writer
+        self.policy = policy
+
+        self._scalar_op = tf.compat.v1.summary.merge(scalars) \
+            if scalars else None
+
+        # Histograms are evaluated in groups of at most histogram_budget.
+        budget = policy.histogram_budget or len(histograms)
+        self._histogram_ops = [
+            tf.compat.v1.summary.merge(histograms[idx:idx + budget])
+            for idx in range(0, len(histograms), max(budget, 1))]
+        self._next_histogram = 0
+
+        # Step durations (in seconds), by what was fetched with the step.
+        self.durations = {'none': [], 'scalars': [], 'histograms': []}
+        self._kind = 'none'
+
+    def fetches(self, step):
+        """ Summary ops to run along with the training step. """
+        fetches = []
+        self._kind = 'none'
+        if (self._scalar_op is not None and self.policy.scalar_steps and
+                step % self.policy.scalar_steps == 0):
+            fetches.append(self._scalar_op)
+            self._kind = 'scalars'
+        if (self._histogram_ops and self.policy.histogram_steps and
+                step % self.policy.histogram_steps == 0):
+            fetches.append(self._histogram_ops[self._next_histogram])
+            self._next_histogram = \
+                (self._next_histogram + 1) % len(self._histogram_ops)
+            self._kind = 'histograms'
+        return fetches
+
+    def add(self, summaries, step, duration):
+        """
+        Write the fetched summaries and record the step duration. Call this
+        after running the ops from fetches(step).
+
+        :param summaries: Results of running the ops from fetches(step).
+        :param step: Training step.
+        :param duration: Duration of the step, in seconds.
+        """
+        for summary in summaries:
+            self.writer.add_summary(summary, step)
+        self.durations[self._kind].append(duration)
+
+    def report(self):
+        """ Print the average step time with and without summaries. """
+        # Skip the first step, which includes graph setup.
+        base = self.durations['none'][1:] or self.durations['none']
+        if not base:
+            print('Summary overhead: no steps without summaries.')
+            return
+        base_time = np.mean(base)
+        total_time = sum(sum(d) for d in self.durations.values())
+
+        print('Summary overhead ({}):'.format(self.policy))
+        print('  steps without summaries: {:.4f} sec/step ({} steps)'.format(
+            base_time, len(base)))
+        extra = 0.0
+        for kind in ['scalars', 'histograms']:
+            durations = self.durations[kind]
+            if not durations:
+                continue
+            kind_time = np.mean(durations)
+            extra += (kind_time - base_time) * len(durations)
+            print('  steps with {:<10s}: {:.4f} sec/step ({} steps, '
+                  '+{:.4f} sec)'.format(kind, kind_time, len(durations),
+                                        kind_time - base_time))
+        print('  total summary overhead: {:.2f} sec ({:.1f}% of step '
+              'time)'.format(extra, 100 * extra / max(total_time, 1e-9)))
+        dropped = getattr(self.writer, 'dropped', 0)
+        if dropped:
+            print('  dropped {} summaries (writer queue full)'.format(dropped))
@@ -0,0 +1,207 @@
+""" Step-level trace profiling for the training loop.
+
+A StepTracer wraps sess.run() for a window of steps (given as --profile_steps
+in the form a:b, i.e. steps a to b-1 like a Python slice). For every traced
+run it:
+ - captures the TF RunMetadata with a full trace,
+ - writes a Chrome trace (open it in chrome://tracing) to the output directory,
+ - accumulates the time spent per op type.
+
+At the end of the window it prints a table of time per op type, and how much of
+the step was spent waiting on the input queue versus computing.
+
+When no window is given, StepTracer.run() is just sess.run().
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import os
+
+import tensorflow as tf
+from tensorflow.python.client import timeline
+
+# Op types that block on the input pipeline.
+INPUT_OP_TYPES = ('QueueDequeue', 'QueueDequeueV2', 'QueueDequeueMany',
+                  'QueueDequeueManyV2', 'QueueDequeueUpTo',
+                  'QueueDequeueUpToV2')
+
+
+def parse_profile_steps(profile_steps):
+    """
+    Parse a step window of the form 'a:b'.
+
+    :param profile_steps: String, or empty/None for no profiling.
+    :return: tuple (first_step, last_step + 1), or None.
+    """
+    if not profile_steps:
+        return None
+    try:
+        first, last = [int(x) for x in profile_steps.split(':')]
+    except ValueError:
+        raise ValueError('Invalid step window (expected a:b): {}'.format(
+            profile_steps))
+    if first < 0 or last <= first:
+        raise ValueError('Invalid step window (expected 0 <= a < b): '
+                         '{}'.format(profile_steps))
+    return first, last
+
+
+def _op_type(graph, node_stats):
+    # The node name may carry a suffix, e.g. 'conv1/Conv2D:Conv2D'.
+    name = node_stats.node_name.split(':')[0]
+    try:
+        return graph.get_operation_by_name(name).type
+    except (KeyError, ValueError):
+        # Internal nodes (_SOURCE, _Recv, ...) are not in the graph. The
+        # timeline label has the form 'name = OpType(inputs)'.
+        label = node_stats.timeline_label
+        if ' = ' in label:
+            return label.split(' = ')[1].split('(')[0]
+        return name
+
+
+def step_breakdown(graph, step_stats):
+    """
+    Compute the time spent per op type for a single traced run.
+
+    :param graph: The graph that was run.
+    :param step_stats: RunMetadata.step_stats.
+    :return: (dict op_type -> microseconds, wall time in microseconds,
+    input wait in microseconds).
+    """
+    op_times = collections.defaultdict(int)
+    start = None
+    end = None
+    for dev_stats in step_stats.dev_stats:
+        for node_stats in dev_stats.node_stats:
+            node_start = node_stats.all_start_micros
+            node_end = node_start + node_stats.all_end_rel_micros
+            op_times[_op_type(graph, node_stats)] += \
+                node_stats.all_end_rel_micros
+            start = node_start if start is None else min(start, node_start)
+            end = node_end if end is None else max(end, node_end)
+
+    wall_time = (end - start) if start is not None else 0
+    input_wait = sum(op_times[t] for t in INPUT_OP_TYPES if t in op_times)
+    return dict(op_times), wall_time, min(input_wait, wall_time)
+
+
+def peak_memory(step_stats):
+    """
+    Peak memory allocated by the ops of a single traced run.
+
+    :param step_stats: RunMetadata.step_stats, of a FULL_TRACE run.
+    :return: Max bytes in use by an allocator after an op of the run.
+    """
+    peak = 0
+    for dev_stats in step_stats.dev_stats:
+        for node_stats in dev_stats.node_stats:
+            for memory in node_stats.memory:
+                peak = max(peak, memory.allocator_bytes_in_use)
+    return peak
+
+
+def op_memory(step_stats):
+    """
+    Memory allocated by each op of a single traced run.
+
+    :param step_stats: RunMetadata.step_stats, of a FULL_TRACE run.
+    :return: dict of node name -> bytes allocated by the op (its outputs and
+    temporary buffers), on all the allocators.
+    """
+    allocated = collections.defaultdict(int)
+    for dev_stats in step_stats.dev_stats:
+        for node_stats in dev_stats.node_stats:
+            for memory in node_stats.memory:
+                allocated[node_stats.node_name] += memory.total_bytes
+    return dict(allocated)
+
+
+class StepTracer(object):
+
+    def __init__(self, profile_steps, output_dir):
+        """
+        :param profile_steps: Step window 'a:b' (or None to disable).
+        :param output_dir: Directory where to write the Chrome traces.
+        """
+        self.window = parse_profile_steps(profile_steps)
+        self.output_dir = output_dir
+        self.op_times = collections.defaultdict(int)
+        self.wall_time = 0
+        self.input_wait = 0
+        self.num_runs = 0
+        self._reported = False
+        self._options = tf.compat.v1.RunOptions(
+            trace_level=tf.compat.v1.RunOptions.FULL_TRACE)
+
+    def should_trace(self, step):
+        return (self.window is not None and
+                self.window[0] <= step < self.window[1])
+
+    def run(self, sess, fetches, step, tag='train'):
+        """ Same as sess.run(fetches), but traced if step is in the window. """
+        if not self.should_trace(step):
+            return sess.run(fetches)
+
+        run_metadata = tf.compat.v1.RunMetadata()
+        result = sess.run(fetches, options=self._options,
+                          run_metadata=run_metadata)
+
+        trace = timeline.Timeline(run_metadata.step_stats)
+        trace_path = os.path.join(
+            self.output_dir, 'timeline_{}_{:06d}.json'.format(tag, step))
+        with open(trace_path, 'w') as f:
+            f.write(trace.generate_chrome_trace_format())
+
+        op_times, wall_time, input_wait = step_breakdown(
+            sess.graph, run_metadata.step_stats)
+        for (op_type, micros) in op_times.items():
+            self.op_times[op_type] += micros
+        self.wall_time += wall_time
+        self.input_wait += input_wait
+        self.num_runs += 1
+
+        return result
+
+    def maybe_report(self, step):
+        """ Print the report once, after the last step of the window. """
+        if (self.window is not None and not self._reported and
+                step + 1 >= self.window[1]):
+            self.report()
+
+    def finish(self):
+        """
+        Print the report if it wasn't yet, e.g. when training stopped before
+        the end of the window.
+        """
+        if self.window is not None and not self._reported:
+            self.report()
+
+    def report(self, max_rows=20):
+        self._reported = True
+        if not self.num_runs:
+            print('No steps were traced.')
+            return
+
+        total = float(sum(self.op_times.values()))
+        print('==================')
+        print('Traced {} runs in steps [{}, {}), traces written to {}'.format(
+            self.num_runs, self.window[0], self.window[1], self.output_dir))
+        print('  {:<28s} {:>12s} {:>8s}'.format('op type', 'total ms', '%'))
+        rows = sorted(self.op_times.items(), key=lambda r: -r[1])
+        for (op_type, micros) in rows[:max_rows]:
+            print('  {:<28s} {:>12.2f} {:>7.1f}%'.format(
+                op_type, micros / 1000.0, 100 * micros / total))
+        if len(rows) > max_rows:
+            print('  ({} more op types)'.format(len(rows) - max_rows))
+
+        compute = self.wall_time - self.input_wait
+        print('Input wait: {:.2f} ms ({:.1f}%)  |  compute: {:.2f} ms '
+              '({:.1f}%)  per run'.format(
+                  self.input_wait / 1000.0 / self.num_runs,
+                  100.0 * self.input_wait / max(self.wall_time, 1),
+                  compute / 1000.0 / self.num_runs,
+                  100.0 * compute / max(self.wall_time, 1)))
+        print('==================')
@@ -16,10 +16,23 @@ import tensorflow as tf
 import numpy as np
 from datetime import datetime
 import time
+import json
 import os.path
 
+import clock_catalog
+import clock_checkpoints
 import clock_model
 import clock_data
+import clock_distillation
+import clock_sampler
+import clock_step_metrics
+import clock_eval_worker
+import clock_evaluation
+import clock_input_tuning
+import clock_memory
+import clock_stopping
+import clock_summaries
+import clock_trace
 
 
 FLAGS = tf.compat.v1.app.flags.FLAGS
@@ -31,76 +44,288 @@ tf.compat.v1.app.flags.DEFINE_integer('max_steps', 800,
                             """Number of batches to run.""")
 tf.compat.v1.app.flags.DEFINE_boolean('log_device_placement', False,
                             """Whether to log device placement.""")
+tf.compat.v1.app.flags.DEFINE_string('profile_steps', '',
+                           """Trace the steps a:b (e.g. 100:110) and write """
+                           """Chrome traces to the run directory.""")
+tf.compat.v1.app.flags.DEFINE_boolean('summary_policy', True,
+                            """Use the summary intervals and budget below, """
+                            """and write summaries asynchronously. If """
+                            """false, write all summaries every 20 steps.""")
+tf.compat.v1.app.flags.DEFINE_integer('scalar_summary_steps', 20,
+                            """How often to write scalar summaries.""")
+tf.compat.v1.app.flags.DEFINE_integer('histogram_summary_steps', 100,
+                            """How often to write histogram and image """
+                            """summaries.""")
+tf.compat.v1.app.flags.DEFINE_integer('histogram_budget', 8,
+                            """Max histograms written per histogram step """
+                            """(0 for all of them).""")
+tf.compat.v1.app.flags.DEFINE_integer('summary_queue_size', 100,
+                            """Max summaries waiting to be written.""")
+tf.compat.v1.app.flags.DEFINE_integer('background_eval_steps', 30,
+                            """How often to evaluate the model in the """
+                            """background (0 to disable).""")
+tf.compat.v1.app.flags.DEFINE_string('background_eval_file', 'clocks_all.txt',
+                           """Index file of the images evaluated in the """
+                           """background.""")
+tf.compat.v1.app.flags.DEFINE_integer('background_eval_threads', 1,
+                            """Threads used by the background evaluation.""")
+tf.compat.v1.app.flags.DEFINE_integer('checkpoint_steps', 25,
+                            """How often to save a checkpoint.""")
+tf.compat.v1.app.flags.DEFINE_boolean('async_checkpoints', True,
+                            """Write checkpoints in a background thread.""")
+tf.compat.v1.app.flags.DEFINE_integer('keep_checkpoints', 5,
+                            """Number of recent checkpoints to keep.""")
+tf.compat.v1.app.flags.DEFINE_integer('keep_best_checkpoints', 1,
+                            """Number of checkpoints with the lowest time """
+                            """error to keep (the checkpoints of the steps """
+                            """evaluated in the background).""")
+tf.compat.v1.app.flags.DEFINE_float('keep_checkpoint_every_n_hours', 0.0,
+                          """Also keep one checkpoint every N hours """
+                          """(0 to disable).""")
+tf.compat.v1.app.flags.DEFINE_boolean('resume', False,
+                            """Continue the latest run in train_dir from its """
+                            """latest checkpoint.""")
+tf.compat.v1.app.flags.DEFINE_string('warm_start_from', '',
+                           """Run directory or checkpoint to initialize """
+                           """the shared (conv and local) layers from.""")
+tf.compat.v1.app.flags.DEFINE_integer('intra_op_threads', 0,
+                            """Threads used within an op (0: one per """
+                            """core).""")
+tf.compat.v1.app.flags.DEFINE_integer('inter_op_threads', 0,
+                            """Ops run in parallel (0: one per core).""")
+tf.compat.v1.app.flags.DEFINE_float('target_time_error', 0.0,
+                          """Stop when the mean time error of the """
+                          """background evaluation reaches this, in """
+                          """minutes (0 to disable).""")
+tf.compat.v1.app.flags.DEFINE_integer('early_stopping_patience', 0,
+                            """Stop when the time error hasn't improved for """
+                            """this many steps (0 to disable).""")
+tf.compat.v1.app.flags.DEFINE_float('early_stopping_min_delta', 0.0,
+                          """Smallest improvement of the time error, in """
+                          """minutes, that resets the patience.""")
+tf.compat.v1.app.flags.DEFINE_float('max_train_seconds', 0.0,
+                          """Stop training after this many seconds (0 to """
+                          """disable).""")
+
+# Final metrics of a run, written to its directory (see sweep.py).
+RUN_SUMMARY_FILENAME = 'run_summary.json'
+
+
+def summary_policy():
+    # Build the summary policy from the command-line flags.
+    if not FLAGS.summary_policy:
+        return clock_summaries.SummaryPolicy(
+            scalar_steps=20, histogram_steps=20, histogram_budget=0,
+            async_writes=False)
+    return clock_summaries.SummaryPolicy(
+        scalar_steps=FLAGS.scalar_summary_steps,
+        histogram_steps=FLAGS.histogram_summary_steps,
+        histogram_budget=FLAGS.histogram_budget,
+        async_writes=True, queue_size=FLAGS.summary_queue_size)
+
+
+def early_stopping():
+    # Build the stopping criteria from the command-line flags.
+    stopping = clock_stopping.EarlyStopping(
+        target_error=FLAGS.target_time_error,
+        patience_steps=FLAGS.early_stopping_patience,
+        min_delta=FLAGS.early_stopping_min_delta,
+        max_seconds=FLAGS.max_train_seconds)
+    if stopping.needs_evaluation and not FLAGS.background_eval_steps:
+        raise ValueError('--target_time_error and --early_stopping_patience '
+                         'need the background evaluation '
+                         '(--background_eval_steps).')
+    return stopping
+
+
+def train(summary_path, resume_from=None, warm_start_from=None,
+          catalog=None):
+    """ Builds and trains the clock reading model.
+
+    :param summary_path: Directory of the run (checkpoints and summaries).
+    :param resume_from: Checkpoint to continue training from: restores all the
+    variables (including the global step and the moving averages).
+    :param warm_start_from: Checkpoint to initialize the shared layers from
+    (the layers with a matching name and shape).
+    :param catalog: Catalog to record the checkpoints in (see clock_catalog).
+    """
+    stopping = early_stopping()
+
+    # Memory use of each phase of the run (if --memory_profile is set).
+    memory = clock_memory.from_flags()
+    memory.start_phase('build_graph')
 
-
-def train(summary_path):
-    """ Builds and trains the clock reading model. """
     with tf.Graph().as_default():
         global_step = tf.Variable(0, trainable=False)
 
+        # When resuming, shuffle the inputs differently than at the start of
+        # the run (the queues themselves are not saved in checkpoints).
+        input_seed = None
+        if resume_from:
+            input_seed = clock_checkpoints.checkpoint_step(resume_from)
+
+        # Uniform sampling, or hard-example mining (--hard_example_mining).
+        sampler = clock_sampler.from_flags()
         images, (labels_hours, labels_minutes), num_records, num_classes = \
             clock_data.load_inputs_both(
-                batch_size=FLAGS.batch_size, filename='clocks_all.txt')
+                batch_size=FLAGS.batch_size, filename='clocks_all.txt',
+                seed=input_seed, sampler=sampler)
 
-        tf.summary.image("images/input", images)  # Visualize some input clocks.
+        tf.compat.v1.summary.image("images/input", images)  # Visualize some input clocks.
 
         print('Training on {} images.'.format(num_records))
         print('Saving output to {}'.format(summary_path))
 
         # Build a Graph that computes the logits predictions from the
         # inference model in a multi-task learning .
-        (logits_hours, logits_minutes) = clock_model.inference_multitask(images)
+        (logits_hours, logits_minutes) = clock_model.inference_multitask(
+            images, is_training=True)
         logits = (logits_hours, logits_minutes)
 
         # Calculate loss.
         loss = clock_model.loss_multitask(logits_hours, labels_hours,
                                           logits_minutes, labels_minutes)
+        if sampler is not None:
+            sampler.add_update(clock_model.example_losses_multitask(
+                logits_hours, labels_hours, logits_minutes, labels_minutes))
 
-        # Compute accuracy (how often prediction is correct) for both minutes
-        # and hours separately. in_top_k returns how often the true label is in
-        # the top k of the predictions, k = 1 means only a match gets counted.
-        train_accuracy_h_op = tf.nn.in_top_k(logits_hours, labels_hours, 1)
-        train_accuracy_m_op = tf.nn.in_top_k(logits_minutes, labels_minutes, 1)
-
-        # This operation computes the actual time error in minutes (i.e. how far
-        # off our prediction was).
-        time_error_losses = clock_model.time_error_loss(
-            logits_hours, logits_minutes, labels_hours, labels_minutes)
+        # Distillation (--distill_from): also match the softened outputs of a
+        # frozen teacher model.
+        teacher_checkpoint = None
+        if FLAGS.distill_from:
+            loss, teacher_checkpoint = clock_distillation.add_distillation(
+                images, logits, loss)
 
         # Build a Graph that trains the model with one batch of examples and
         # updates the model parameters.
-        train_op = clock_model.train(loss, global_step)
+        train_op = clock_model.train(loss, global_step,
+                                     num_examples_per_epoch=num_records,
+                                     total_steps=FLAGS.max_steps)
 
-        # Create a saver.
-        saver = tf.train.Saver(tf.all_variables())
+        # The summaries written during training (the TF collection of
+        # Summaries).
+        summary_ops = tf.compat.v1.get_collection(
+            tf.compat.v1.GraphKeys.SUMMARIES)
 
-        # Build the summary operation based on the TF collection of Summaries.
-        summary_op = tf.merge_all_summaries()
+        # With --accumulation_steps, the op run for all but the last
+        # micro-batch of a step.
+        accumulate_op = clock_model.accumulate_gradients_op()
 
-        # Build an initialization operation to run below.
-        init = tf.initialize_all_variables()
+        # Build an initialization operation to run below (the local variables
+        # are the gradient accumulators, if any).
+        init = tf.group(tf.compat.v1.global_variables_initializer(),
+                        tf.compat.v1.local_variables_initializer())
 
         # Start running operations on the Graph.
-        sess = tf.Session(config=tf.ConfigProto(
-            log_device_placement=FLAGS.log_device_placement))
+        memory.start_phase('start')
+        sess = tf.compat.v1.Session(config=tf.compat.v1.ConfigProto(
+            log_device_placement=FLAGS.log_device_placement,
+            intra_op_parallelism_threads=FLAGS.intra_op_threads,
+            inter_op_parallelism_threads=FLAGS.inter_op_threads))
         sess.run(init)
 
-        # Start the queue runners.
-        coord = tf.train.Coordinator()
-        threads = tf.train.start_queue_runners(sess=sess, coord=coord)
-
-        summary_writer = tf.train.SummaryWriter(summary_path, sess.graph)
+        start_step = 0
+        if resume_from:
+            saver = tf.compat.v1.train.Saver(tf.compat.v1.global_variables())
+            saver.restore(sess, resume_from)
+            start_step = int(sess.run(global_step))
+            print('Resuming from {} at step {} ({} steps left).'.format(
+                resume_from, start_step, max(FLAGS.max_steps - start_step, 0)))
+        elif warm_start_from:
+            warm_start(sess, warm_start_from)
+        if teacher_checkpoint:
+            clock_distillation.restore_teacher(sess, teacher_checkpoint)
 
-        for step in range(FLAGS.max_steps):
+        # Start the queue runners.
+        coord = tf.compat.v1.train.Coordinator()
+        threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                         coord=coord)
+
+        summary_writer = tf.compat.v1.summary.FileWriter(summary_path,
+                                                         sess.graph)
+        policy = summary_policy()
+        if policy.async_writes:
+            summary_writer = clock_summaries.AsyncSummaryWriter(
+                summary_writer, policy.queue_size)
+        summary_runner = clock_summaries.SummaryRunner(summary_writer, policy,
+                                                       summary_ops)
+
+        # Precision and time error are computed by a separate graph (with its
+        # own input pipeline) in a background thread.
+        eval_worker = None
+        if FLAGS.background_eval_steps:
+            eval_worker = clock_eval_worker.EvalWorker(
+                summary_writer, FLAGS.background_eval_file, FLAGS.batch_size,
+                num_threads=FLAGS.background_eval_threads)
+            eval_worker.start()
+
+        # Checkpoints are written from a snapshot, in the background.
+        checkpointer = clock_checkpoints.AsyncCheckpointer(
+            summary_path, tf.compat.v1.global_variables(),
+            clock_checkpoints.RetentionPolicy(
+                keep_last=FLAGS.keep_checkpoints,
+                keep_best=FLAGS.keep_best_checkpoints,
+                keep_every_n_hours=FLAGS.keep_checkpoint_every_n_hours),
+            async_writes=FLAGS.async_checkpoints,
+            summary_writer=summary_writer, catalog=catalog)
+
+        # Traces a window of steps (if --profile_steps is set).
+        tracer = clock_trace.StepTracer(FLAGS.profile_steps, summary_path)
+
+        # Records the metrics of every few steps (loss, throughput, input
+        # wait, queue fill...), as JSONL and for Prometheus.
+        step_metrics = clock_step_metrics.from_flags(summary_path)
+
+        if resume_from:
+            # Tell Tensorboard to discard events written after the checkpoint
+            # (e.g. before a crash).
+            summary_writer.add_session_log(
+                tf.compat.v1.SessionLog(status=tf.compat.v1.SessionLog.START),
+                start_step)
+
+        # All the ops are built: make sure the training loop doesn't add any
+        # (metrics are logged as Python values, see clock_metrics).
+        tf.compat.v1.get_default_graph().finalize()
+
+        memory.start_phase('train')
+
+        # Time spent in the training steps, for the throughput (the first
+        # step, which includes graph setup, is not counted).
+        train_secs = 0.0
+        train_steps = 0
+        stop_reason = clock_stopping.MAX_STEPS
+        last_step = None
+        # Step of the latest evaluation recorded for the checkpoints.
+        recorded_eval_step = None
+        loop_start_time = time.time()
+        for step in range(start_step, FLAGS.max_steps):
+            # Summaries are computed in the same run as the training step.
+            summary_fetches = summary_runner.fetches(step)
             start_time = time.time()
-            _, loss_value = sess.run([train_op, loss])
+            for _ in range(FLAGS.accumulation_steps - 1):
+                sess.run(accumulate_op)
+            fetches = [train_op, loss] + summary_fetches
+            if memory.wants_trace('train'):
+                results = memory.run(sess, fetches, 'train')
+            elif tracer.should_trace(step):
+                results = tracer.run(sess, fetches, step)
+            else:
+                results = step_metrics.run(sess, fetches, step)
             duration = time.time() - start_time
+            loss_value = results[1]
+            summary_runner.add(results[2:], step, duration)
+            if step > start_step:
+                train_secs += duration
+                train_steps += 1
 
             assert not np.isnan(loss_value), 'Model diverged with loss = NaN'
 
             # Loss and timing statistics.
+            num_examples_per_step = FLAGS.batch_size * FLAGS.accumulation_steps
+            if step_metrics.should_log(step):
+                step_metrics.emit(sess, step, loss_value, duration,
+                                  num_examples_per_step)
             if step % 20 == 0:
-                num_examples_per_step = FLAGS.batch_size
                 examples_per_sec = num_examples_per_step / duration
                 sec_per_batch = float(duration)
 
@@ -109,69 +334,172 @@ def train(summary_path):
                 print (format_str % (datetime.now(), step, loss_value,
                                      examples_per_sec, sec_per_batch))
 
-            # Compute **training** set precision and time error.
-            if step % 30 == 0:
-                # Evaluate the precision of all the top-k operators.
-                precisions, total_count = clock_model.evaluate_precision(
-                    sess, coord, num_records, FLAGS.batch_size,
-                    [train_accuracy_h_op, train_accuracy_m_op])
-                precision_h, precision_m = precisions
-
-                print('%s: training set precision = %.3f(h) %.3f(m) \t '
-                      '(%d samples)' % (datetime.now(), precision_h,
-                                        precision_m, total_count))
-
-                # Add it to summary writer.
-                precision_summary_h = tf.scalar_summary(
-                    'training_precision/hours', precision_h)
-                precision_summary_m = tf.scalar_summary(
-                    'training_precision/minutes', precision_m)
-                precision_summary_c = tf.scalar_summary(
-                    'training_precision/combined',
-                    (precision_h + precision_m) * 0.5)
-
-                # Compute time error in minutes.
-                (time_err_c, time_err_h, time_err_m) = sess.run(
-                    time_error_losses)
-
-                print('%s: training set time error = %.3fm (total) \t'
-                      ' %.3f(h) %.3f(m)'
-                      % (datetime.now(), time_err_c, time_err_h, time_err_m))
-                time_summary_c = tf.scalar_summary(
-                    'training_error/combined', time_err_c)
-                time_summary_h = tf.scalar_summary(
-                    'training_error/hours_only', time_err_h)
-                time_summary_m = tf.scalar_summary(
-                    'training_error/minutes_only', time_err_m)
-
-                summaries = sess.run([precision_summary_c, precision_summary_h,
-                                      precision_summary_m, time_summary_c,
-                                      time_summary_h, time_summary_m])
-                for summary in summaries:
-                    summary_writer.add_summary(summary, global_step=step)
-
-            # Run summary writers for tensorboard
-            if step % 20 == 0:
-                summary_str = sess.run(summary_op)
-                summary_writer.add_summary(summary_str, step)
-
-            # Save the model checkpoint periodically.
-            if step % 25 == 0 or (step + 1) == FLAGS.max_steps:
-                checkpoint_path = os.path.join(summary_path, 'model.ckpt')
-                saver.save(sess, checkpoint_path, global_step=step)
+            # Evaluate **training** set precision and time error in the
+            # background, on a snapshot of the moving-average weights.
+            if eval_worker is not None and \
+                    step % FLAGS.background_eval_steps == 0:
+                eval_worker.submit(step, eval_worker.snapshot(sess))
+
+            tracer.maybe_report(step)
+
+            # The time error is the latest one from the background evaluation
+            # (if any), of the weights of an earlier step: it is recorded for
+            # the checkpoint of that step, if there is one (for keep_best).
+            if eval_worker is not None and eval_worker.latest is not None:
+                eval_step, eval_metrics = eval_worker.latest
+                stopping.update(eval_step, eval_metrics['error/combined'])
+                if eval_step != recorded_eval_step:
+                    checkpointer.set_metric(eval_step,
+                                            eval_metrics['error/combined'])
+                    recorded_eval_step = eval_step
+            reason = stopping.check(time.time() - loop_start_time)
+            last_step = step
+
+            # Save the model checkpoint periodically, and at the end.
+            if step % FLAGS.checkpoint_steps == 0 or \
+                    (step + 1) == FLAGS.max_steps or reason is not None:
+                checkpointer.save(sess, step)
                 print('%s: saved model at step %d' % (datetime.now(), step))
 
+            if reason is not None:
+                stop_reason = reason
+                print('%s: stopping at step %d (%s): time error %s, best %s '
+                      'at step %s' % (datetime.now(), step, reason,
+                                      stopping.latest_error,
+                                      stopping.best_error,
+                                      stopping.best_step))
+                break
+
+        # (The loop may end before the profiled window does.)
+        tracer.finish()
+        memory.start_phase('stop')
+
+        # Evaluate the final weights too, for the run summary.
+        if eval_worker is not None and last_step is not None and \
+                (eval_worker.latest is None or
+                 eval_worker.latest[0] != last_step):
+            eval_worker.submit(last_step, eval_worker.snapshot(sess))
+
+        step_metrics.close()
+        if eval_worker is not None:
+            eval_worker.stop(drop_pending=False)
+            if eval_worker.latest is not None and \
+                    eval_worker.latest[0] != recorded_eval_step:
+                eval_step, eval_metrics = eval_worker.latest
+                checkpointer.set_metric(eval_step,
+                                        eval_metrics['error/combined'])
+        checkpointer.close()
+        checkpointer.report()
+        summary_runner.report()
+        summary_writer.close()
+
+        # (A resumed run that had no steps left keeps its summary.)
+        if last_step is not None:
+            examples_per_sec = None
+            if train_secs > 0:
+                examples_per_sec = FLAGS.batch_size * \
+                    FLAGS.accumulation_steps * train_steps / train_secs
+            write_run_summary(summary_path, last_step + 1, examples_per_sec,
+                              eval_worker.latest if eval_worker else None,
+                              stop_reason=stop_reason,
+                              train_seconds=time.time() - loop_start_time)
+
         # When done, ask the threads to stop.
         coord.request_stop()
         coord.join(threads)
+        memory.write_report(FLAGS.memory_profile_dir or summary_path)
+
+
+def write_run_summary(summary_path, steps, examples_per_sec, latest_eval,
+                      stop_reason=clock_stopping.MAX_STEPS, train_seconds=None):
+    """
+    Write the final metrics of the run to RUN_SUMMARY_FILENAME.
+
+    :param steps: Number of steps of the run.
+    :param examples_per_sec: Mean training throughput (None if unknown).
+    :param latest_eval: (step, metrics) of the last background evaluation, or
+    None.
+    :param stop_reason: Why the run stopped (see clock_stopping).
+    :param train_seconds: Duration of the training loop.
+    """
+    summary = {'steps': steps, 'examples_per_sec': examples_per_sec,
+               'eval_step': None, 'metrics': {}, 'stop_reason': stop_reason,
+               'train_seconds': train_seconds}
+    if latest_eval is not None:
+        summary['eval_step'] = int(latest_eval[0])
+        summary['metrics'] = dict((name, float(value)) for (name, value)
+                                  in latest_eval[1].items())
+    with tf.io.gfile.GFile(os.path.join(summary_path,
+                                        RUN_SUMMARY_FILENAME), 'w') as f:
+        json.dump(summary, f, indent=1, sort_keys=True)
+
+
+def warm_start(sess, checkpoint_path):
+    """
+    Initialize the shared layers (and their moving averages) from a
+    checkpoint, e.g. of a single-task model to train a multi-task one.
+    """
+    variables_to_restore, skipped = clock_checkpoints.warm_start_variables(
+        checkpoint_path, clock_model.shared_variables())
+    if not variables_to_restore:
+        raise ValueError('No matching variables in {}'.format(checkpoint_path))
+
+    saver = tf.compat.v1.train.Saver(variables_to_restore)
+    saver.restore(sess, checkpoint_path)
+
+    # Start the moving averages at the restored values.
+    graph_variables = dict((var.op.name, var)
+                           for var in tf.compat.v1.global_variables())
+    for (name, var) in variables_to_restore.items():
+        average = graph_variables.get(name + '/ExponentialMovingAverage')
+        if average is not None:
+            average.load(sess.run(var), sess)
+
+    print('Warm start from {}: restored {} variables ({}).'.format(
+        checkpoint_path, len(variables_to_restore),
+        ', '.join(sorted(variables_to_restore))))
+    if skipped:
+        print('Not restored (missing or different shape): {}'.format(
+            ', '.join(sorted(var.op.name for var in skipped))))
 
 
 def main(argv=None):  # pylint: disable=unused-argument
 
-    time_str = time.strftime('%H.%M.%S')
-    summary_path = os.path.join(FLAGS.train_dir, 'run_{}'.format(time_str))
-    tf.io.gfile.makedirs(summary_path)
-    train(summary_path)
+    catalog = clock_catalog.Catalog(FLAGS.train_dir)
+
+    resume_from = None
+    if FLAGS.resume:
+        run_dir = clock_evaluation.find_model_dir(FLAGS.train_dir)
+        if run_dir:
+            resume_from = clock_checkpoints.resolve_checkpoint(run_dir)
+        if resume_from:
+            summary_path = run_dir
+        else:
+            print('No checkpoint to resume from in {}, starting a new '
+                  'run.'.format(FLAGS.train_dir))
+
+    if not resume_from:
+        time_str = time.strftime('%H.%M.%S')
+        summary_path = os.path.join(FLAGS.train_dir,
+                                    'run_{}'.format(time_str))
+        tf.io.gfile.makedirs(summary_path)
+        catalog.add_run(summary_path)
+
+    warm_start_from = None
+    if FLAGS.warm_start_from and not resume_from:
+        warm_start_from = clock_checkpoints.resolve_checkpoint(
+            FLAGS.warm_start_from)
+        if warm_start_from is None:
+            raise ValueError('No checkpoint found in {}'.format(
+                FLAGS.warm_start_from))
+
+    # Tune the input pipeline for this host and batch size (if
+    # --input_autotune is set).
+    if FLAGS.input_autotune:
+        clock_input_tuning.autotune(summary_path, 'clocks_all.txt')
+
+    train(summary_path, resume_from=resume_from,
+          warm_start_from=warm_start_from, catalog=catalog)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,146 @@
+""" Watch a run directory for new checkpoints, for continuous evaluation.
+
+The CheckpointWatcher hands out every checkpoint of a run directory exactly
+once, oldest first, including the ones written while the previous checkpoint
+was being evaluated. It waits for the directory to change with inotify (on
+Linux), or by polling it every few seconds otherwise.
+
+A checkpoint is complete once its index file exists (the AsyncCheckpointer
+renames it last, see clock_checkpoints), so only index files are looked at.
+
+The steps that were already evaluated (e.g. recorded in the catalog, see
+clock_catalog.py, by an earlier evaluation process) are skipped.
+
+Usage (see clock_evaluation.py):
+    watcher = clock_watcher.CheckpointWatcher(
+        run_dir, catalog.evaluated_steps(run_dir, dataset))
+    while True:
+        step, checkpoint_path = watcher.next_checkpoint()
+        ...  # Restore, evaluate and record in the catalog.
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+
+import tensorflow as tf
+
+import clock_checkpoints
+
+# inotify events of a file being written or renamed into the directory.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+
+class _Inotify(object):
+    # Minimal inotify (Linux) watch of a directory, through libc.
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self._fd, path.encode(), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, 'inotify_add_watch failed: {}'.format(path))
+
+    def wait(self, timeout):
+        """ Wait for events (or the timeout), and discard them. """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if ready:
+            try:
+                while os.read(self._fd, 4096):
+                    pass
+            except (IOError, OSError):  # No more events (EAGAIN).
+                pass
+
+    def close(self):
+        os.close(self._fd)
+
+
+class CheckpointWatcher(object):
+
+    def __init__(self, checkpoint_dir, evaluated_steps=(), poll_secs=30.0,
+                 use_inotify=True):
+        """
+        :param checkpoint_dir: Run directory with the checkpoints.
+        :param evaluated_steps: Steps to skip.
+        :param poll_secs: Interval between scans of the directory. With
+        inotify, this is only a safety net.
+        :param use_inotify: Wait for changes with inotify, if available.
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.poll_secs = poll_secs
+
+        self._queued = set(int(step) for step in evaluated_steps)
+        self._pending = []
+
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = _Inotify(checkpoint_dir)
+            except (OSError, AttributeError) as e:
+                print('inotify is not available ({}), polling every {} '
+                      'seconds.'.format(e, poll_secs))
+
+    def checkpoints(self):
+        """
+        :return: list of (step, checkpoint prefix) of the complete checkpoints,
+        oldest first.
+        """
+        found = []
+        for index in tf.io.gfile.glob(os.path.join(self.checkpoint_dir,
+                                                   '*-*.index')):
+            prefix = index[:-len('.index')]
+            if prefix.endswith(clock_checkpoints.TMP_SUFFIX):
+                continue
+            try:
+                found.append((clock_checkpoints.checkpoint_step(prefix),
+                              prefix))
+            except ValueError:
+                continue
+        return sorted(found)
+
+    def _scan(self):
+        for (step, prefix) in self.checkpoints():
+            if step not in self._queued:
+                self._queued.add(step)
+                self._pending.append((step, prefix))
+        self._pending.sort()
+
+    def next_checkpoint(self, timeout=None):
+        """
+        Wait for a checkpoint that has not been handed out or evaluated yet.
+
+        :param timeout: Seconds to wait (None: forever).
+        :return: (step, checkpoint prefix), or None after the timeout.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            self._scan()
+            if self._pending:
+                return self._pending.pop(0)
+
+            wait_secs = self.poll_secs
+            if deadline is not None:
+                wait_secs = min(wait_secs, deadline - time.time())
+                if wait_secs <= 0:
+                    return None
+            if self._inotify is not None:
+                self._inotify.wait(wait_secs)
+            else:
+                time.sleep(wait_secs)
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
@@ -0,0 +1,86 @@
+""" Compare a distilled student model with its teacher.
+
+Reports, side by side, the number of parameters, FLOPs per image and CPU
+latency of each architecture (see profile_architectures.py), and the time error
+and precision of each trained model (moving-average weights of its latest
+checkpoint) on an index file.
+
+Use the flags of the distillation run, plus the run directory of the student:
+    python compare_distillation.py --distill_from=./tf_data/run_10.00.00 \
+        --teacher_architecture=baseline --architecture=tiny \
+        --student_dir=./tf_data/run_11.00.00
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+import clock_checkpoints
+import clock_distillation  # pylint: disable=unused-import (flags)
+import clock_evaluation
+import profile_architectures
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_string('student_dir', '',
+                           """Run directory or checkpoint of the student.""")
+tf.compat.v1.app.flags.DEFINE_string('compare_file', 'clocks_all.txt',
+                           """Index file of the images to evaluate on.""")
+
+
+def compare(models):
+    """
+    :param models: list of (name, architecture, checkpoint path).
+    :return: list of dicts with the name, architecture, params, flops,
+    latency (seconds per image), time_error and precision of each model.
+    """
+    results = []
+    for (name, arch, checkpoint_path) in models:
+        rows = profile_architectures.profile(
+            arch, FLAGS.profile_batch_size, FLAGS.profile_iters,
+            FLAGS.profile_warmup)
+        result = {'name': name, 'architecture': arch,
+                  'params': sum(r[1] for r in rows),
+                  'flops': sum(r[2] for r in rows),
+                  'latency': sum(r[3] for r in rows) /
+                  FLAGS.profile_batch_size}
+        result.update(clock_evaluation.evaluate_checkpoint(
+            checkpoint_path, arch, FLAGS.compare_file, FLAGS.batch_size))
+        results.append(result)
+    return results
+
+
+def main(argv=None):  # pylint: disable=unused-argument
+
+    models = []
+    for (name, arch, path) in [
+            ('teacher', FLAGS.teacher_architecture, FLAGS.distill_from),
+            ('student', FLAGS.architecture, FLAGS.student_dir)]:
+        checkpoint_path = clock_checkpoints.resolve_checkpoint(path)
+        if checkpoint_path is None:
+            raise ValueError('No {} checkpoint found in {!r}'.format(name,
+                                                                     path))
+        models.append((name, arch, checkpoint_path))
+
+    results = compare(models)
+
+    print('==================')
+    print('Evaluated on {}; latency with batch size {}:'.format(
+        FLAGS.compare_file, FLAGS.profile_batch_size))
+    print('  {:<8s} {:<12s} {:>12s} {:>14s} {:>14s} {:>12s} {:>10s}'.format(
+        '', 'arch', 'params', 'FLOPs/image', 'latency ms', 'time error',
+        'precision'))
+    for r in results:
+        print('  {:<8s} {:<12s} {:>12d} {:>14d} {:>14.3f} {:>11.2f}m '
+              '{:>10.3f}'.format(r['name'], r['architecture'], r['params'],
+                                 r['flops'], 1000 * r['latency'],
+                                 r['time_error'], r['precision']))
+    teacher, student = results
+    print('  student/teacher: {:.1f}x fewer params, {:.1f}x faster'.format(
+        teacher['params'] / float(student['params']),
+        teacher['latency'] / max(student['latency'], 1e-9)))
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
@@ -0,0 +1,155 @@
+""" Evaluate an ensemble of checkpoints in a single graph.
+
+Builds K copies of the multi-task model in one graph, each in its own variable
+scope (see clock_ensemble.py), restores a checkpoint into each (its moving
+averages, as clock_evaluation does) and runs all of them on the same batches.
+The images are read and decoded once per batch, not once per checkpoint.
+
+Reports the metrics of each member, and of the ensemble (the average of the
+probabilities of the members).
+All the metrics are accumulated in the graph (see clock_streaming_metrics), in
+a single pass over the index file.
+
+Evaluate the last 3 checkpoints of the latest run:
+    python evaluate_ensemble.py --checkpoint_dir=./tf_data --ensemble_size=3
+
+or given checkpoints (or run directories, for their latest checkpoint), with
+an architecture per member if they differ:
+    python evaluate_ensemble.py \
+        --ensemble_checkpoints=./tf_data/run_a/model.ckpt-80,./tf_data/run_b \
+        --ensemble_architectures=baseline,tiny
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import clock_checkpoints
+import clock_data
+import clock_ensemble
+import clock_evaluation
+import clock_streaming_metrics
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_string('ensemble_checkpoints', '',
+                           """Comma-separated checkpoints (or run """
+                           """directories) of the members. Default: the """
+                           """last ensemble_size checkpoints of the latest """
+                           """run in checkpoint_dir.""")
+tf.compat.v1.app.flags.DEFINE_integer('ensemble_size', 3,
+                            """Number of members, without """
+                            """ensemble_checkpoints.""")
+tf.compat.v1.app.flags.DEFINE_string('ensemble_architectures', '',
+                           """Comma-separated architecture of each member """
+                           """(default: --architecture for all).""")
+tf.compat.v1.app.flags.DEFINE_string('ensemble_file', 'clocks_test.txt',
+                           """Index file of the images to evaluate on.""")
+
+
+def member_name(k):
+    return clock_ensemble.MEMBER_SCOPE.format(k)
+
+
+def evaluate_ensemble(checkpoint_paths, archs, filename, batch_size):
+    """
+    Evaluate the members and their ensemble in a single pass over (at least)
+    all the images of an index file.
+
+    :return: (list of metrics of each member, metrics of the ensemble, seconds
+    of the evaluation pass), the metrics as dicts of
+    clock_streaming_metrics.time_metrics().
+    """
+    with tf.Graph().as_default():
+        images, labels, num_records, _ = clock_data.load_inputs_both(
+            batch_size=batch_size, filename=filename)
+        member_predictions, ensemble_predictions = \
+            clock_ensemble.build_ensemble(images, labels, archs)
+
+        accumulators = [clock_streaming_metrics.StreamingTimeMetrics(
+            predictions, name='metrics_' + member_name(k))
+            for (k, predictions) in enumerate(member_predictions)]
+        accumulators.append(clock_streaming_metrics.StreamingTimeMetrics(
+            ensemble_predictions, name='metrics_ensemble'))
+        update_op = tf.group(*[a.update_op for a in accumulators])
+
+        with tf.compat.v1.Session() as sess:
+            sess.run(tf.compat.v1.local_variables_initializer())
+            clock_ensemble.restore_members(sess, checkpoint_paths)
+            coord = tf.compat.v1.train.Coordinator()
+            threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                             coord=coord)
+
+            start_time = time.time()
+            num_iter = int(np.ceil(num_records / batch_size))
+            batch_num = 0
+            while batch_num < num_iter and not coord.should_stop():
+                # One batch, through all the members.
+                sess.run(update_op)
+                batch_num += 1
+            duration = time.time() - start_time
+            confusions = sess.run([a.confusion for a in accumulators])
+
+            coord.request_stop()
+            coord.join(threads, stop_grace_period_secs=10)
+
+    metrics = [clock_streaming_metrics.time_metrics(c) for c in confusions]
+    return metrics[:-1], metrics[-1], duration
+
+
+def main(argv=None):  # pylint: disable=unused-argument
+
+    if FLAGS.ensemble_checkpoints:
+        checkpoint_paths = []
+        for path in FLAGS.ensemble_checkpoints.split(','):
+            checkpoint_path = clock_checkpoints.resolve_checkpoint(path)
+            if checkpoint_path is None:
+                raise ValueError('No checkpoint found in {!r}'.format(path))
+            checkpoint_paths.append(checkpoint_path)
+    else:
+        run_dir = clock_evaluation.find_model_dir(FLAGS.checkpoint_dir)
+        if run_dir is None:
+            raise ValueError('No run found in {!r}'.format(
+                FLAGS.checkpoint_dir))
+        checkpoint_paths = clock_ensemble.latest_checkpoints(
+            run_dir, FLAGS.ensemble_size)
+        if not checkpoint_paths:
+            raise ValueError('No checkpoint found in {!r}'.format(run_dir))
+
+    if FLAGS.ensemble_architectures:
+        archs = FLAGS.ensemble_architectures.split(',')
+        if len(archs) != len(checkpoint_paths):
+            raise ValueError('{} architectures for {} checkpoints'.format(
+                len(archs), len(checkpoint_paths)))
+    else:
+        archs = [FLAGS.architecture] * len(checkpoint_paths)
+
+    member_metrics, ensemble_metrics, duration = evaluate_ensemble(
+        checkpoint_paths, archs, FLAGS.ensemble_file, FLAGS.batch_size)
+
+    print('==================')
+    print('Evaluated {} models on {} ({} samples) in {:.1f}s:'.format(
+        len(checkpoint_paths), FLAGS.ensemble_file,
+        ensemble_metrics['sample_count'], duration))
+    print('  {:<10s} {:<12s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s}'.format(
+        '', 'arch', 'time error', 'median', '90%', 'prec. (h)',
+        'prec. (m)'))
+    rows = [(member_name(k), arch, metrics) for (k, (arch, metrics))
+            in enumerate(zip(archs, member_metrics))]
+    rows.append(('ensemble', '', ensemble_metrics))
+    for (name, arch, metrics) in rows:
+        print('  {:<10s} {:<12s} {:>9.2f}m {:>9.1f}m {:>9.1f}m {:>10.3f} '
+              '{:>10.3f}'.format(name, arch, metrics['error/combined'],
+                                 metrics['error/p50'], metrics['error/p90'],
+                                 metrics['precision/hours'],
+                                 metrics['precision/minutes']))
+    for (k, checkpoint_path) in enumerate(checkpoint_paths):
+        print('  {}: {}'.format(member_name(k), checkpoint_path))
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
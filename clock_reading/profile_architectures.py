@@ -0,0 +1,148 @@
+""" Profile the architecture variants of the clock reading model.
+
+For each architecture in clock_architectures, this reports the number of
+parameters, the FLOPs per image, and the measured CPU latency of every layer.
+Use it together with the time error reported by clock_evaluation to pick the
+cheapest model that is still accurate enough.
+
+The latency of a layer is measured as the time to compute its output minus the
+time to compute its input (both starting from a fed batch of random images).
+The output of a conv layer is its ReLU, before pooling and normalization, so
+these are counted in the latency of the next layer (for the last conv layer,
+in the first fully connected layer).
+
+Example:
+    python profile_architectures.py --architectures=baseline,tiny \
+        --profile_batch_size=1
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import clock_architectures
+import clock_data
+import clock_model
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_string('architectures', '',
+                           """Comma-separated architectures to profile """
+                           """(default: all of them).""")
+tf.compat.v1.app.flags.DEFINE_integer('profile_batch_size', 1,
+                            """Batch size used to measure latency.""")
+tf.compat.v1.app.flags.DEFINE_integer('profile_iters', 50,
+                            """Number of timed runs per layer.""")
+tf.compat.v1.app.flags.DEFINE_integer('profile_warmup', 5,
+                            """Number of untimed runs per layer.""")
+
+
+def _time_run(sess, tensor, feed_dict, num_iters, num_warmup):
+    # Return the median time (in seconds) to compute the tensor.
+    for _ in range(num_warmup):
+        sess.run(tensor, feed_dict=feed_dict)
+
+    durations = []
+    for _ in range(num_iters):
+        start_time = time.time()
+        sess.run(tensor, feed_dict=feed_dict)
+        durations.append(time.time() - start_time)
+    return float(np.median(durations))
+
+
+def measure_layer_latency(arch, batch_size, num_iters, num_warmup):
+    """
+    Build an architecture on random inputs and measure the latency per layer.
+
+    :param arch: Architecture name or config.
+    :param batch_size: Number of images per run.
+    :param num_iters: Number of timed runs per layer.
+    :param num_warmup: Number of untimed runs per layer.
+    :return: dict of layer name -> latency in seconds (for the whole batch).
+    """
+    with tf.Graph().as_default():
+        images = tf.compat.v1.placeholder(
+            tf.float32, [batch_size, clock_data.image_size1,
+                         clock_data.image_size2, clock_data.image_channels])
+        clock_model.inference_multitask(images, arch=arch)
+        endpoints = tf.compat.v1.get_collection(clock_model.LAYER_ENDPOINTS)
+
+        feed_dict = {images: np.random.randn(
+            *images.get_shape().as_list()).astype(np.float32)}
+
+        with tf.compat.v1.Session() as sess:
+            sess.run(tf.compat.v1.global_variables_initializer())
+
+            latencies = {}
+            previous = 0.0  # Time to compute the input of the current layer.
+            shared_total = 0.0
+            for endpoint in endpoints:
+                layer_name = endpoint.op.name.split('/')[0]
+                total = _time_run(sess, endpoint, feed_dict, num_iters,
+                                  num_warmup)
+                if layer_name.startswith('softmax_linear'):
+                    # Both classifiers take the last shared layer as input.
+                    previous = shared_total
+                else:
+                    shared_total = total
+                latencies[layer_name] = max(total - previous, 0.0)
+                previous = total
+
+    return latencies
+
+
+def profile(arch, batch_size, num_iters, num_warmup):
+    """
+    Profile an architecture.
+
+    :return: list of (layer_name, params, flops, latency_secs) tuples.
+    """
+    stats = clock_architectures.layer_stats(
+        arch, clock_data.image_size1, clock_data.image_size2,
+        clock_data.image_channels)
+    latencies = measure_layer_latency(arch, batch_size, num_iters, num_warmup)
+    return [(name, params, flops, latencies.get(name, 0.0))
+            for (name, params, flops) in stats]
+
+
+def print_profile(arch, rows, batch_size):
+    print('==================')
+    print('Architecture: {} (batch size {})'.format(arch, batch_size))
+    print('  {:<24s} {:>12s} {:>14s} {:>12s}'.format(
+        'layer', 'params', 'FLOPs/image', 'latency ms'))
+    for (name, params, flops, latency) in rows:
+        print('  {:<24s} {:>12d} {:>14d} {:>12.3f}'.format(
+            name, params, flops, 1000 * latency))
+    print('  {:<24s} {:>12d} {:>14d} {:>12.3f}'.format(
+        'total', sum(r[1] for r in rows), sum(r[2] for r in rows),
+        1000 * sum(r[3] for r in rows)))
+
+
+def main(argv=None):  # pylint: disable=unused-argument
+
+    if FLAGS.architectures:
+        architectures = FLAGS.architectures.split(',')
+    else:
+        architectures = sorted(clock_architectures.ARCHITECTURES)
+
+    summary = []
+    for arch in architectures:
+        rows = profile(arch, FLAGS.profile_batch_size, FLAGS.profile_iters,
+                       FLAGS.profile_warmup)
+        print_profile(arch, rows, FLAGS.profile_batch_size)
+        summary.append((arch, sum(r[1] for r in rows), sum(r[2] for r in rows),
+                        sum(r[3] for r in rows)))
+
+    print('==================')
+    print('Summary (sorted by latency):')
+    for (arch, params, flops, latency) in sorted(summary, key=lambda s: s[3]):
+        print('  {:<12s} {:>10d} params {:>12d} FLOPs {:>9.3f} ms'.format(
+            arch, params, flops, 1000 * latency))
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
@@ -0,0 +1,279 @@
+""" Prune channels from a trained model, fine-tune it, and compare.
+
+For every prune ratio, this:
+ - ranks the channels of every conv and fully connected layer (by weight
+   magnitude, or by mean activation over calibration batches),
+ - removes the lowest-ranked fraction of them (see clock_pruning.py), which
+   gives a smaller architecture,
+ - fine-tunes the smaller model for a few steps,
+ - measures its latency (see profile_architectures.py) and its time error,
+and prints a table of latency versus time error, marking the models on the
+Pareto front (no other model is both faster and more accurate).
+
+Each pruned model is saved to <prune_output_dir>/ratio_<ratio>, with its
+architecture in architecture.json, so it can be trained or evaluated further
+with --architecture=<dir>/architecture.json.
+
+Example:
+    python prune_channels.py --prune_from=./tf_data/run_10.00.00 \
+        --architecture=baseline --prune_ratios=0.25,0.5,0.75 \
+        --prune_criterion=activation
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+
+import tensorflow as tf
+
+import clock_architectures
+import clock_checkpoints
+import clock_data
+import clock_evaluation
+import clock_model
+import clock_pruning
+import profile_architectures
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_string('prune_from', '',
+                           """Run directory or checkpoint of the model to """
+                           """prune (of --architecture).""")
+tf.compat.v1.app.flags.DEFINE_string('prune_ratios', '0.25,0.5,0.75',
+                           """Comma-separated fractions of the channels to """
+                           """remove from every layer.""")
+tf.compat.v1.app.flags.DEFINE_string('prune_criterion', 'magnitude',
+                           """Channel ranking: magnitude or activation.""")
+tf.compat.v1.app.flags.DEFINE_integer('prune_calibration_batches', 10,
+                            """Batches used to compute the activations.""")
+tf.compat.v1.app.flags.DEFINE_integer('prune_finetune_steps', 200,
+                            """Fine-tuning steps after pruning.""")
+tf.compat.v1.app.flags.DEFINE_float('prune_finetune_learning_rate', 0.01,
+                          """Learning rate for fine-tuning.""")
+tf.compat.v1.app.flags.DEFINE_string('prune_file', 'clocks_all.txt',
+                           """Index file for calibration, fine-tuning and """
+                           """evaluation.""")
+tf.compat.v1.app.flags.DEFINE_string('prune_output_dir', './tf_pruned',
+                           """Where to save the pruned models.""")
+
+
+def load_weights(checkpoint_path):
+    """
+    Read the weights of a model, as used for evaluation: the moving averages
+    of the trainable variables, and the batch norm statistics. Optimizer slots
+    and other training state are left out.
+
+    :return: dict of variable name -> numpy array.
+    """
+    names = set(name for (name, _) in tf.train.list_variables(checkpoint_path))
+    suffix = '/ExponentialMovingAverage'
+    weights = {}
+    for name in names:
+        if name + suffix in names:
+            weights[name] = tf.train.load_variable(checkpoint_path,
+                                                   name + suffix)
+        elif name.split('/')[-1] in ('moving_mean', 'moving_variance'):
+            weights[name] = tf.train.load_variable(checkpoint_path, name)
+    return weights
+
+
+def activation_scores(arch, weights, filename, batch_size, num_batches):
+    """
+    Mean output of every channel of the conv and fully connected layers over
+    calibration batches.
+
+    :return: dict of layer name -> 1-D array of scores.
+    """
+    with tf.Graph().as_default():
+        images, _, _, _ = clock_data.load_inputs_both(batch_size=batch_size,
+                                                      filename=filename)
+        clock_model.inference_multitask(images, arch=arch)
+        layers = set(name for (name, _, _) in
+                     clock_pruning.prunable_layers(
+                         clock_architectures.get_architecture(arch)))
+        endpoints = dict(
+            (endpoint.op.name.split('/')[0], endpoint) for endpoint in
+            tf.compat.v1.get_collection(clock_model.LAYER_ENDPOINTS))
+        means = dict(
+            (name, tf.reduce_mean(endpoint, axis=list(range(
+                len(endpoint.get_shape()) - 1))))
+            for (name, endpoint) in endpoints.items() if name in layers)
+
+        with tf.compat.v1.Session() as sess:
+            _load(sess, weights)
+            coord = tf.compat.v1.train.Coordinator()
+            threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                             coord=coord)
+            totals = dict((name, 0.0) for name in means)
+            for _ in range(num_batches):
+                for (name, value) in sess.run(means).items():
+                    totals[name] += value
+            coord.request_stop()
+            coord.join(threads, stop_grace_period_secs=10)
+
+    return dict((name, total / num_batches) for (name, total)
+                in totals.items())
+
+
+def _load(sess, weights, averages=False):
+    # Initialize the variables of the default graph, then load the weights (by
+    # name) into them; with averages, also into their moving averages.
+    sess.run(tf.compat.v1.global_variables_initializer())
+    variables = dict((var.op.name, var)
+                     for var in tf.compat.v1.global_variables())
+    for (name, value) in weights.items():
+        variables[name].load(value, sess)
+        if averages and name + '/ExponentialMovingAverage' in variables:
+            variables[name + '/ExponentialMovingAverage'].load(value, sess)
+
+
+def fine_tune(config, weights, output_dir, filename, num_steps,
+              learning_rate):
+    """
+    Train a pruned model for a few steps, and save it (at step 0 and at the
+    end).
+
+    :return: (checkpoint before fine-tuning, checkpoint after fine-tuning).
+    """
+    previous = (FLAGS.learning_rate, FLAGS.lr_schedule)
+    FLAGS.learning_rate = learning_rate
+    FLAGS.lr_schedule = 'cosine'
+    try:
+        with tf.Graph().as_default():
+            global_step = tf.Variable(0, trainable=False, name='global_step')
+            images, labels, num_records, _ = clock_data.load_inputs_both(
+                batch_size=FLAGS.batch_size, filename=filename)
+            logits = clock_model.inference_multitask(images, arch=config,
+                                                     is_training=True)
+            loss = clock_model.loss_multitask(logits[0], labels[0],
+                                              logits[1], labels[1])
+            train_op = clock_model.train(loss, global_step,
+                                         num_examples_per_epoch=num_records,
+                                         total_steps=max(num_steps, 1))
+            accumulate_op = clock_model.accumulate_gradients_op()
+            saver = tf.compat.v1.train.Saver(tf.compat.v1.global_variables())
+
+            with tf.compat.v1.Session() as sess:
+                _load(sess, weights, averages=True)
+                sess.run(tf.compat.v1.local_variables_initializer())
+                prefix = os.path.join(output_dir, 'model.ckpt')
+                pruned_checkpoint = saver.save(sess, prefix, global_step=0)
+
+                coord = tf.compat.v1.train.Coordinator()
+                threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                                 coord=coord)
+                for _ in range(num_steps):
+                    for _ in range(FLAGS.accumulation_steps - 1):
+                        sess.run(accumulate_op)
+                    sess.run(train_op)
+                coord.request_stop()
+                coord.join(threads, stop_grace_period_secs=10)
+
+                tuned_checkpoint = saver.save(sess, prefix,
+                                              global_step=num_steps)
+    finally:
+        FLAGS.learning_rate, FLAGS.lr_schedule = previous
+    return pruned_checkpoint, tuned_checkpoint
+
+
+def latency(arch):
+    # Latency per image (summed over the layers), see profile_architectures.
+    rows = profile_architectures.profile(arch, FLAGS.profile_batch_size,
+                                         FLAGS.profile_iters,
+                                         FLAGS.profile_warmup)
+    return (sum(r[1] for r in rows), sum(r[2] for r in rows),
+            sum(r[3] for r in rows) / FLAGS.profile_batch_size)
+
+
+def pareto_front(results):
+    """
+    :param results: list of dicts with 'latency' and 'time_error'.
+    :return: set of the indices of the results that no other result beats on
+    both latency and time error.
+    """
+    front = set()
+    for (idx, r) in enumerate(results):
+        dominated = any(
+            o['latency'] <= r['latency'] and
+            o['time_error'] <= r['time_error'] and
+            (o['latency'] < r['latency'] or o['time_error'] < r['time_error'])
+            for o in results)
+        if not dominated:
+            front.add(idx)
+    return front
+
+
+def main(argv=None):  # pylint: disable=unused-argument
+
+    checkpoint_path = clock_checkpoints.resolve_checkpoint(FLAGS.prune_from)
+    if checkpoint_path is None:
+        raise ValueError('No checkpoint found in {!r}'.format(
+            FLAGS.prune_from))
+    arch = FLAGS.architecture
+    weights = load_weights(checkpoint_path)
+
+    if FLAGS.prune_criterion == 'magnitude':
+        scores = clock_pruning.magnitude_scores(arch, weights)
+    elif FLAGS.prune_criterion == 'activation':
+        scores = activation_scores(arch, weights, FLAGS.prune_file,
+                                   FLAGS.batch_size,
+                                   FLAGS.prune_calibration_batches)
+    else:
+        raise ValueError('Invalid prune criterion: {}'.format(
+            FLAGS.prune_criterion))
+
+    # The unpruned model, for reference.
+    params, flops, seconds = latency(arch)
+    result = {'ratio': 0.0, 'params': params, 'flops': flops,
+              'latency': seconds, 'error_pruned': None}
+    result.update(clock_evaluation.evaluate_checkpoint(
+        checkpoint_path, arch, FLAGS.prune_file, FLAGS.batch_size))
+    results = [result]
+
+    for ratio in [float(r) for r in FLAGS.prune_ratios.split(',')]:
+        keep = clock_pruning.select_channels(scores, ratio)
+        config, pruned_weights = clock_pruning.prune(arch, weights, keep)
+        print('Prune ratio {}: {}'.format(ratio, config))
+
+        output_dir = os.path.join(FLAGS.prune_output_dir,
+                                  'ratio_{:.2f}'.format(ratio))
+        tf.io.gfile.makedirs(output_dir)
+        with open(os.path.join(output_dir, 'architecture.json'), 'w') as f:
+            json.dump(config, f, indent=1, sort_keys=True)
+
+        pruned_checkpoint, tuned_checkpoint = fine_tune(
+            config, pruned_weights, output_dir, FLAGS.prune_file,
+            FLAGS.prune_finetune_steps, FLAGS.prune_finetune_learning_rate)
+
+        params, flops, seconds = latency(config)
+        result = {'ratio': ratio, 'params': params, 'flops': flops,
+                  'latency': seconds,
+                  'error_pruned': clock_evaluation.evaluate_checkpoint(
+                      pruned_checkpoint, config, FLAGS.prune_file,
+                      FLAGS.batch_size)['time_error']}
+        result.update(clock_evaluation.evaluate_checkpoint(
+            tuned_checkpoint, config, FLAGS.prune_file, FLAGS.batch_size))
+        results.append(result)
+
+    front = pareto_front(results)
+    print('==================')
+    print('Pruning {} ({} criterion), {} fine-tuning steps; latency with '
+          'batch size {}:'.format(arch, FLAGS.prune_criterion,
+                                  FLAGS.prune_finetune_steps,
+                                  FLAGS.profile_batch_size))
+    print('  {:>6s} {:>12s} {:>14s} {:>11s} {:>14s} {:>12s} {:>7s}'.format(
+        'ratio', 'params', 'FLOPs/image', 'latency ms', 'error pruned',
+        'error tuned', 'pareto'))
+    for (idx, r) in enumerate(results):
+        error_pruned = '-' if r['error_pruned'] is None else \
+            '{:.2f}m'.format(r['error_pruned'])
+        print('  {:>6.2f} {:>12d} {:>14d} {:>11.3f} {:>14s} {:>11.2f}m '
+              '{:>7s}'.format(r['ratio'], r['params'], r['flops'],
+                              1000 * r['latency'], error_pruned,
+                              r['time_error'], '*' if idx in front else ''))
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
@@ -17,6 +17,7 @@ import numpy as np
 import clock_model
 import clock_evaluation
 import clock_data
+import clock_memory
 
 
 FLAGS = tf.compat.v1.app.flags.FLAGS
@@ -29,6 +30,10 @@ tf.compat.v1.app.flags.DEFINE_string('image', None,
 
 
 def main(hour, minute, fname=None):
+    # Memory use of each phase (if --memory_profile is set).
+    memory = clock_memory.from_flags()
+    memory.start_phase('build_graph')
+
     # ** Read the data. **
     true_h, true_m = hour, minute
 
@@ -59,21 +64,32 @@ def main(hour, minute, fname=None):
     likelihood_m = tf.nn.softmax(logits_minutes)
 
     # Restore the moving average version of the learned variables for eval.
-    variable_averages = tf.train.ExponentialMovingAverage(
+    variable_averages = tf.compat.v1.train.ExponentialMovingAverage(
         clock_model.MOVING_AVERAGE_DECAY)
     variables_to_restore = variable_averages.variables_to_restore()
     saver = tf.compat.v1.train.Saver(variables_to_restore)
 
     with tf.compat.v1.Session() as sess:
 
-        # Load the saved model from file.
-        global_step = clock_evaluation.load_model(sess, saver)
+        # Load the latest saved model from file.
+        memory.start_phase('restore')
+        model_dir = clock_evaluation.find_model_dir(FLAGS.checkpoint_dir)
+        checkpoint_path = None
+        if model_dir is not None:
+            checkpoint_path = tf.train.latest_checkpoint(model_dir)
+        if checkpoint_path is None:
+            print('No checkpoint file found, cannot load model.')
+            return
+        global_step = clock_evaluation.restore_checkpoint(sess, saver,
+                                                          checkpoint_path)
         if global_step is None:
             return
 
         # Evaluate the model; get probabilities.
-        ([prob_h], [prob_m], label_h, label_m) = sess.run(
-            [likelihood_h, likelihood_m, hour, minute])
+        memory.start_phase('inference')
+        ([prob_h], [prob_m], label_h, label_m) = memory.run(
+            sess, [likelihood_h, likelihood_m, hour, minute], 'inference')
+        memory.write_report(FLAGS.memory_profile_dir or '.')
 
         # Sort in descending order.
         sort_idx_h = np.argsort(prob_h)[::-1]
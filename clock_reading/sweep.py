@@ -0,0 +1,332 @@
+""" Hyperparameter sweep: run several training processes in parallel.
+
+The sweep is described by a JSON spec, e.g.:
+
+    {
+        "search": "random",
+        "num_trials": 12,
+        "seed": 0,
+        "params": {
+            "batch_size": [64, 128],
+            "learning_rate": {"log_uniform": [0.001, 0.3]},
+            "weight_decay": {"uniform": [0.0, 0.01]},
+            "architecture": ["baseline", "narrow", "small_bn"]
+        },
+        "fixed": {"max_steps": 1000, "background_eval_steps": 100}
+    }
+
+With "search": "grid", every parameter is a list of values and every
+combination is a trial. With "random", a list is sampled uniformly and
+{"uniform": [a, b]}, {"log_uniform": [a, b]} or {"int_uniform": [a, b]} sample
+from a range. The "fixed" flags are passed to every trial. Any flag of
+clock_training.py (and clock_model.py) can be swept.
+
+The CPUs of the machine are split into --sweep_parallel disjoint sets; each
+trial is a clock_training.py process pinned to one set, with its intra-op
+threads set to the size of the set. Each trial trains in
+<sweep_dir>/trial_NNN (log in trial_NNN.log). The final precision, time error
+and examples/sec of every trial are appended to <sweep_dir>/results.jsonl and
+the table is rewritten to <sweep_dir>/results.csv.
+
+Running the same sweep again (same spec and sweep_dir) skips the trials that
+completed, and resumes the interrupted ones from their latest checkpoint.
+
+Example:
+    python sweep.py --sweep_spec=sweep.json --sweep_dir=./sweeps/lr_wd \
+        --sweep_parallel=4
+
+"""
+from __future__ import division
+from __future__ import print_function
+
+import csv
+import itertools
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import tensorflow as tf
+
+FLAGS = tf.compat.v1.app.flags.FLAGS
+
+tf.compat.v1.app.flags.DEFINE_string('sweep_spec', '',
+                           """JSON file describing the sweep.""")
+tf.compat.v1.app.flags.DEFINE_string('sweep_dir', './sweeps/sweep',
+                           """Directory of the trials and results.""")
+tf.compat.v1.app.flags.DEFINE_integer('sweep_parallel', 2,
+                            """Number of trials run at the same time, each """
+                            """on its own set of CPUs.""")
+
+TRAINING_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'clock_training.py')
+# Same as clock_training.RUN_SUMMARY_FILENAME (not imported, to keep the
+# training flags out of this process).
+RUN_SUMMARY_FILENAME = 'run_summary.json'
+RESULTS_JSONL = 'results.jsonl'
+RESULTS_CSV = 'results.csv'
+RESULT_COLUMNS = ['trial', 'status', 'precision_hours', 'precision_minutes',
+                  'precision_combined', 'time_error', 'examples_per_sec',
+                  'steps', 'stop_reason', 'seconds', 'cpus']
+
+
+def _sample(value, rng):
+    # One random value of a parameter of a random search.
+    if isinstance(value, list):
+        return value[rng.randint(len(value))]
+    (kind, (low, high)), = value.items()
+    if kind == 'uniform':
+        return float(rng.uniform(low, high))
+    if kind == 'log_uniform':
+        return float(math.exp(rng.uniform(math.log(low), math.log(high))))
+    if kind == 'int_uniform':
+        return int(rng.randint(low, high + 1))
+    raise ValueError('Unknown distribution: {}'.format(kind))
+
+
+def expand_trials(spec):
+    """
+    List the trials of a sweep. The list is the same every time for the same
+    spec, so that a sweep can be resumed.
+
+    :param spec: dict, see the module docstring.
+    :return: list of (trial name, dict of flag name -> value).
+    """
+    params = spec.get('params', {})
+    fixed = spec.get('fixed', {})
+    names = sorted(params)
+    search = spec.get('search', 'grid')
+
+    if search == 'grid':
+        for name in names:
+            if not isinstance(params[name], list):
+                raise ValueError('Grid search needs a list of values for '
+                                 '{}'.format(name))
+        combinations = [dict(zip(names, values)) for values in
+                        itertools.product(*[params[name] for name in names])]
+    elif search == 'random':
+        rng = np.random.RandomState(spec.get('seed', 0))
+        combinations = [dict((name, _sample(params[name], rng))
+                             for name in names)
+                        for _ in range(spec['num_trials'])]
+    else:
+        raise ValueError('Unknown search: {}'.format(search))
+
+    trials = []
+    for (idx, combination) in enumerate(combinations):
+        flags = dict(fixed)
+        flags.update(combination)
+        trials.append(('trial_{:03d}'.format(idx), flags))
+    return trials
+
+
+def cpu_sets(cpus, parallel):
+    """
+    Split CPUs into disjoint sets of the same size.
+
+    :param cpus: Available CPU ids.
+    :param parallel: Number of sets.
+    :return: list of lists of CPU ids.
+    """
+    cpus = sorted(cpus)
+    parallel = max(1, min(parallel, len(cpus)))
+    size = len(cpus) // parallel
+    return [cpus[idx * size:(idx + 1) * size] for idx in range(parallel)]
+
+
+def load_results(path):
+    """
+    Read the results of a sweep.
+
+    :return: dict of trial name -> result (the last one, if a trial was run
+    more than once).
+    """
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                results[result['trial']] = result
+    return results
+
+
+def write_csv(path, results, param_names):
+    # The results table, one row per trial.
+    columns = RESULT_COLUMNS[:1] + param_names + RESULT_COLUMNS[1:]
+    with open(path, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for trial in sorted(results):
+            result = results[trial]
+            row = dict(result.get('params', {}))
+            row.update(result)
+            writer.writerow(['' if row.get(c) is None else row[c]
+                             for c in columns])
+
+
+def trial_result(trial, flags, run_dir, returncode, seconds, cpus):
+    """ Result of a finished trial, from its run summary. """
+    result = dict((c, None) for c in RESULT_COLUMNS)
+    result.update({'trial': trial, 'params': flags, 'seconds': seconds,
+                   'cpus': ' '.join(str(cpu) for cpu in cpus),
+                   'status': 'ok' if returncode == 0 else
+                   'failed ({})'.format(returncode)})
+
+    summary_file = os.path.join(run_dir or '', RUN_SUMMARY_FILENAME)
+    if returncode != 0 or run_dir is None or \
+            not os.path.exists(summary_file):
+        if returncode == 0:
+            result['status'] = 'no summary'
+        return result
+
+    with open(summary_file) as f:
+        summary = json.load(f)
+    metrics = summary['metrics']
+    result.update({
+        'precision_hours': metrics.get('precision/hours'),
+        'precision_minutes': metrics.get('precision/minutes'),
+        'precision_combined': metrics.get('precision/combined'),
+        'time_error': metrics.get('error/combined'),
+        'examples_per_sec': summary['examples_per_sec'],
+        'steps': summary['steps'],
+        'stop_reason': summary.get('stop_reason')})
+    return result
+
+
+def latest_run_dir(train_dir):
+    # The run directory created by clock_training.py in train_dir.
+    if not os.path.isdir(train_dir):
+        return None
+    # (A trial has a single run, which is resumed.)
+    runs = sorted(name for name in os.listdir(train_dir)
+                  if os.path.isdir(os.path.join(train_dir, name)))
+    return os.path.join(train_dir, runs[-1]) if runs else None
+
+
+def _pin_to(cpus):
+    # Runs in the child process, before exec.
+    def pin():
+        os.sched_setaffinity(0, cpus)
+    return pin
+
+
+def launch(trial, flags, sweep_dir, cpus):
+    """
+    Start the training process of a trial, pinned to a set of CPUs.
+
+    Trials always run with --resume, so a trial that was interrupted continues
+    from its latest checkpoint.
+
+    :return: subprocess.Popen.
+    """
+    args = [sys.executable, TRAINING_SCRIPT,
+            '--train_dir={}'.format(os.path.join(sweep_dir, trial)),
+            '--resume',
+            '--intra_op_threads={}'.format(len(cpus)),
+            '--inter_op_threads={}'.format(min(2, len(cpus)))]
+    args += ['--{}={}'.format(name, value)
+             for (name, value) in sorted(flags.items())]
+
+    env = dict(os.environ)
+    env['OMP_NUM_THREADS'] = str(len(cpus))
+
+    log = open(os.path.join(sweep_dir, trial + '.log'), 'a')
+    process = subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT,
+                               env=env, preexec_fn=_pin_to(cpus))
+    log.close()
+    return process
+
+
+def run_sweep(spec, sweep_dir, parallel):
+    """
+    Run the trials of a sweep that have not completed yet.
+
+    :return: dict of trial name -> result.
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        raise OSError('CPU pinning (os.sched_setaffinity) needs Linux.')
+    if not os.path.isdir(sweep_dir):
+        os.makedirs(sweep_dir)
+    with open(os.path.join(sweep_dir, 'spec.json'), 'w') as f:
+        json.dump(spec, f, indent=1, sort_keys=True)
+
+    trials = expand_trials(spec)
+    param_names = sorted(spec.get('params', {}))
+    results_path = os.path.join(sweep_dir, RESULTS_JSONL)
+    results = load_results(results_path)
+
+    todo = []
+    for (trial, flags) in trials:
+        done = results.get(trial)
+        if done is not None and done['status'] == 'ok':
+            if done['params'] != flags:
+                raise ValueError('{} in {} was run with different flags; use '
+                                 'a new sweep_dir for a new spec.'.format(
+                                     trial, sweep_dir))
+            continue
+        todo.append((trial, flags))
+    print('%s: %d trials, %d completed, %d to run.' % (
+        datetime.now(), len(trials), len(trials) - len(todo), len(todo)))
+
+    free = cpu_sets(os.sched_getaffinity(0), parallel)
+    running = []  # (trial, flags, process, cpus, start time)
+    while todo or running:
+        while todo and free:
+            (trial, flags) = todo.pop(0)
+            cpus = free.pop(0)
+            print('%s: starting %s on CPUs %s: %s' % (datetime.now(), trial,
+                                                      cpus, flags))
+            running.append((trial, flags, launch(trial, flags, sweep_dir,
+                                                 cpus), cpus, time.time()))
+
+        time.sleep(1)
+        for item in list(running):
+            (trial, flags, process, cpus, start_time) = item
+            if process.poll() is None:
+                continue
+            running.remove(item)
+            free.append(cpus)
+
+            result = trial_result(
+                trial, flags, latest_run_dir(os.path.join(sweep_dir, trial)),
+                process.returncode, time.time() - start_time, cpus)
+            results[trial] = result
+            with open(results_path, 'a') as f:
+                f.write(json.dumps(result, sort_keys=True) + '\n')
+            write_csv(os.path.join(sweep_dir, RESULTS_CSV), results,
+                      param_names)
+            print('%s: %s %s: time error %s, %s examples/sec' % (
+                datetime.now(), trial, result['status'],
+                result['time_error'], result['examples_per_sec']))
+
+    return results
+
+
+def main(argv=None):  # pylint: disable=unused-argument
+
+    if not FLAGS.sweep_spec:
+        raise ValueError('Set --sweep_spec.')
+    with open(FLAGS.sweep_spec) as f:
+        spec = json.load(f)
+
+    results = run_sweep(spec, FLAGS.sweep_dir, FLAGS.sweep_parallel)
+
+    print('==================')
+    ok = [r for r in results.values() if r['time_error'] is not None]
+    for result in sorted(ok, key=lambda r: r['time_error']):
+        print('  {} time error {:.2f}m, precision {:.3f}, {:.1f} examples/sec'
+              '  {}'.format(result['trial'], result['time_error'],
+                            result['precision_combined'],
+                            result['examples_per_sec'] or 0,
+                            result['params']))
+    print('Results in {}'.format(os.path.join(FLAGS.sweep_dir, RESULTS_CSV)))
+
+
+if __name__ == '__main__':
+    tf.compat.v1.app.run()
@@ -0,0 +1,13 @@
+""" pytest setup: put the clock_reading directory on the path.
+
+The modules import each other by their flat names (import clock_model), as
+the scripts run from that directory do, so the tests import them the same
+way: importing a module under two names (clock_model and
+clock_reading.clock_model) would define its flags a second time.
+"""
+import os
+import sys
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PACKAGE_DIR not in sys.path:
+    sys.path.insert(0, PACKAGE_DIR)
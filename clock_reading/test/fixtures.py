@@ -0,0 +1,58 @@
+""" Small data sets of clock images for the tests. """
+import os
+
+import numpy as np
+import tensorflow as tf
+import clock_data
+
+
+def write_clocks(directory, num_images=24, filename='clocks_all.txt'):
+    """
+    Write images (noise with a bar for the hour and the minute) and their
+    index file, in the format of clock_data.
+
+    :return: Path of the index file.
+    """
+    rng = np.random.RandomState(0)
+    with tf.Graph().as_default():
+        pixels = tf.compat.v1.placeholder(tf.uint8, [None, None, None])
+        encode = tf.io.encode_png(pixels)
+        with tf.compat.v1.Session() as sess:
+            lines = []
+            for idx in range(num_images):
+                hour, minute = idx % 12, (7 * idx) % 60
+                image = rng.randint(0, 30, [clock_data.image_size1,
+                                            clock_data.image_size2,
+                                            clock_data.image_channels])
+                image[5 * hour:5 * hour + 5, :minute + 1] = 255
+                path = os.path.join(directory, 'clock-{:02d}.{:02d}.png'
+                                    .format(hour, minute))
+                with open(path, 'wb') as f:
+                    f.write(sess.run(encode,
+                                     {pixels: image.astype(np.uint8)}))
+                lines.append('{}\t{}\t{}\n'.format(path, hour, minute))
+
+    index_path = os.path.join(directory, filename)
+    with open(index_path, 'w') as f:
+        f.writelines(lines)
+    return index_path
+
+
+class FlagValues(object):
+    """ Set flags for a test, and restore their values afterwards. """
+
+    def __init__(self, flags):
+        if not flags.is_parsed():
+            flags.mark_as_parsed()
+        self.flags = flags
+        self.previous = {}
+
+    def set(self, **values):
+        for (name, value) in values.items():
+            self.previous.setdefault(name, getattr(self.flags, name))
+            setattr(self.flags, name, value)
+
+    def restore(self):
+        for (name, value) in self.previous.items():
+            setattr(self.flags, name, value)
+        self.previous = {}
@@ -0,0 +1,78 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+import clock_model
+
+FLAGS = clock_model.FLAGS
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        if not FLAGS.is_parsed():
+            FLAGS.mark_as_parsed()
+        self.previous = (FLAGS.accumulation_steps, FLAGS.optimizer,
+                         FLAGS.lr_schedule)
+        FLAGS.optimizer = 'sgd'
+        FLAGS.lr_schedule = 'cosine'
+
+    def tearDown(self):
+        (FLAGS.accumulation_steps, FLAGS.optimizer,
+         FLAGS.lr_schedule) = self.previous
+
+    def _train_step(self, batches, accumulation_steps):
+        # Weights and global step after one (effective) step on the batches,
+        # with the tiny multi-task model and its loss.
+        FLAGS.accumulation_steps = accumulation_steps
+        with tf.Graph().as_default():
+            # (The same initial weights in both graphs.)
+            tf.compat.v1.set_random_seed(0)
+            global_step = tf.Variable(0, trainable=False)
+            # (The model needs a static batch size.)
+            size = len(batches[0][0])
+            images = tf.compat.v1.placeholder(tf.float32, [size, 66, 63, 1])
+            hours = tf.compat.v1.placeholder(tf.int32, [size])
+            minutes = tf.compat.v1.placeholder(tf.int32, [size])
+            logits_h, logits_m = clock_model.inference_multitask(
+                images, arch='tiny', is_training=True)
+            loss = clock_model.loss_multitask(logits_h, hours,
+                                              logits_m, minutes)
+            train_op = clock_model.train(loss, global_step, total_steps=100)
+            accumulate_op = clock_model.accumulate_gradients_op()
+            weights = [var for var in tf.compat.v1.trainable_variables()
+                       if var.op.name == 'local3/weights'][0]
+
+            with tf.compat.v1.Session() as sess:
+                sess.run([tf.compat.v1.global_variables_initializer(),
+                          tf.compat.v1.local_variables_initializer()])
+                initial = sess.run(weights)
+                for batch in batches:
+                    feed = dict(zip((images, hours, minutes), batch))
+                    sess.run(train_op if batch is batches[-1]
+                             else accumulate_op, feed)
+                return initial, sess.run(weights), sess.run(global_step)
+
+    def test_matches_large_batch(self):
+        rng = np.random.RandomState(0)
+        batch = (rng.uniform(-1, 1, [8, 66, 63, 1]),
+                 rng.randint(0, 12, 8), rng.randint(0, 60, 8))
+
+        initial, weights, step = self._train_step([batch], 1)
+        micro_batches = [tuple(values[idx:idx + 2] for values in batch)
+                         for idx in range(0, 8, 2)]
+        _, accumulated, accumulated_step = self._train_step(micro_batches, 4)
+
+        self.assertEqual(1, step)
+        self.assertEqual(1, accumulated_step)
+        np.testing.assert_allclose(weights, accumulated, rtol=1e-4,
+                                   atol=1e-6)
+        self.assertFalse(np.allclose(weights, initial))
+
+    def test_no_accumulation_op_by_default(self):
+        with tf.Graph().as_default():
+            self.assertIsNone(clock_model.accumulate_gradients_op())
+
+
+if __name__ == '__main__':
+    unittest.main()
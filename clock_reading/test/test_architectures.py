@@ -0,0 +1,40 @@
+import unittest
+import clock_architectures
+
+
+class TestCase(unittest.TestCase):
+
+    def test_baseline_params(self):
+        stats = clock_architectures.layer_stats('baseline', 66, 63)
+        names = [s[0] for s in stats]
+        self.assertEqual(['conv1', 'conv2', 'local3', 'local4',
+                          'softmax_linear_hours', 'softmax_linear_minutes'],
+                         names)
+
+        params = dict((s[0], s[1]) for s in stats)
+        self.assertEqual(5 * 5 * 1 * 64 + 64, params['conv1'])
+        self.assertEqual(5 * 5 * 64 * 64 + 64, params['conv2'])
+        # Two stride-2 pools: 66x63 -> 33x32 -> 17x16.
+        self.assertEqual(17 * 16 * 64 * 384 + 384, params['local3'])
+
+    def test_separable_is_smaller(self):
+        config = clock_architectures.get_architecture('baseline')
+        config['separable'] = True
+        dense = clock_architectures.layer_stats('baseline', 66, 63)
+        separable = clock_architectures.layer_stats(config, 66, 63)
+        self.assertLess(separable[1][1], dense[1][1])
+        self.assertLess(separable[1][2], dense[1][2])
+
+    def test_unknown_architecture(self):
+        with self.assertRaises(ValueError):
+            clock_architectures.get_architecture('does_not_exist')
+
+    def test_registry_not_modified(self):
+        config = clock_architectures.get_architecture('baseline')
+        config['fc'].append(10)
+        self.assertEqual([384, 192],
+                         clock_architectures.ARCHITECTURES['baseline']['fc'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import benchmark_suite
+import clock_benchmarks
+
+from .fixtures import FlagValues
+
+
+class TestCase(unittest.TestCase):
+
+    def _run(self, **values):
+        # Results of a run, with the given values.
+        results = {'latency': clock_benchmarks.latency_result([1.0]),
+                   'throughput': clock_benchmarks.throughput_result(1, 1.0)}
+        for (name, value) in values.items():
+            results[name]['value'] = value
+        return {'host': {'hostname': 'a'}, 'results': results}
+
+    def test_latency_result(self):
+        result = clock_benchmarks.latency_result([0.1] * 98 + [1.0, 2.0], 10)
+        self.assertAlmostEqual(0.1, result['p50'])
+        self.assertGreater(result['p99'], 0.9)
+        self.assertAlmostEqual(100.0, result['items_per_sec'])
+        self.assertFalse(result['higher_is_better'])
+
+    def test_compare_flags_regressions(self):
+        baseline = self._run(latency=1.0, throughput=100.0)
+        rows = clock_benchmarks.compare(
+            baseline, self._run(latency=1.05, throughput=80.0))
+        self.assertEqual([('latency', False), ('throughput', True)],
+                         [(row[0], row[-1]) for row in rows])
+        self.assertAlmostEqual(-0.2, rows[1][3])
+
+        # Faster is better, however large the change.
+        rows = clock_benchmarks.compare(
+            baseline, self._run(latency=0.5, throughput=200.0))
+        self.assertEqual([0.5, 1.0], [row[3] for row in rows])
+        self.assertFalse(any(row[-1] for row in rows))
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'results.json')
+        results = self._run()['results']
+        clock_benchmarks.save_results(path, results)
+
+        loaded = clock_benchmarks.load_results(path)
+        self.assertEqual(results, loaded['results'])
+        self.assertIn('cpu_count', loaded['host'])
+        self.assertEqual([], clock_benchmarks.host_differences(loaded,
+                                                               loaded))
+
+    def test_failures(self):
+        current = self._run(latency=1.0)
+        current['results']['throughput'] = clock_benchmarks.failed_result(
+            IOError('No such file'))
+        self.assertEqual([('throughput', 'OSError: No such file')],
+                         clock_benchmarks.failures(current))
+        # The failed benchmark is not compared.
+        self.assertEqual(['latency'], [row[0] for row in
+                                       clock_benchmarks.compare(
+                                           self._run(), current)])
+
+    def test_run_keeps_results_of_other_cases(self):
+        flags = FlagValues(benchmark_suite.FLAGS)
+        self.addCleanup(flags.restore)
+        flags.set(architecture='tiny', batch_size=4,
+                  benchmark_suite_file='missing.txt',
+                  benchmark_suite_batch_sizes='4', benchmark_suite_iters=2,
+                  benchmark_suite_warmup=1, benchmark_suite_rows=1000)
+
+        results = benchmark_suite.run(['train_step', 'eval_pass',
+                                       'time_errors'])
+        self.assertEqual(['eval_pass', 'time_errors', 'train_step_4'],
+                         sorted(results))
+        self.assertIn('error', results['eval_pass'])
+        for name in ('time_errors', 'train_step_4'):
+            self.assertEqual(2, results[name]['runs'])
+            self.assertGreater(results[name]['value'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import clock_catalog
+import clock_evaluation
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.catalog = clock_catalog.Catalog(self.base_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def _checkpoint(self, run, step, metric=None, created=None):
+        run_dir = os.path.join(self.base_dir, run)
+        if not os.path.isdir(run_dir):
+            os.makedirs(run_dir)
+        prefix = os.path.join(run_dir, 'model.ckpt-{}'.format(step))
+        for (ext, size) in (('.index', 10), ('.data-00000-of-00001', 90)):
+            with open(prefix + ext, 'w') as f:
+                f.write('x' * size)
+        self.catalog.add_checkpoint(prefix, metric=metric, created=created)
+        return prefix
+
+    def test_latest_run_across_days(self):
+        # A run from before midnight, then one after: the names don't sort.
+        self._checkpoint('run_23.59.00', 10, created=1000.0)
+        self._checkpoint('run_00.01.00', 10, created=2000.0)
+        latest = os.path.join(self.base_dir, 'run_00.01.00')
+        self.assertEqual(latest, self.catalog.latest_run())
+        self.assertEqual(latest, clock_evaluation.find_model_dir(
+            self.base_dir))
+
+    def test_checkpoints(self):
+        self._checkpoint('run_a', 10, metric=5.0)
+        path = self._checkpoint('run_a', 20, metric=3.0)
+        self._checkpoint('run_a', 30, metric=4.0)
+        run_dir = os.path.join(self.base_dir, 'run_a')
+
+        rows = self.catalog.checkpoints(run_dir)
+        self.assertEqual([10, 20, 30], [row['step'] for row in rows])
+        self.assertEqual(100, rows[0]['size_bytes'])
+        self.assertEqual(30, self.catalog.latest_checkpoint()['step'])
+        self.assertEqual(path, self.catalog.best_checkpoint()['path'])
+
+        # Deleted by the retention policy.
+        self.catalog.remove_checkpoint(path)
+        self.assertEqual(30, self.catalog.best_checkpoint()['step'])
+        self.assertEqual([10, 30], [row['step'] for row in
+                                    self.catalog.checkpoints(run_dir)])
+
+    def test_evaluations(self):
+        first = self._checkpoint('run_a', 10)
+        second = self._checkpoint('run_a', 20)
+        run_dir = os.path.join(self.base_dir, 'run_a')
+        self.catalog.add_evaluation(first, 'clocks_test',
+                                    {'error/combined': 4.0})
+        self.catalog.add_evaluation(second, 'clocks_test',
+                                    {'error/combined': 6.0})
+        self.catalog.add_evaluation(second, 'clocks_all',
+                                    {'error/combined': 1.0})
+
+        self.assertEqual({10, 20}, self.catalog.evaluated_steps(
+            run_dir, 'clocks_test'))
+        self.assertTrue(self.catalog.is_evaluated(second, 'clocks_all'))
+        self.assertFalse(self.catalog.is_evaluated(first, 'clocks_all'))
+        best = self.catalog.best_checkpoint('clocks_test')
+        self.assertEqual((10, 4.0), (best['step'], best['time_error']))
+        self.assertEqual({'error/combined': 6.0}, self.catalog.evaluations(
+            run_dir, 'clocks_test')[1]['metrics'])
+
+    def test_rebuild(self):
+        prefix = self._checkpoint('run_a', 10)
+        with open(os.path.join(os.path.dirname(prefix), 'checkpoint'),
+                  'w') as f:
+            f.write('model_checkpoint_path: "model.ckpt-10"\n'
+                    'all_model_checkpoint_paths: "model.ckpt-10"\n')
+        os.remove(self.catalog.path)
+
+        catalog = clock_catalog.Catalog(self.base_dir)
+        self.assertEqual(1, catalog.rebuild())
+        self.assertEqual(prefix, catalog.latest_checkpoint()['path'])
+
+
+if __name__ == '__main__':
+    unittest.main()
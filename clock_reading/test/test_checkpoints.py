@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import tensorflow as tf
+import clock_catalog
+import numpy as np
+import clock_checkpoints
+from clock_checkpoints import AsyncCheckpointer, RetentionPolicy
+
+
+def _checkpoints(metrics, hours_apart=0.5):
+    return [{'step': 10 * idx, 'time': idx * hours_apart * 3600.0,
+             'metric': metric} for (idx, metric) in enumerate(metrics)]
+
+
+class TestCase(unittest.TestCase):
+
+    def test_keep_last(self):
+        policy = RetentionPolicy(keep_last=2, keep_best=0)
+        keep = policy.select(_checkpoints([None] * 5))
+        self.assertEqual({30, 40}, keep)
+
+    def test_keep_best(self):
+        policy = RetentionPolicy(keep_last=1, keep_best=2)
+        keep = policy.select(_checkpoints([9.0, 2.0, None, 3.0, 5.0]))
+        self.assertEqual({10, 30, 40}, keep)
+
+    def test_keep_best_prefers_latest_on_ties(self):
+        policy = RetentionPolicy(keep_last=0, keep_best=1)
+        keep = policy.select(_checkpoints([2.0, 2.0, 2.0, None]))
+        self.assertEqual({20, 30}, keep)
+
+    def test_keeps_newest(self):
+        # No metric yet: keep_best keeps nothing, but the newest is kept.
+        policy = RetentionPolicy(keep_last=0, keep_best=2)
+        self.assertEqual({20}, policy.select(_checkpoints([None] * 3)))
+        self.assertEqual(set(), policy.select([]))
+        self.assertRaises(ValueError, RetentionPolicy, keep_last=0,
+                          keep_best=0)
+
+    def test_keep_every_n_hours(self):
+        # Checkpoints every half hour, keep one every hour.
+        policy = RetentionPolicy(keep_last=0, keep_best=0,
+                                 keep_every_n_hours=1.0)
+        keep = policy.select(_checkpoints([None] * 5))
+        self.assertEqual({0, 20, 40}, keep)
+
+    def test_set_metric(self):
+        save_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, save_dir)
+        catalog = clock_catalog.Catalog(save_dir)
+        with tf.Graph().as_default():
+            var = tf.compat.v1.get_variable('weights', [2])
+            checkpointer = AsyncCheckpointer(
+                save_dir, [var], RetentionPolicy(keep_last=1, keep_best=1),
+                async_writes=False, catalog=catalog)
+            with tf.compat.v1.Session() as sess:
+                sess.run(tf.compat.v1.global_variables_initializer())
+                for step in range(3):
+                    checkpointer.save(sess, step)
+                    # The evaluation of the weights of a step ends later.
+                    if step == 1:
+                        checkpointer.set_metric(step, 5.0)
+                self.assertEqual([1, 2], [c['step'] for c in
+                                          checkpointer.checkpoints])
+
+                checkpointer.set_metric(2, 3.0)
+                self.assertEqual([2], [c['step'] for c in
+                                       checkpointer.checkpoints])
+                # Before the save of the step.
+                checkpointer.set_metric(3, 1.0)
+                checkpointer.save(sess, 3)
+            checkpointer.close()
+
+        # (The best one and the last one.)
+        self.assertEqual([(3, 1.0)], [(c['step'], c['metric'])
+                                      for c in checkpointer.checkpoints])
+        self.assertFalse(os.path.exists(os.path.join(
+            save_dir, 'model.ckpt-2.index')))
+        best = catalog.best_checkpoint(run_dir=save_dir)
+        self.assertEqual((3, 1.0), (best['step'], best['time_error']))
+
+    def test_resolve_checkpoint(self):
+        run_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, run_dir)
+        self.assertIsNone(clock_checkpoints.resolve_checkpoint(run_dir))
+        with tf.Graph().as_default():
+            tf.compat.v1.get_variable('weights', [2])
+            saver = tf.compat.v1.train.Saver()
+            with tf.compat.v1.Session() as sess:
+                sess.run(tf.compat.v1.global_variables_initializer())
+                for step in (10, 20):
+                    saver.save(sess, os.path.join(run_dir, 'model.ckpt'),
+                               global_step=step)
+
+        latest = os.path.join(run_dir, 'model.ckpt-20')
+        self.assertEqual(latest, clock_checkpoints.resolve_checkpoint(run_dir))
+        older = os.path.join(run_dir, 'model.ckpt-10')
+        self.assertEqual(older, clock_checkpoints.resolve_checkpoint(older))
+        self.assertIsNone(clock_checkpoints.resolve_checkpoint(
+            os.path.join(run_dir, 'model.ckpt-30')))
+
+    def test_warm_start_variables(self):
+        run_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, run_dir)
+        with tf.Graph().as_default():
+            tf.compat.v1.get_variable('conv1/weights', [3, 3, 1, 8])
+            tf.compat.v1.get_variable('local3/weights', [10, 4])
+            with tf.compat.v1.Session() as sess:
+                sess.run(tf.compat.v1.global_variables_initializer())
+                path = tf.compat.v1.train.Saver().save(
+                    sess, os.path.join(run_dir, 'model.ckpt'))
+
+        with tf.Graph().as_default():
+            conv1 = tf.compat.v1.get_variable('conv1/weights', [3, 3, 1, 8])
+            local3 = tf.compat.v1.get_variable('local3/weights', [10, 5])
+            conv2 = tf.compat.v1.get_variable('conv2/weights', [3, 3, 8, 8])
+            matched, skipped = clock_checkpoints.warm_start_variables(
+                path, [conv1, local3, conv2])
+            self.assertEqual({'conv1/weights': conv1}, matched)
+            self.assertEqual([local3, conv2], skipped)
+
+            with tf.compat.v1.Session() as sess:
+                sess.run(tf.compat.v1.global_variables_initializer())
+                tf.compat.v1.train.Saver(matched).restore(sess, path)
+                np.testing.assert_array_equal(
+                    tf.train.load_variable(path, 'conv1/weights'),
+                    sess.run(conv1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+import clock_distillation
+
+
+class TestCase(unittest.TestCase):
+
+    def test_loss_is_zero_for_the_same_logits(self):
+        with tf.Graph().as_default():
+            logits = (tf.constant([[1.0, 2.0, 0.5]]),
+                      tf.constant([[0.1, -1.0]]))
+            loss = clock_distillation.distillation_loss(logits, logits, 3.0)
+            with tf.compat.v1.Session() as sess:
+                self.assertAlmostEqual(0.0, sess.run(loss), places=6)
+
+    def test_loss_scaled_by_temperature(self):
+        student = np.array([[0.0, 0.0]], dtype=np.float32)
+        teacher = np.array([[2.0, 0.0]], dtype=np.float32)
+        with tf.Graph().as_default():
+            loss = clock_distillation.distillation_loss(
+                (tf.constant(student), tf.constant(student)),
+                (tf.constant(teacher), tf.constant(teacher)), 2.0)
+            with tf.compat.v1.Session() as sess:
+                value = sess.run(loss)
+
+        # Softened teacher distribution, and KL to the uniform student.
+        p = np.exp(teacher[0] / 2.0) / np.sum(np.exp(teacher[0] / 2.0))
+        kl = np.sum(p * np.log(p / 0.5))
+        self.assertAlmostEqual(2 * 4 * kl, value, places=5)
+
+    def test_teacher_is_frozen(self):
+        with tf.Graph().as_default():
+            images = tf.zeros([2, 66, 63, 1])
+            clock_distillation.build_teacher(images, 'tiny')
+
+            self.assertEqual([], tf.compat.v1.global_variables())
+            self.assertEqual([], tf.compat.v1.trainable_variables())
+            self.assertEqual([], tf.compat.v1.get_collection('losses'))
+            teacher_variables = tf.compat.v1.get_collection(
+                clock_distillation.TEACHER_VARIABLES)
+            self.assertTrue(teacher_variables)
+            self.assertEqual(teacher_variables,
+                             tf.compat.v1.local_variables())
+
+
+if __name__ == '__main__':
+    unittest.main()
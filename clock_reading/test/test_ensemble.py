@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import tensorflow as tf
+import clock_ensemble
+import clock_model
+
+
+def _softmax(logits):
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        if not clock_model.FLAGS.is_parsed():
+            clock_model.FLAGS.mark_as_parsed()
+        self.checkpoint_dir = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        self.images = rng.uniform(-1, 1, [4, 66, 63, 1]).astype(np.float32)
+        self.labels = (np.array([1, 2, 3, 4]), np.array([5, 6, 7, 8]))
+
+    def tearDown(self):
+        shutil.rmtree(self.checkpoint_dir)
+
+    def _checkpoint(self, seed):
+        # A randomly initialized tiny model, built without a variable scope.
+        with tf.Graph().as_default():
+            tf.compat.v1.set_random_seed(seed)
+            logits = clock_model.inference_multitask(
+                tf.constant(self.images), arch='tiny')
+            predictions = clock_model.time_predictions(logits, self.labels)
+            with tf.compat.v1.Session() as sess:
+                sess.run(tf.compat.v1.global_variables_initializer())
+                path = tf.compat.v1.train.Saver().save(sess, os.path.join(
+                    self.checkpoint_dir, 'model.ckpt-{}'.format(seed)))
+                predicted, member_logits = sess.run([predictions[0], logits])
+                return path, predicted, member_logits
+
+    def test_members_match_their_checkpoints(self):
+        first, expected_first, first_logits = self._checkpoint(1)
+        second, expected_second, second_logits = self._checkpoint(2)
+
+        with tf.Graph().as_default():
+            member_predictions, ensemble_predictions = \
+                clock_ensemble.build_ensemble(tf.constant(self.images),
+                                              self.labels, ['tiny'] * 3)
+            with tf.compat.v1.Session() as sess:
+                clock_ensemble.restore_members(sess, [first, second, first])
+                members, ensemble = sess.run([member_predictions,
+                                              ensemble_predictions])
+
+        np.testing.assert_array_equal(expected_first, members[0][0])
+        np.testing.assert_array_equal(expected_second, members[1][0])
+        np.testing.assert_array_equal(expected_first, members[2][0])
+        np.testing.assert_array_equal(np.stack(self.labels, axis=1),
+                                      ensemble[1])
+
+        # The classes of the mean probabilities of the members.
+        expected_ensemble = np.stack([
+            np.argmax(sum(_softmax(logits[task]) for logits in
+                          (first_logits, second_logits, first_logits)) / 3,
+                      axis=1)
+            for task in (0, 1)], axis=1)
+        np.testing.assert_array_equal(expected_ensemble, ensemble[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
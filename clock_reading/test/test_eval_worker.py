@@ -0,0 +1,38 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import clock_eval_worker
+import clock_model
+
+from .fixtures import write_clocks
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        if not clock_model.FLAGS.is_parsed():
+            clock_model.FLAGS.mark_as_parsed()
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        self.worker = clock_eval_worker.EvalWorker(
+            mock.Mock(), write_clocks(data_dir), batch_size=4, arch='tiny')
+
+    def test_stop_after_the_worker_failed(self):
+        self.worker.evaluate = mock.Mock(side_effect=ValueError('failed'))
+        self.worker.start()
+        self.worker.submit(0, {})
+        self.worker.join(timeout=60)
+        self.assertFalse(self.worker.is_alive())
+
+        # The final snapshot is never taken from the queue: stop() doesn't
+        # wait for it, and raises the error of the worker.
+        self.worker.submit(1, {})
+        with self.assertRaisesRegex(ValueError, 'failed'):
+            self.worker.stop(drop_pending=False)
+        self.assertIsNone(self.worker.latest)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import tensorflow as tf
+import clock_catalog
+import clock_evaluation
+import clock_training
+
+from .fixtures import FlagValues, write_clocks
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        write_clocks(self.data_dir, filename='clocks_all.txt')
+        write_clocks(self.data_dir, filename='clocks_test.txt')
+
+        # The training and the evaluation read their index files from the
+        # working directory.
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.data_dir)
+
+        self.train_dir = os.path.join(self.data_dir, 'tf_data')
+        self.flags = FlagValues(clock_evaluation.FLAGS)
+        self.addCleanup(self.flags.restore)
+        self.flags.set(architecture='tiny', batch_size=4, max_steps=3,
+                       background_eval_steps=0, checkpoint_dir=self.train_dir)
+
+    def test_run_once(self):
+        catalog = clock_catalog.Catalog(self.train_dir)
+        run_dir = os.path.join(self.train_dir, 'run_a')
+        os.makedirs(run_dir)
+        catalog.add_run(run_dir)
+        clock_training.train(run_dir, catalog=catalog)
+
+        self.flags.set(run_once=True)
+        clock_evaluation.evaluate(os.path.join(self.data_dir, 'eval'))
+
+        evaluations = catalog.evaluations(
+            run_dir, clock_catalog.dataset_name('clocks_test.txt'))
+        self.assertEqual([2], [row['step'] for row in evaluations])
+        metrics = evaluations[0]['metrics']
+        self.assertIn('precision/hours', metrics)
+        self.assertLessEqual(0.0, metrics['error/combined'])
+        self.assertLessEqual(metrics['error/combined'], 360.0)
+
+        # A checkpoint of another architecture is not skipped as missing.
+        self.flags.set(architecture='narrow')
+        with self.assertRaises(tf.errors.OpError):
+            clock_evaluation.evaluate(os.path.join(self.data_dir, 'eval'))
+
+    def _run_with_checkpoints(self, catalog, name, created, steps):
+        run_dir = os.path.join(self.train_dir, name)
+        os.makedirs(run_dir)
+        catalog.add_run(run_dir, created=created)
+        for step in steps:
+            prefix = os.path.join(run_dir, 'model.ckpt-{}'.format(step))
+            for ext in ('.data-00000-of-00001', '.index'):
+                with open(prefix + ext, 'w') as f:
+                    f.write('x')
+        return run_dir
+
+    def test_watch_newer_run(self):
+        self.flags.set(eval_interval_secs=0, eval_inotify=False)
+        catalog = clock_catalog.Catalog(self.train_dir)
+        dataset = clock_catalog.dataset_name('clocks_test.txt')
+        run_a = self._run_with_checkpoints(catalog, 'run_a', 1.0, [1])
+
+        watcher = clock_evaluation.watch_run(
+            None, clock_evaluation.find_model_dir(self.train_dir), catalog,
+            dataset)
+        self.addCleanup(watcher.close)
+        self.assertEqual(run_a, watcher.checkpoint_dir)
+        self.assertEqual(1, watcher.next_checkpoint(timeout=0.1)[0])
+        self.assertIs(watcher, clock_evaluation.watch_run(
+            watcher, run_a, catalog, dataset))
+
+        # A newer run is watched instead, without its evaluated steps.
+        run_b = self._run_with_checkpoints(catalog, 'run_b', 2.0, [2, 3])
+        catalog.add_evaluation(os.path.join(run_b, 'model.ckpt-2'), dataset,
+                               {'error/combined': 5.0})
+        watcher = clock_evaluation.watch_run(
+            watcher, clock_evaluation.find_model_dir(self.train_dir),
+            catalog, dataset)
+        self.addCleanup(watcher.close)
+        self.assertEqual(run_b, watcher.checkpoint_dir)
+        self.assertEqual(3, watcher.next_checkpoint(timeout=0.1)[0])
+        self.assertIsNone(watcher.next_checkpoint(timeout=0.1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import clock_data
+import clock_input_tuning
+
+from .fixtures import FlagValues, write_clocks
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.flags = FlagValues(clock_input_tuning.FLAGS)
+        self.addCleanup(self.flags.restore)
+
+    def test_queue_capacity(self):
+        self.assertEqual(10 + 2 * 32, clock_data.queue_capacity(
+            32, min_after_dequeue=10, prefetch_batches=2))
+        self.assertEqual(32, clock_data.queue_capacity(
+            32, min_after_dequeue=0, prefetch_batches=0))
+
+    def fake_measure(self, waits):
+        # Replace measure() with fake measurements: waits maps (threads,
+        # prefetch) to the input wait fraction.
+        def measure(filename, batch_size, num_threads, prefetch_batches,
+                    num_steps):
+            return {'threads': num_threads,
+                    'prefetch_batches': prefetch_batches,
+                    'wait_fraction': waits[num_threads, prefetch_batches],
+                    'queue_fill': 0.5, 'examples_per_sec': 100.0}
+
+        original = clock_input_tuning.measure
+        clock_input_tuning.measure = measure
+        self.addCleanup(setattr, clock_input_tuning, 'measure', original)
+
+    def tune(self, waits):
+        self.fake_measure(waits)
+        return clock_input_tuning.tune('clocks.txt', 32, num_steps=8,
+                                       target_wait=0.05, max_threads=4)
+
+    def test_tune(self):
+        # 2 threads help, 4 don't (out of cores); then prefetching helps.
+        best, results = self.tune({(1, 1): 0.5, (2, 1): 0.3, (4, 1): 0.28,
+                                   (2, 2): 0.1, (2, 4): 0.01})
+        self.assertEqual((2, 4), (best['threads'], best['prefetch_batches']))
+        self.assertEqual([(1, 1), (2, 1), (4, 1), (2, 2), (2, 4)],
+                         [(r['threads'], r['prefetch_batches'])
+                          for r in results])
+
+    def test_tune_no_wait(self):
+        best, results = self.tune({(1, 1): 0.01})
+        self.assertEqual((1, 1), (best['threads'], best['prefetch_batches']))
+        self.assertEqual(1, len(results))
+
+    def test_autotune_hard_example_mining(self):
+        # The sampled records are batched by a single thread: only the
+        # prefetched batches are tuned.
+        run_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, run_dir)
+        self.fake_measure({(1, 1): 0.5, (1, 2): 0.1, (1, 4): 0.01})
+        self.flags.set(hard_example_mining=True, batch_size=32,
+                       input_autotune_max_threads=4)
+
+        best = clock_input_tuning.autotune(run_dir, 'clocks.txt')
+        self.assertEqual((1, 4), (best['threads'], best['prefetch_batches']))
+        self.assertEqual((1, 4), (clock_input_tuning.FLAGS.input_threads,
+                                  clock_input_tuning.FLAGS
+                                  .input_prefetch_batches))
+        with open(os.path.join(
+                run_dir, clock_input_tuning.INPUT_SETTINGS_FILENAME)) as f:
+            self.assertEqual(3, len(json.load(f)['measurements']))
+
+    def test_measure(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        index_path = write_clocks(data_dir)
+        self.flags.set(architecture='tiny', input_threads=1,
+                       input_prefetch_batches=2)
+
+        for hard_example_mining in (False, True):
+            self.flags.set(hard_example_mining=hard_example_mining)
+            result = clock_input_tuning.measure(index_path, 4, num_threads=2,
+                                                prefetch_batches=3,
+                                                num_steps=4)
+            self.assertEqual((2, 3), (result['threads'],
+                                      result['prefetch_batches']))
+            self.assertEqual(clock_data.queue_capacity(
+                4, prefetch_batches=3,
+                min_after_dequeue=0 if hard_example_mining else None),
+                result['capacity'])
+            self.assertLessEqual(0.0, result['wait_fraction'])
+            self.assertLessEqual(result['wait_fraction'], 1.0)
+            self.assertLessEqual(0.0, result['queue_fill'])
+            self.assertLessEqual(result['queue_fill'], 1.0)
+            self.assertGreater(result['examples_per_sec'], 0)
+            # The flags of the training are unchanged.
+            self.assertEqual((1, 2), (clock_input_tuning.FLAGS.input_threads,
+                                      clock_input_tuning.FLAGS
+                                      .input_prefetch_batches))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+
+import tensorflow as tf
+import clock_memory
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        # The profiler starts tracemalloc, which would slow down other tests.
+        self.addCleanup(tracemalloc.stop)
+
+    def test_phases(self):
+        memory = clock_memory.MemoryProfiler(True, top=5)
+        memory.start_phase('build')
+        held = [bytearray(1024) for _ in range(4096)]  # 4 MB.
+        memory.start_phase('run')
+        with tf.Graph().as_default():
+            # (Random inputs, which are not folded into a constant.)
+            inputs = tf.random.normal([256, 512])
+            total = tf.reduce_sum(tf.matmul(inputs, inputs, transpose_b=True))
+            with tf.compat.v1.Session() as sess:
+                for _ in range(3):
+                    memory.run(sess, total, 'run')
+        memory.write_report(self.output_dir)
+        del held
+
+        with open(os.path.join(self.output_dir,
+                               clock_memory.REPORT_FILENAME)) as f:
+            report = json.load(f)
+        self.assertEqual(['build', 'run'], sorted(report))
+        build, run = report['build'], report['run']
+        self.assertGreater(build['python_peak_mb'], 4.0)
+        self.assertIn(__file__, build['python_growth'][0]['where'])
+        self.assertIsNone(build['tf_peak_mb'])
+        self.assertGreater(run['peak_rss_mb'], 0.0)
+        # Only the first run is traced: the matmul output is 256 KB.
+        self.assertGreater(run['tf_peak_mb'], 0.2)
+        self.assertIn('MatMul', [row['op'] for row in run['top_ops']])
+
+    def test_disabled(self):
+        memory = clock_memory.MemoryProfiler(False)
+        memory.start_phase('run')
+        with tf.Graph().as_default():
+            with tf.compat.v1.Session() as sess:
+                self.assertEqual(2, memory.run(sess, tf.constant(2), 'run'))
+        memory.write_report(self.output_dir)
+        self.assertEqual({}, memory.report())
+        self.assertEqual([], os.listdir(self.output_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
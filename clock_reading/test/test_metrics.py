@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import tensorflow as tf
+import clock_memory
+import clock_metrics
+import clock_training
+
+from .fixtures import FlagValues, write_clocks
+
+
+class TestCase(unittest.TestCase):
+
+    def test_scalar_summary(self):
+        summary = clock_metrics.scalar_summary({'b': 2, 'a': 1.5})
+        self.assertEqual(['a', 'b'], [v.tag for v in summary.value])
+        self.assertEqual([1.5, 2.0], [v.simple_value for v in summary.value])
+
+    def test_long_run_graph_and_memory_constant(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        index_path = write_clocks(data_dir)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(data_dir)
+
+        # The training graph is finalized before the loop: an op added by the
+        # summaries, the background evaluations, the checkpoints or the step
+        # metrics of any step raises.
+        flags = FlagValues(clock_training.FLAGS)
+        self.addCleanup(flags.restore)
+        # (A small learning rate, so that 200 steps on 24 clocks don't
+        # diverge.)
+        flags.set(architecture='tiny', batch_size=4, scalar_summary_steps=1,
+                  histogram_summary_steps=5, background_eval_steps=5,
+                  background_eval_file=index_path, checkpoint_steps=5,
+                  learning_rate=0.005, step_metrics_steps=1)
+
+        def run(name, steps):
+            run_dir = os.path.join(data_dir, name)
+            os.mkdir(run_dir)
+            flags.set(max_steps=steps)
+            clock_training.train(run_dir)
+            state = tf.train.get_checkpoint_state(run_dir)
+            self.assertTrue(state.model_checkpoint_path.endswith(
+                '-{}'.format(steps - 1)))
+
+        # The number of ops of each graph when it is finalized.
+        finalized = []
+        finalize = tf.Graph.finalize
+
+        def record_finalize(graph):
+            finalized.append((graph, len(graph.get_operations())))
+            finalize(graph)
+
+        run('warm_up', 20)
+        rss_before = clock_memory.rss_bytes()
+        with mock.patch.object(tf.Graph, 'finalize', autospec=True,
+                               side_effect=record_finalize):
+            run('long', 200)
+        rss_after = clock_memory.rss_bytes()
+
+        # The training graph and the graph of the background evaluation don't
+        # grow during the run.
+        self.assertEqual(2, len(finalized))
+        for (graph, num_ops) in finalized:
+            self.assertEqual(num_ops, len(graph.get_operations()))
+        if rss_before is not None:
+            self.assertLess(rss_after - rss_before, 20 * 1024 * 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+import clock_model
+
+FLAGS = clock_model.FLAGS
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        if not FLAGS.is_parsed():
+            FLAGS.mark_as_parsed()
+        self.previous = (FLAGS.optimizer, FLAGS.lr_schedule)
+
+    def tearDown(self):
+        FLAGS.optimizer, FLAGS.lr_schedule = self.previous
+
+    def _train_step(self):
+        # (loss, global step) after one step of the tiny multi-task model.
+        rng = np.random.RandomState(0)
+        images = rng.uniform(-1, 1, [4, 66, 63, 1]).astype(np.float32)
+        with tf.Graph().as_default():
+            global_step = tf.Variable(0, trainable=False)
+            logits_h, logits_m = clock_model.inference_multitask(
+                tf.constant(images), arch='tiny', is_training=True)
+            loss = clock_model.loss_multitask(
+                logits_h, tf.constant([0, 3, 6, 11]),
+                logits_m, tf.constant([0, 15, 30, 59]))
+            train_op = clock_model.train(loss, global_step, total_steps=10)
+
+            with tf.compat.v1.Session() as sess:
+                sess.run(tf.compat.v1.global_variables_initializer())
+                loss_value, _ = sess.run([loss, train_op])
+                return loss_value, sess.run(global_step)
+
+    def test_train_step(self):
+        for (optimizer, schedule) in (('sgd', 'exponential'),
+                                      ('momentum', 'cosine'),
+                                      ('adam', 'one_cycle')):
+            FLAGS.optimizer, FLAGS.lr_schedule = optimizer, schedule
+            loss_value, step = self._train_step()
+            self.assertTrue(np.isfinite(loss_value), optimizer)
+            # At least the cross entropy of uniform hours and minutes.
+            self.assertGreater(loss_value, np.log(12) + np.log(60))
+            self.assertEqual(1, step)
+
+
+if __name__ == '__main__':
+    unittest.main()
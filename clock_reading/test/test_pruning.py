@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+import clock_model
+import clock_pruning
+
+
+class TestCase(unittest.TestCase):
+
+    def _outputs(self, config, weights, images):
+        # Logits of a model with the given weights.
+        with tf.Graph().as_default():
+            logits = clock_model.inference_multitask(tf.constant(images),
+                                                     arch=config)
+            with tf.compat.v1.Session() as sess:
+                sess.run(tf.compat.v1.global_variables_initializer())
+                if weights is None:
+                    return sess.run(logits), dict(
+                        (var.op.name, sess.run(var))
+                        for var in tf.compat.v1.global_variables())
+                for var in tf.compat.v1.global_variables():
+                    var.load(weights[var.op.name], sess)
+                return sess.run(logits), weights
+
+    def test_select_channels(self):
+        keep = clock_pruning.select_channels(
+            {'conv1': np.array([3.0, 1.0, 4.0, 1.0, 5.0]),
+             'local3': np.array([1.0, 2.0])}, 0.5)
+        np.testing.assert_array_equal([0, 2, 4], keep['conv1'])
+        np.testing.assert_array_equal([1], keep['local3'])
+
+        keep = clock_pruning.select_channels({'conv1': np.ones(3)}, 0.99)
+        np.testing.assert_array_equal([0], keep['conv1'])
+        self.assertRaises(ValueError, clock_pruning.select_channels,
+                          {'conv1': np.ones(3)}, 1.0)
+
+    def test_pruning_dead_channels_keeps_the_outputs(self):
+        rng = np.random.RandomState(0)
+        images = rng.uniform(-1, 1, [2, 66, 63, 1]).astype(np.float32)
+        _, weights = self._outputs('tiny', None, images)
+
+        # Kill some channels of every layer (zero weights and biases give a
+        # zero output after relu), so that removing them changes nothing.
+        keep = {'conv1': np.array([0, 2, 3, 7]), 'conv2': np.arange(0, 16, 3),
+                'local3': np.arange(0, 64, 2)}
+        for (name, kept) in keep.items():
+            for var in ('weights', 'biases'):
+                value = weights['{}/{}'.format(name, var)]
+                dead = np.setdiff1d(np.arange(value.shape[-1]), kept)
+                value[..., dead] = 0
+        expected, _ = self._outputs('tiny', weights, images)
+
+        config, pruned = clock_pruning.prune('tiny', weights, keep)
+        self.assertEqual([(4, 3), (6, 3)], config['conv'])
+        self.assertEqual([32], config['fc'])
+        outputs, _ = self._outputs(config, pruned, images)
+        for (e, o) in zip(expected, outputs):
+            np.testing.assert_allclose(e, o, rtol=1e-5, atol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
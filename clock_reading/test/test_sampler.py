@@ -0,0 +1,47 @@
+import unittest
+
+import numpy as np
+import tensorflow as tf
+import clock_sampler
+
+
+class TestCase(unittest.TestCase):
+
+    def _sample_counts(self, floor, losses, num_samples=2000):
+        # How often each record is sampled, after setting its running loss.
+        with tf.Graph().as_default():
+            sampler = clock_sampler.HardExampleSampler(floor=floor, decay=0.0)
+            index = sampler.sample(len(losses), seed=1)
+            sampler.batch_indices = tf.constant(np.arange(len(losses)),
+                                                tf.int32)
+            update_op = sampler.add_update(tf.constant(losses, tf.float32))
+
+            with tf.compat.v1.Session() as sess:
+                sess.run(tf.compat.v1.global_variables_initializer())
+                sess.run(update_op)
+                coord = tf.compat.v1.train.Coordinator()
+                threads = tf.compat.v1.train.start_queue_runners(sess=sess,
+                                                                 coord=coord)
+                samples = [sess.run(index) for _ in range(num_samples)]
+                coord.request_stop()
+                coord.join(threads)
+        return np.bincount(samples, minlength=len(losses))
+
+    def test_favors_hard_examples(self):
+        counts = self._sample_counts(0.2, [1.0, 1.0, 6.0, 0.0])
+        # p = 0.2 / 4 + 0.8 * loss / 8.
+        expected = np.array([0.15, 0.15, 0.65, 0.05]) * counts.sum()
+        np.testing.assert_allclose(counts, expected, atol=0.04 * counts.sum())
+
+    def test_floor_of_one_is_uniform(self):
+        counts = self._sample_counts(1.0, [1.0, 1.0, 6.0, 0.0])
+        np.testing.assert_allclose(counts, counts.sum() / 4.0,
+                                   atol=0.04 * counts.sum())
+
+    def test_invalid_floor(self):
+        with self.assertRaises(ValueError):
+            clock_sampler.HardExampleSampler(floor=0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from urllib.request import urlopen
+
+import tensorflow as tf
+import clock_step_metrics
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.run_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.run_dir)
+
+    def test_prometheus_text(self):
+        text = clock_step_metrics.prometheus_text(
+            {'step': 20, 'loss': 1.5, 'input_wait_secs': None,
+             'queue_fill': {'batch/fifo_queue': 0.25}})
+        self.assertEqual('# TYPE clock_train_loss gauge\n'
+                         'clock_train_loss 1.5\n'
+                         '# TYPE clock_train_queue_fill gauge\n'
+                         'clock_train_queue_fill{queue="batch/fifo_queue"} '
+                         '0.25\n'
+                         '# TYPE clock_train_step gauge\n'
+                         'clock_train_step 20.0\n', text)
+
+    def test_records(self):
+        path = os.path.join(self.run_dir, 'step_metrics.jsonl')
+        with tf.Graph().as_default():
+            queue = tf.compat.v1.FIFOQueue(10, [tf.float32], shapes=[[]])
+            runner = tf.compat.v1.train.QueueRunner(
+                queue, [queue.enqueue(1.0)])
+            batch = queue.dequeue_many(4)
+            loss = tf.reduce_sum(batch)
+            step_metrics = clock_step_metrics.StepMetrics(
+                path, every_n_steps=2, learning_rate=tf.constant(0.1),
+                queue_runners=[runner])
+            self.addCleanup(step_metrics.close)
+
+            with tf.compat.v1.Session() as sess:
+                coord = tf.compat.v1.train.Coordinator()
+                threads = runner.create_threads(sess, coord=coord,
+                                                start=True)
+                for step in range(4):
+                    loss_value = step_metrics.run(sess, loss, step)
+                    if step_metrics.should_log(step):
+                        step_metrics.emit(sess, step, loss_value, 0.5, 4)
+                coord.request_stop()
+                sess.run(queue.close(cancel_pending_enqueues=True))
+                coord.join(threads)
+        step_metrics.close()
+
+        with open(path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([0, 2], [r['step'] for r in records])
+        record = records[-1]
+        self.assertEqual((4.0, 8.0), (record['loss'],
+                                      record['examples_per_sec']))
+        self.assertAlmostEqual(0.1, record['learning_rate'])
+        self.assertGreaterEqual(record['input_wait_secs'], 0.0)
+        self.assertGreaterEqual(record['compute_secs'], 0.0)
+        self.assertEqual(['fifo_queue'], list(record['queue_fill']))
+        self.assertGreater(record['rss_mb'], 0.0)
+
+    def test_prometheus_endpoint(self):
+        with tf.Graph().as_default():
+            step_metrics = clock_step_metrics.StepMetrics(None, port=0)
+        self.assertIsNone(step_metrics.server)
+
+        # Port 0 disables the endpoint: bind a free port directly.
+        server = clock_step_metrics._MetricsServer(port=0)
+        self.addCleanup(server.close)
+        server.text = clock_step_metrics.prometheus_text({'step': 3})
+        body = urlopen('http://localhost:{}/metrics'.format(
+            server.port)).read().decode('utf-8')
+        self.assertIn('clock_train_step 3.0', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
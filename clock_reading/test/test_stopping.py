@@ -0,0 +1,47 @@
+import unittest
+
+import clock_stopping
+
+
+class TestCase(unittest.TestCase):
+
+    def test_disabled(self):
+        stopping = clock_stopping.EarlyStopping()
+        self.assertFalse(stopping.needs_evaluation)
+        stopping.update(10, 0.0)
+        self.assertIsNone(stopping.check(1e6))
+
+    def test_target_error(self):
+        stopping = clock_stopping.EarlyStopping(target_error=5.0)
+        self.assertIsNone(stopping.check(0))
+        stopping.update(10, 7.5)
+        self.assertIsNone(stopping.check(0))
+        stopping.update(20, 4.9)
+        self.assertEqual(clock_stopping.TARGET_ERROR, stopping.check(0))
+
+    def test_plateau(self):
+        stopping = clock_stopping.EarlyStopping(patience_steps=100,
+                                                min_delta=0.5)
+        for (step, error) in [(0, 30.0), (50, 20.0), (100, 19.8),
+                              (140, 19.7)]:
+            stopping.update(step, error)
+            self.assertIsNone(stopping.check(0))
+        # 19.6 isn't an improvement of at least min_delta over 20.0.
+        stopping.update(150, 19.6)
+        self.assertEqual(50, stopping.best_step)
+        self.assertEqual(clock_stopping.PLATEAU, stopping.check(0))
+
+    def test_same_evaluation_counted_once(self):
+        stopping = clock_stopping.EarlyStopping(patience_steps=10)
+        stopping.update(0, 10.0)
+        stopping.update(0, 12.0)
+        self.assertEqual(10.0, stopping.latest_error)
+
+    def test_time_budget(self):
+        stopping = clock_stopping.EarlyStopping(max_seconds=60)
+        self.assertIsNone(stopping.check(59))
+        self.assertEqual(clock_stopping.TIME_BUDGET, stopping.check(60))
+
+
+if __name__ == '__main__':
+    unittest.main()
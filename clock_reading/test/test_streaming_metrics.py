@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import tensorflow as tf
+import clock_streaming_metrics
+from clock_evaluation import compute_time_errors
+
+
+def _random_times(rng, num_rows):
+    return np.stack([rng.randint(0, 12, num_rows),
+                     rng.randint(0, 60, num_rows)], axis=1).astype(np.int16)
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.predicted = _random_times(rng, 500)
+        self.true = _random_times(rng, 500)
+        self.true[::3] = self.predicted[::3]
+        self.true[1::3, 0] = self.predicted[1::3, 0]
+
+    def _accumulate(self, batches):
+        # Confusion matrix of (predicted, true) batches, through the graph.
+        with tf.Graph().as_default():
+            predicted = tf.compat.v1.placeholder(tf.int16, [None, 2])
+            true = tf.compat.v1.placeholder(tf.int16, [None, 2])
+            metrics = clock_streaming_metrics.StreamingTimeMetrics(
+                (predicted, true))
+            with tf.compat.v1.Session() as sess:
+                sess.run(metrics.reset_op)
+                for (p, t) in batches:
+                    sess.run(metrics.update_op, {predicted: p, true: t})
+                return sess.run(metrics.confusion)
+
+    def test_metrics_match_predictions(self):
+        confusion = self._accumulate([(self.predicted[i:i + 64],
+                                       self.true[i:i + 64])
+                                      for i in range(0, 500, 64)])
+        metrics = clock_streaming_metrics.time_metrics(confusion)
+
+        errors = compute_time_errors(self.predicted, self.true)
+        self.assertEqual(500, metrics['sample_count'])
+        self.assertAlmostEqual(np.mean(errors[:, 0]),
+                               metrics['error/combined'])
+        self.assertAlmostEqual(np.mean(errors[:, 1]),
+                               metrics['error/hours_only'])
+        self.assertAlmostEqual(np.mean(errors[:, 2]),
+                               metrics['error/minutes_only'])
+        for q in clock_streaming_metrics.PERCENTILES:
+            self.assertAlmostEqual(np.percentile(errors[:, 0], q),
+                                   metrics['error/p{}'.format(q)])
+        self.assertAlmostEqual(
+            np.mean(self.predicted[:, 0] == self.true[:, 0]),
+            metrics['precision/hours'])
+        self.assertAlmostEqual(
+            np.mean(np.all(self.predicted == self.true, axis=1)),
+            metrics['precision/time'])
+
+        hours, minutes = clock_streaming_metrics.hour_minute_confusions(
+            confusion)
+        self.assertEqual(np.sum(self.true[:, 0] == 5), hours[5].sum())
+        self.assertEqual(np.sum(self.predicted[:, 1] == 7),
+                         minutes[:, 7].sum())
+
+    def test_merge_shards(self):
+        whole = self._accumulate([(self.predicted, self.true)])
+        shards = [self._accumulate([(self.predicted[:200], self.true[:200])]),
+                  self._accumulate([(self.predicted[200:], self.true[200:])])]
+        np.testing.assert_array_equal(
+            whole, clock_streaming_metrics.merge_confusions(shards))
+
+        with tf.Graph().as_default():
+            times = tf.zeros([1, 2], tf.int16)
+            metrics = clock_streaming_metrics.StreamingTimeMetrics(
+                (times, times))
+            with tf.compat.v1.Session() as sess:
+                sess.run(metrics.reset_op)
+                for shard in shards:
+                    metrics.merge(sess, shard)
+                np.testing.assert_array_equal(whole,
+                                              sess.run(metrics.confusion))
+
+    def test_save_and_load(self):
+        confusion = self._accumulate([(self.predicted, self.true)])
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'confusion.npz')
+        clock_streaming_metrics.save_confusion(path, confusion)
+        np.testing.assert_array_equal(
+            confusion, clock_streaming_metrics.load_confusion(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
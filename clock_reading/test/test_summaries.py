@@ -0,0 +1,55 @@
+import unittest
+from unittest import mock
+
+import tensorflow as tf
+import clock_summaries
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            x = tf.compat.v1.placeholder(tf.float32, [10])
+            self.histograms = [tf.compat.v1.summary.histogram('h%d' % i, x)
+                               for i in range(5)]
+            self.scalar = tf.compat.v1.summary.scalar('s', tf.reduce_sum(x))
+
+    def _runner(self, policy):
+        with self.graph.as_default():
+            return clock_summaries.SummaryRunner(None, policy)
+
+    def test_split(self):
+        scalars, others = clock_summaries.split_summaries(
+            self.histograms + [self.scalar])
+        self.assertEqual([self.scalar], scalars)
+        self.assertEqual(self.histograms, others)
+
+    def test_intervals(self):
+        runner = self._runner(clock_summaries.SummaryPolicy(
+            scalar_steps=2, histogram_steps=3))
+        counts = [len(runner.fetches(step)) for step in range(7)]
+        self.assertEqual([2, 0, 1, 1, 1, 0, 2], counts)
+
+    def test_histogram_budget_cycles(self):
+        runner = self._runner(clock_summaries.SummaryPolicy(
+            scalar_steps=0, histogram_steps=1, histogram_budget=2))
+        # 5 histograms in groups of 2: three groups, then back to the first.
+        fetched = [runner.fetches(step)[0] for step in range(4)]
+        self.assertEqual(3, len(set(fetched)))
+        self.assertEqual(fetched[0], fetched[3])
+
+    def test_async_writer_failure(self):
+        file_writer = mock.Mock()
+        file_writer.add_summary.side_effect = IOError('disk full')
+        writer = clock_summaries.AsyncSummaryWriter(file_writer, queue_size=1)
+        for step in range(5):
+            writer.add_summary('summary', step)
+        # The failed thread doesn't block close(), which raises its error.
+        with self.assertRaisesRegex(IOError, 'disk full'):
+            writer.close()
+        file_writer.close.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import sweep
+
+
+class TestCase(unittest.TestCase):
+
+    def test_grid(self):
+        trials = sweep.expand_trials({
+            'search': 'grid',
+            'params': {'batch_size': [64, 128], 'weight_decay': [0, 0.004]},
+            'fixed': {'max_steps': 10}})
+        self.assertEqual(4, len(trials))
+        self.assertEqual(('trial_000', {'max_steps': 10, 'batch_size': 64,
+                                        'weight_decay': 0}), trials[0])
+        self.assertEqual({'max_steps': 10, 'batch_size': 128,
+                          'weight_decay': 0.004}, trials[3][1])
+
+    def test_random_is_reproducible(self):
+        spec = {'search': 'random', 'num_trials': 5, 'seed': 3,
+                'params': {'learning_rate': {'log_uniform': [1e-3, 1e-1]},
+                           'architecture': ['baseline', 'narrow']}}
+        trials = sweep.expand_trials(spec)
+        self.assertEqual(trials, sweep.expand_trials(spec))
+        for (_, flags) in trials:
+            self.assertTrue(1e-3 <= flags['learning_rate'] <= 1e-1)
+            self.assertIn(flags['architecture'], ['baseline', 'narrow'])
+
+    def test_cpu_sets_are_disjoint(self):
+        self.assertEqual([[0, 1, 2], [3, 4, 5]],
+                         sweep.cpu_sets(range(7), 2))
+        self.assertEqual([[0], [1]], sweep.cpu_sets([1, 0], 4))
+
+    def test_load_results_keeps_last(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, sweep.RESULTS_JSONL)
+            with open(path, 'w') as f:
+                f.write(json.dumps({'trial': 'trial_000',
+                                    'status': 'failed (1)'}) + '\n')
+                f.write(json.dumps({'trial': 'trial_000',
+                                    'status': 'ok'}) + '\n')
+            self.assertEqual('ok',
+                             sweep.load_results(path)['trial_000']['status'])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
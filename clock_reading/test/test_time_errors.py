@@ -1,6 +1,9 @@
 import unittest
 import numpy as np
-from clock_reading.clock_evaluation import compute_time_errors
+import tensorflow as tf
+from clock_evaluation import compute_time_errors
+from clock_evaluation import compute_precision
+import clock_model
 
 
 class TestCase(unittest.TestCase):
@@ -43,8 +46,57 @@ class TestCase(unittest.TestCase):
         errs = compute_time_errors(true, pred)  # flip order.
         np.testing.assert_equal(ref, errs)
 
+    def test_arrays_in_chunks(self):
+        rng = np.random.RandomState(0)
+        pred = np.stack([rng.randint(0, 12, 1000),
+                         rng.randint(0, 60, 1000)], axis=1).astype(np.int16)
+        true = np.stack([rng.randint(0, 12, 1000),
+                         rng.randint(0, 60, 1000)], axis=1).astype(np.int16)
+        true[::4] = pred[::4]
 
+        errs = compute_time_errors(pred, true, chunk_size=64)
+        for (row, p, t) in zip(errs, pred.tolist(), true.tolist()):
+            np.testing.assert_equal(
+                compute_time_errors([tuple(p)], [tuple(t)])[0], row)
+        self.assertEqual(250 / 1000.0,
+                         compute_precision(pred, true, chunk_size=64))
 
+    def test_precision(self):
+        self.assertEqual(0.5, compute_precision([(5, 10), (1, 2)],
+                                                [(5, 10), (1, 3)]))
+
+    def test_time_predictions(self):
+        logits_h = np.eye(12, dtype=np.float32)[[3, 11, 0, 5]]
+        logits_m = np.eye(60, dtype=np.float32)[[59, 0, 30, 7]]
+        labels = (np.array([3, 10, 0, 5]), np.array([59, 1, 30, 8]))
+        with tf.Graph().as_default():
+            queue = tf.queue.FIFOQueue(4, [tf.float32, tf.float32, tf.int32,
+                                           tf.int32], shapes=[[12], [60], [],
+                                                              []])
+            enqueue = queue.enqueue_many((logits_h, logits_m) + labels)
+            out_h, out_m, true_h, true_m = queue.dequeue_many(2)
+            predictions = clock_model.time_predictions((out_h, out_m),
+                                                       (true_h, true_m))
+            with tf.compat.v1.Session() as sess:
+                coord = tf.compat.v1.train.Coordinator()
+                sess.run(enqueue)
+                predicted, true, count = clock_model.compute_time_predictions(
+                    sess, coord, predictions, 3, 2)
+
+                sess.run(enqueue)
+                batches = []
+                clock_model.compute_time_predictions(
+                    sess, coord, predictions, 4, 2,
+                    callback=lambda p, t: batches.append((p, t)))
+
+        self.assertEqual(4, count)
+        self.assertEqual(np.int16, predicted.dtype)
+        np.testing.assert_equal([[3, 59], [11, 0], [0, 30], [5, 7]],
+                                predicted)
+        np.testing.assert_equal([[3, 59], [10, 1], [0, 30], [5, 8]], true)
+        self.assertEqual(2, len(batches))
+        np.testing.assert_equal(predicted, np.concatenate(
+            [p for (p, _) in batches]))
 
 
 if __name__ == '__main__':
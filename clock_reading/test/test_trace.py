@@ -0,0 +1,120 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import tensorflow as tf
+import clock_trace
+
+
+class TestCase(unittest.TestCase):
+
+    def test_parse_profile_steps(self):
+        self.assertIsNone(clock_trace.parse_profile_steps(''))
+        self.assertIsNone(clock_trace.parse_profile_steps(None))
+        self.assertEqual((100, 110),
+                         clock_trace.parse_profile_steps('100:110'))
+        for invalid in ('100', '1:2:3', 'a:b', '5:5', '-1:3'):
+            self.assertRaises(ValueError, clock_trace.parse_profile_steps,
+                              invalid)
+
+    def test_step_breakdown(self):
+        with tf.Graph().as_default() as graph:
+            queue = tf.compat.v1.FIFOQueue(10, [tf.float32], shapes=[[2]])
+            batch = queue.dequeue_many(4, name='batch')
+            tf.reduce_sum(batch, name='total')
+
+        # A dequeue of 30 us, then a sum of 10 us, and a node that is not in
+        # the graph.
+        step_stats = tf.compat.v1.RunMetadata().step_stats
+        nodes = step_stats.dev_stats.add(device='/cpu:0').node_stats
+        for (name, start, duration, label) in (
+                ('batch', 100, 30, ''), ('total', 130, 10, ''),
+                ('_SOURCE', 95, 2, '_SOURCE = NoOp()')):
+            nodes.add(node_name=name, all_start_micros=start,
+                      all_end_rel_micros=duration, timeline_label=label)
+
+        op_times, wall_time, input_wait = clock_trace.step_breakdown(
+            graph, step_stats)
+        self.assertEqual({'QueueDequeueManyV2': 30, 'Sum': 10, 'NoOp': 2},
+                         op_times)
+        self.assertEqual(45, wall_time)
+        self.assertEqual(30, input_wait)
+
+    def test_input_wait_of_a_traced_run(self):
+        # The step waits ~0.3 sec for a batch, then computes.
+        with tf.Graph().as_default():
+            queue = tf.compat.v1.FIFOQueue(10, [tf.float32], shapes=[[64]])
+            enqueue = queue.enqueue_many(tf.random.normal([4, 64]))
+            batch = queue.dequeue_many(4)
+            product = tf.reduce_sum(tf.matmul(batch, batch, transpose_b=True))
+
+            with tf.compat.v1.Session() as sess:
+                def producer():
+                    time.sleep(0.3)
+                    sess.run(enqueue)
+                thread = threading.Thread(target=producer)
+                thread.start()
+                run_metadata = tf.compat.v1.RunMetadata()
+                sess.run(product, options=tf.compat.v1.RunOptions(
+                    trace_level=tf.compat.v1.RunOptions.SOFTWARE_TRACE),
+                    run_metadata=run_metadata)
+                thread.join()
+
+                op_times, wall_time, input_wait = clock_trace.step_breakdown(
+                    sess.graph, run_metadata.step_stats)
+
+        self.assertIn('MatMul', op_times)
+        self.assertGreaterEqual(input_wait, 200000)
+        self.assertLessEqual(input_wait, wall_time)
+        self.assertGreater(input_wait / float(wall_time), 0.5)
+
+    def test_chrome_traces(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        tracer = clock_trace.StepTracer('1:3', output_dir)
+        with tf.Graph().as_default():
+            inputs = tf.random.normal([32, 32])
+            total = tf.reduce_sum(tf.matmul(inputs, inputs))
+            with tf.compat.v1.Session() as sess:
+                for step in range(4):
+                    tracer.run(sess, total, step)
+                    tracer.maybe_report(step)
+
+        self.assertEqual(2, tracer.num_runs)
+        self.assertIn('MatMul', tracer.op_times)
+        self.assertEqual(['timeline_train_000001.json',
+                          'timeline_train_000002.json'],
+                         sorted(os.listdir(output_dir)))
+        with open(os.path.join(output_dir,
+                               'timeline_train_000001.json')) as f:
+            events = json.load(f)['traceEvents']
+        # (With oneDNN, the trace has MatMul as _MklMatMul.)
+        self.assertIn('Sum', [event.get('args', {}).get('op')
+                              for event in events])
+
+    def test_report_when_stopped_in_the_window(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        tracer = clock_trace.StepTracer('1:10', output_dir)
+        output = io.StringIO()
+        with tf.Graph().as_default(), contextlib.redirect_stdout(output):
+            total = tf.reduce_sum(tf.random.normal([4, 4]))
+            with tf.compat.v1.Session() as sess:
+                for step in range(3):
+                    tracer.run(sess, total, step)
+                    tracer.maybe_report(step)
+                self.assertEqual('', output.getvalue())
+                tracer.finish()
+                tracer.finish()
+
+        self.assertEqual(1, output.getvalue().count('Traced 2 runs'))
+
+
+if __name__ == '__main__':
+    unittest.main()
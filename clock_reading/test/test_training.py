@@ -0,0 +1,123 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import tensorflow as tf
+import clock_checkpoints
+import clock_training
+
+from .fixtures import FlagValues, write_clocks
+
+
+def summary_tags(run_dir):
+    # Tags of all the summaries written to the event files of a run.
+    return set(value.tag for path in glob.glob(os.path.join(run_dir,
+                                                             'events.*'))
+               for event in tf.compat.v1.train.summary_iterator(path)
+               for value in event.summary.value)
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        index_path = write_clocks(self.data_dir)
+
+        # The training reads clocks_all.txt from the working directory.
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.data_dir)
+
+        self.flags = FlagValues(clock_training.FLAGS)
+        self.addCleanup(self.flags.restore)
+        self.flags.set(architecture='tiny', batch_size=4, max_steps=5,
+                       background_eval_steps=2,
+                       background_eval_file=index_path, checkpoint_steps=2,
+                       step_metrics_steps=2)
+        self.run_dir = os.path.join(self.data_dir, 'run')
+        os.mkdir(self.run_dir)
+
+    def test_train(self):
+        clock_training.train(self.run_dir)
+
+        with open(os.path.join(self.run_dir,
+                               clock_training.RUN_SUMMARY_FILENAME)) as f:
+            summary = json.load(f)
+        self.assertEqual(5, summary['steps'])
+        # The final weights are evaluated too.
+        self.assertEqual(4, summary['eval_step'])
+        self.assertIn('error/combined', summary['metrics'])
+        self.assertGreater(summary['examples_per_sec'], 0)
+        self.assertEqual('max_steps', summary['stop_reason'])
+
+        state = tf.train.get_checkpoint_state(self.run_dir)
+        self.assertTrue(state.model_checkpoint_path.endswith('-4'))
+        # The checkpoints have the time error of their own weights.
+        with open(os.path.join(self.run_dir, 'checkpoints.json')) as f:
+            checkpoints = dict((c['step'], c['metric']) for c in json.load(f))
+        self.assertEqual([0, 2, 4], sorted(checkpoints))
+        self.assertAlmostEqual(summary['metrics']['error/combined'],
+                               checkpoints[4])
+        tags = summary_tags(self.run_dir)
+        self.assertIn('loss__raw_', tags)
+        self.assertIn('learning_rate', tags)
+        with open(os.path.join(self.run_dir, 'step_metrics.jsonl')) as f:
+            self.assertEqual([0, 2, 4], [json.loads(line)['step']
+                                         for line in f])
+
+    def _runs(self, train_dir):
+        return [name for name in os.listdir(train_dir)
+                if os.path.isdir(os.path.join(train_dir, name))]
+
+    def test_resume(self):
+        train_dir = os.path.join(self.data_dir, 'tf_data')
+        self.flags.set(train_dir=train_dir, max_steps=3,
+                       background_eval_steps=0)
+        clock_training.main()
+        self.flags.set(resume=True, max_steps=5)
+        clock_training.main()
+
+        # The same run, continued from its checkpoint of step 2.
+        [run] = self._runs(train_dir)
+        run_dir = os.path.join(train_dir, run)
+        self.assertTrue(clock_checkpoints.resolve_checkpoint(run_dir)
+                        .endswith('-4'))
+        with open(os.path.join(run_dir, 'checkpoints.json')) as f:
+            self.assertEqual([0, 2, 4], [c['step'] for c in json.load(f)])
+
+    def test_warm_start(self):
+        self.flags.set(max_steps=2, background_eval_steps=0)
+        clock_training.train(self.run_dir)
+        source = clock_checkpoints.resolve_checkpoint(self.run_dir)
+
+        # A step that (almost) doesn't change the weights.
+        train_dir = os.path.join(self.data_dir, 'tf_data')
+        self.flags.set(train_dir=train_dir, warm_start_from=self.run_dir,
+                       max_steps=1, learning_rate=1e-9)
+        clock_training.main()
+        [run] = self._runs(train_dir)
+        warm_started = clock_checkpoints.resolve_checkpoint(
+            os.path.join(train_dir, run))
+
+        # The shared layers (and their moving averages) start from the
+        # checkpoint, not the softmax layers.
+        for (name, restored_name) in (
+                ('conv1/weights', 'conv1/weights'),
+                ('conv1/weights', 'conv1/weights/ExponentialMovingAverage'),
+                ('local3/weights', 'local3/weights')):
+            np.testing.assert_allclose(
+                tf.train.load_variable(source, name),
+                tf.train.load_variable(warm_started, restored_name),
+                atol=1e-5)
+        name = 'softmax_linear_hours/weights'
+        self.assertFalse(np.allclose(tf.train.load_variable(source, name),
+                                     tf.train.load_variable(warm_started,
+                                                            name)))
+
+
+if __name__ == '__main__':
+    unittest.main()
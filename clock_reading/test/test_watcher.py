@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import clock_watcher
+
+
+def _write_checkpoint(directory, step, suffix=''):
+    prefix = os.path.join(directory, 'model.ckpt-{}{}'.format(step, suffix))
+    for ext in ('.data-00000-of-00001', '.index'):
+        with open(prefix + ext, 'w') as f:
+            f.write('x')
+
+
+class TestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.run_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.run_dir)
+
+    def _watcher(self, **kwargs):
+        watcher = clock_watcher.CheckpointWatcher(self.run_dir, **kwargs)
+        self.addCleanup(watcher.close)
+        return watcher
+
+    def test_each_checkpoint_once_in_order(self):
+        for step in (200, 100, 300):
+            _write_checkpoint(self.run_dir, step)
+        _write_checkpoint(self.run_dir, 400, suffix='.tmp')
+        watcher = self._watcher(poll_secs=0.05)
+
+        steps = [watcher.next_checkpoint(timeout=0.1)[0] for _ in range(3)]
+        self.assertEqual([100, 200, 300], steps)
+        self.assertIsNone(watcher.next_checkpoint(timeout=0.1))
+
+    def test_skips_evaluated_steps(self):
+        _write_checkpoint(self.run_dir, 100)
+        _write_checkpoint(self.run_dir, 200)
+        watcher = self._watcher(evaluated_steps=[100], poll_secs=0.05)
+        self.assertEqual(200, watcher.next_checkpoint(timeout=0.1)[0])
+        self.assertIsNone(watcher.next_checkpoint(timeout=0.1))
+
+    def test_wakes_up_on_new_checkpoint(self):
+        # A long polling interval: only inotify finds the checkpoint early
+        # (polling finds it at the end of the timeout).
+        watcher = self._watcher(poll_secs=30.0)
+        writer = threading.Timer(0.2, _write_checkpoint, (self.run_dir, 100))
+        writer.start()
+        start_time = time.time()
+        result = watcher.next_checkpoint(timeout=5.0)
+        writer.join()
+
+        self.assertEqual(100, result[0])
+        if watcher._inotify is not None:
+            self.assertLess(time.time() - start_time, 2.0)
+
+    def test_polling_fallback(self):
+        watcher = self._watcher(poll_secs=0.05, use_inotify=False)
+        threading.Timer(0.1, _write_checkpoint, (self.run_dir, 100)).start()
+        self.assertEqual(100, watcher.next_checkpoint(timeout=2.0)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()